@@ -0,0 +1,91 @@
+"""Time-to-first-token with and without rebuilding stage agents per turn.
+
+Runs every stage agent against a local fake chat model so only graph
+construction and LangGraph overhead is measured, no network calls are made.
+
+    poetry run python -m benchmarks.agent_build_benchmark --turns 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from langchain_core.language_models.fake_chat_models import (  # noqa: E402
+    GenericFakeChatModel,
+)
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from src.conversation.conversation_state import ConversationState  # noqa: E402
+from src.stages.active_listening import build_active_listening_agent  # noqa: E402
+from src.stages.agent_registry import AgentContext  # noqa: E402
+from src.stages.deliberation import build_deliberation_agent  # noqa: E402
+from src.stages.party_positioning import build_party_positioning_agent  # noqa: E402
+from src.stages.perspective_taking import (  # noqa: E402
+    build_perspective_taking_agent,
+)
+
+STAGE_BUILDERS = {
+    "active_listening": build_active_listening_agent,
+    "party_positioning": build_party_positioning_agent,
+    "perspective_taking": build_perspective_taking_agent,
+    "deliberation": build_deliberation_agent,
+}
+
+
+class FakeToolModel(GenericFakeChatModel):
+    """Fake streaming model that accepts tool bindings."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def time_to_first_token(get_agent, context: AgentContext) -> float:
+    started = time.perf_counter()
+    stream = get_agent().stream(
+        {"messages": [HumanMessage(content="Hallo")]},
+        context=context,
+        stream_mode="messages",
+    )
+    for chunk, _metadata in stream:
+        if chunk.content:
+            elapsed = time.perf_counter() - started
+            stream.close()
+            return elapsed
+    raise RuntimeError("Agent produced no tokens")
+
+
+def run(turns: int) -> None:
+    model = FakeToolModel(
+        messages=itertools.repeat(AIMessage(content="Danke für deine Antwort."))
+    )
+    context = AgentContext(
+        state=ConversationState(topic="Migration", id="benchmark"),
+        system_prompt="You are a benchmark agent.",
+    )
+
+    print(f"{'stage':<20} {'rebuild p50':>12} {'registry p50':>13} {'speedup':>8}")
+    for stage, builder in STAGE_BUILDERS.items():
+        rebuild = [
+            time_to_first_token(lambda: builder(model), context) for _ in range(turns)
+        ]
+        agent = builder(model)
+        registry = [time_to_first_token(lambda: agent, context) for _ in range(turns)]
+
+        rebuild_p50 = statistics.median(rebuild) * 1000
+        registry_p50 = statistics.median(registry) * 1000
+        print(
+            f"{stage:<20} {rebuild_p50:>10.2f}ms {registry_p50:>11.2f}ms "
+            f"{rebuild_p50 / registry_p50:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=100)
+    run(parser.parse_args().turns)
@@ -0,0 +1,107 @@
+"""Cost of turning a late-stage conversation document into a ConversationState.
+
+Builds a synthetic document with ``--messages`` stored messages in each of the
+four stage transcripts and compares deserializing every transcript up front
+(the previous behaviour) with the lazy state, for a deliberation turn (only
+``deliberation_messages`` is read) and a party matching turn (no transcript is
+read).
+
+    poetry run python -m benchmarks.conversation_load_benchmark --messages 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import time
+from typing import Callable
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.agent_orchestrator import conversation_state_from_document  # noqa: E402
+from src.conversation.conversation_state import (  # noqa: E402
+    STAGE_MESSAGE_FIELDS,
+    ConversationState,
+    deserialize_messages,
+)
+
+CONTENT = "Ich finde, dass die Parteien hier sehr unterschiedliche Ziele haben. " * 6
+
+
+def late_stage_document(messages_per_stage: int) -> dict:
+    document = {
+        "topic": "Migration",
+        "stage": "deliberation",
+        "active_listening_summary": "Der Nutzer ...",
+        "party_positioning_summary": "Der Nutzer ...",
+        "perspective_taking_summary": "Der Nutzer ...",
+    }
+    for field in STAGE_MESSAGE_FIELDS:
+        document[field] = [
+            {
+                "type": "ai" if index % 2 else "human",
+                "content": CONTENT,
+                "additional_kwargs": {},
+                "response_metadata": {"model_name": "gpt", "finish_reason": "stop"},
+                "seq": index,
+            }
+            for index in range(messages_per_stage)
+        ]
+    return document
+
+
+def eager_state(document: dict) -> ConversationState:
+    return ConversationState(
+        topic=document["topic"],
+        id="benchmark",
+        active_listening_messages=deserialize_messages(
+            document["active_listening_messages"]
+        ),
+        party_positioning_messages=deserialize_messages(
+            document["party_positioning_messages"]
+        ),
+        perspective_taking_messages=deserialize_messages(
+            document["perspective_taking_messages"]
+        ),
+        deliberation_messages=deserialize_messages(document["deliberation_messages"]),
+    )
+
+
+def deliberation_turn(document: dict) -> None:
+    conversation_state_from_document("benchmark", document).deliberation_messages
+
+
+def party_matching_turn(document: dict) -> None:
+    conversation_state_from_document("benchmark", document)
+
+
+def median_ms(load: Callable[[dict], object], document: dict, turns: int) -> float:
+    timings = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        load(document)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def run(messages_per_stage: int, turns: int) -> None:
+    document = late_stage_document(messages_per_stage)
+    eager = median_ms(eager_state, document, turns)
+    print(f"{messages_per_stage} messages per stage, median of {turns} loads")
+    print(f"{'load':<34} {'p50':>9} {'speedup':>8}")
+    print(f"{'eager, all four transcripts':<34} {eager:>7.3f}ms {1:>7.1f}x")
+    for name, load in (
+        ("lazy, deliberation turn", deliberation_turn),
+        ("lazy, party matching turn", party_matching_turn),
+    ):
+        lazy = median_ms(load, document, turns)
+        print(f"{name:<34} {lazy:>7.3f}ms {eager / lazy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    run(args.messages, args.turns)
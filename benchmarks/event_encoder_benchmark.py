@@ -0,0 +1,79 @@
+"""Encoding cost per /chat-stream event: ``json.dumps`` per event vs. EventEncoder.
+
+Encodes the events of a synthetic reply (``message_start``, ``--tokens``
+``message_chunk`` events, ``message_end``, ``end``) in a loop and reports the
+time per event for the previous ``json.dumps(event).encode() + b"\\n"`` and for
+:class:`EventEncoder` with both JSON backends and both framings.
+
+    poetry run python -m benchmarks.event_encoder_benchmark --tokens 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import timeit
+from typing import Callable
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.events import EventType  # noqa: E402
+from src.utils.events import EventEncoder, orjson  # noqa: E402
+
+TOKENS = ["Die", " Parteien", " unterscheiden", " sich", " hier", " deutlich", "."]
+
+
+def reply_events(tokens: int) -> list[dict]:
+    return [
+        {"type": EventType.MESSAGE_START.value},
+        *(
+            {"type": EventType.MESSAGE_CHUNK.value, "content": TOKENS[i % len(TOKENS)]}
+            for i in range(tokens)
+        ),
+        {"type": EventType.MESSAGE_END.value},
+        {"type": EventType.END.value},
+    ]
+
+
+def json_dumps_per_event(event: dict) -> bytes:
+    return json.dumps(event).encode("utf-8") + b"\n"
+
+
+def run(tokens: int, repeat: int) -> None:
+    events = reply_events(tokens)
+    encoders: dict[str, Callable[[dict], bytes]] = {
+        "json.dumps per event": json_dumps_per_event,
+        "EventEncoder ndjson (json)": EventEncoder("ndjson", use_orjson=False).encode,
+        "EventEncoder sse (json)": EventEncoder("sse", use_orjson=False).encode,
+    }
+    if orjson is not None:
+        encoders["EventEncoder ndjson (orjson)"] = EventEncoder(
+            "ndjson", use_orjson=True
+        ).encode
+        encoders["EventEncoder sse (orjson)"] = EventEncoder(
+            "sse", use_orjson=True
+        ).encode
+    else:
+        print("orjson is not installed, skipping the orjson backend")
+
+    baseline_ns: float | None = None
+    print(f"{'encoder':<30} {'ns/event':>9} {'speedup':>8}")
+    for name, encode in encoders.items():
+        seconds = min(
+            timeit.repeat(
+                lambda: [encode(event) for event in events], number=repeat, repeat=5
+            )
+        )
+        ns_per_event = seconds / (repeat * len(events)) * 1e9
+        if baseline_ns is None:
+            baseline_ns = ns_per_event
+        print(f"{name:<30} {ns_per_event:>9.0f} {baseline_ns / ns_per_event:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.tokens, args.repeat)
@@ -0,0 +1,155 @@
+"""429 responses and latency per priority with and without the LLM scheduler.
+
+A fake model endpoint serves ``--capacity`` requests at a time and answers
+every request beyond that with a 429 and ``Retry-After``, like a provider at
+its rate limit. ``--interactive`` and ``--background`` threads each send
+``--requests`` requests through a pooled ``httpx`` client, once directly and
+once through :class:`~src.services.llm_scheduler.ScheduledTransport`
+admitting ``--max-concurrency`` requests (default ``--capacity``; set it
+higher to exercise the 429 retries).
+Reported are the 429 responses the clients saw and the request latency per
+priority, p50 and p99.
+
+    poetry run python -m benchmarks.llm_scheduler_benchmark --interactive 24
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import httpx
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.services.llm_scheduler import (  # noqa: E402
+    LLMScheduler,
+    Priority,
+    ScheduledTransport,
+    llm_priority,
+)
+
+BODY = b'{"model": "benchmark", "messages": [{"role": "user", "content": "Hallo"}]}'
+
+
+class FakeEndpoint:
+    """Serves ``capacity`` concurrent requests; the rest get a 429."""
+
+    def __init__(self, capacity: int, latency_seconds: float) -> None:
+        self.capacity = capacity
+        self.latency_seconds = latency_seconds
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                return httpx.Response(429, headers={"retry-after": "0.05"})
+            self.in_flight += 1
+        try:
+            time.sleep(self.latency_seconds)
+            return httpx.Response(200, json={"choices": []})
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def run_case(
+    name: str,
+    client: httpx.Client,
+    endpoint: FakeEndpoint,
+    interactive: int,
+    background: int,
+    requests: int,
+) -> None:
+    latencies: dict[Priority, list[float]] = {priority: [] for priority in Priority}
+    client_429s = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(interactive + background)
+
+    def worker(priority: Priority) -> None:
+        nonlocal client_429s
+        barrier.wait()
+        with llm_priority(priority):
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.post(
+                    "http://llm.test/v1/chat/completions", content=BODY
+                )
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies[priority].append(elapsed)
+                    client_429s += response.status_code == 429
+
+    threads = [
+        threading.Thread(target=worker, args=(Priority.INTERACTIVE,))
+        for _ in range(interactive)
+    ] + [
+        threading.Thread(target=worker, args=(Priority.BACKGROUND,))
+        for _ in range(background)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    print(
+        f"{name}: {duration:.2f}s, {client_429s} 429s seen by clients, "
+        f"{endpoint.rejected} rejected upstream"
+    )
+    for priority, values in latencies.items():
+        if not values:
+            continue
+        milliseconds = sorted(value * 1000 for value in values)
+        p99 = milliseconds[max(int(len(milliseconds) * 0.99) - 1, 0)]
+        print(
+            f"  {priority.name.lower():<12} p50 {statistics.median(milliseconds):8.1f}ms"
+            f"  p99 {p99:8.1f}ms"
+        )
+
+
+def run(
+    interactive: int,
+    background: int,
+    requests: int,
+    capacity: int,
+    latency_ms: float,
+    max_concurrency: int | None = None,
+) -> None:
+    endpoint = FakeEndpoint(capacity, latency_ms / 1000)
+    with httpx.Client(transport=httpx.MockTransport(endpoint.handle)) as client:
+        run_case("direct", client, endpoint, interactive, background, requests)
+
+    endpoint = FakeEndpoint(capacity, latency_ms / 1000)
+    scheduler = LLMScheduler(
+        max_concurrency=max_concurrency or capacity, queue_timeout_seconds=60
+    )
+    transport = ScheduledTransport(httpx.MockTransport(endpoint.handle), scheduler)
+    with httpx.Client(transport=transport) as client:
+        run_case("scheduled", client, endpoint, interactive, background, requests)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--interactive", type=int, default=24)
+    parser.add_argument("--background", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--max-concurrency", type=int)
+    args = parser.parse_args()
+    run(
+        args.interactive,
+        args.background,
+        args.requests,
+        args.capacity,
+        args.latency_ms,
+        args.max_concurrency,
+    )
@@ -0,0 +1,15 @@
+"""End-to-end load test of /chat-start and /chat-stream against local fakes.
+
+Three processes take part, so the driver and the fakes do not compete with
+the service for its interpreter:
+
+- ``fakes``: an OpenAI-compatible chat completions server with a configurable
+  token rate that calls the stage end tools, plus a socket.io server that
+  answers like the wahl.chat backend;
+- ``server``: the service itself (ASGI or Flask) with ``firestore_service``
+  pointed at an in-memory Firestore stand-in;
+- ``run``: the driver that plays full conversations from START to END at
+  increasing concurrency and reports the latencies.
+
+    poetry run python -m benchmarks.load_test.run --concurrency 1,4,16,64
+"""
@@ -0,0 +1,179 @@
+"""In-memory stand-in for the parts of the Firestore client the service uses.
+
+Supports documents and subcollections with ``get`` (optionally restricted to
+``field_paths``), ``set``, ``update`` with ``ArrayUnion``, collection
+``stream`` and ``on_snapshot``, in a sync and an async flavour that share one
+store. Every call can wait ``latency_seconds`` to stand in for the round-trip.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1.transforms import ArrayUnion
+
+Path = tuple[str, ...]
+
+
+class InMemoryStore:
+    def __init__(self, *, latency_seconds: float = 0.0) -> None:
+        self.latency_seconds = latency_seconds
+        self.documents: dict[Path, dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+
+    def read(self, path: Path, field_paths: list[str] | None) -> dict | None:
+        with self.lock:
+            self.reads += 1
+            document = self.documents.get(path)
+            if document is None:
+                return None
+            return {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in document.items()
+                if field_paths is None or key in field_paths
+            }
+
+    def write(self, path: Path, data: dict[str, Any], *, merge: bool) -> None:
+        with self.lock:
+            self.writes += 1
+            if not merge:
+                self.documents[path] = dict(data)
+                return
+            document = self.documents.get(path)
+            if document is None:
+                raise NotFound(f"No document to update: {'/'.join(path)}")
+            for key, value in data.items():
+                if isinstance(value, ArrayUnion):
+                    current = list(document.get(key) or [])
+                    current.extend(item for item in value.values if item not in current)
+                    document[key] = current
+                else:
+                    document[key] = value
+
+    def children(self, collection: Path) -> list[tuple[str, dict[str, Any]]]:
+        with self.lock:
+            self.reads += 1
+            return [
+                (path[-1], dict(document))
+                for path, document in self.documents.items()
+                if path[:-1] == collection
+            ]
+
+
+class _Snapshot:
+    def __init__(self, id: str, data: dict[str, Any] | None) -> None:
+        self.id = id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> dict[str, Any] | None:
+        return self._data
+
+
+class _Document:
+    def __init__(self, client: InMemoryFirestore, path: Path) -> None:
+        self._client = client
+        self._path = path
+        self.id = path[-1]
+
+    def collection(self, name: str) -> _Collection:
+        return _Collection(self._client, self._path + (name,))
+
+    def get(self, field_paths: list[str] | None = None) -> Any:
+        return self._client._call(
+            lambda: _Snapshot(self.id, self._client.store.read(self._path, field_paths))
+        )
+
+    def set(self, data: dict[str, Any]) -> Any:
+        return self._client._call(
+            lambda: self._client.store.write(self._path, data, merge=False)
+        )
+
+    def update(self, data: dict[str, Any]) -> Any:
+        return self._client._call(
+            lambda: self._client.store.write(self._path, data, merge=True)
+        )
+
+
+class _Watch:
+    def unsubscribe(self) -> None:
+        pass
+
+
+class _Collection:
+    def __init__(self, client: InMemoryFirestore, path: Path) -> None:
+        self._client = client
+        self._path = path
+
+    def document(self, document_id: str | None = None) -> _Document:
+        return _Document(self._client, self._path + (document_id or uuid.uuid4().hex,))
+
+    def stream(self) -> Iterator[_Snapshot] | AsyncIterator[_Snapshot]:
+        if self._client.asynchronous:
+            return self._astream()
+        self._client._wait()
+        return iter(self._snapshots())
+
+    def on_snapshot(self, callback: Callable[[list, list, Any], None]) -> _Watch:
+        """Deliver the current documents once; the store never changes them."""
+        callback(self._snapshots(), [], None)
+        return _Watch()
+
+    async def _astream(self) -> AsyncIterator[_Snapshot]:
+        await self._client._await()
+        for snapshot in self._snapshots():
+            yield snapshot
+
+    def _snapshots(self) -> list[_Snapshot]:
+        return [
+            _Snapshot(document_id, data)
+            for document_id, data in self._client.store.children(self._path)
+        ]
+
+
+class InMemoryFirestore:
+    """Client facade over an :class:`InMemoryStore`."""
+
+    def __init__(self, store: InMemoryStore, *, asynchronous: bool = False) -> None:
+        self.store = store
+        self.asynchronous = asynchronous
+
+    def collection(self, name: str) -> _Collection:
+        return _Collection(self, (name,))
+
+    def _call(self, operation: Callable[[], Any]) -> Any:
+        if self.asynchronous:
+            return self._acall(operation)
+        self._wait()
+        return operation()
+
+    async def _acall(self, operation: Callable[[], Any]) -> Any:
+        await self._await()
+        return operation()
+
+    def _wait(self) -> None:
+        if self.store.latency_seconds:
+            time.sleep(self.store.latency_seconds)
+
+    async def _await(self) -> None:
+        if self.store.latency_seconds:
+            await asyncio.sleep(self.store.latency_seconds)
+
+
+def install(*, latency_seconds: float = 0.0) -> InMemoryStore:
+    """Point ``firestore_service`` at a fresh in-memory store and return it."""
+    from src.services import firestore_service
+
+    store = InMemoryStore(latency_seconds=latency_seconds)
+    firestore_service.firestore_client = InMemoryFirestore(store)
+    firestore_service.async_firestore_client = InMemoryFirestore(
+        store, asynchronous=True
+    )
+    return store
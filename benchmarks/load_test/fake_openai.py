@@ -0,0 +1,222 @@
+"""OpenAI-compatible chat completions server that plays the stage agents.
+
+Replies are streamed at ``tokens_per_second`` after ``first_token_seconds``.
+Requests that offer a stage end tool (``end_*``) call it once the stage
+transcript holds ``turns_per_stage`` user messages, so conversations move
+through every stage. The first user message of a stage that offers
+``perplexity_search`` calls that tool first. Replies contain a request
+counter, so the distilled party matching questions never hit a cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+from aiohttp import web
+
+WORDS = (
+    "Das ist ein wichtiger Punkt und ich verstehe deine Sicht auf die Frage "
+    "wie Parteien Migration Arbeit und Klima in Deutschland gestalten wollen"
+).split()
+
+
+@dataclass
+class FakeOpenAIConfig:
+    tokens_per_second: float = 60.0
+    first_token_seconds: float = 0.3
+    reply_tokens: int = 60
+    turns_per_stage: int = 2
+
+
+class FakeOpenAI:
+    def __init__(self, config: FakeOpenAIConfig) -> None:
+        self.config = config
+        self._requests = itertools.count(1)
+
+    def attach(self, app: web.Application) -> None:
+        for prefix in ("", "/v1"):
+            app.router.add_post(f"{prefix}/chat/completions", self.chat_completions)
+            app.router.add_post(f"{prefix}/embeddings", self.embeddings)
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        number = next(self._requests)
+        tool_call = self._tool_call(body)
+        words = [] if tool_call else self._reply(number)
+
+        if not body.get("stream"):
+            await asyncio.sleep(
+                self.config.first_token_seconds
+                + len(words) / self.config.tokens_per_second
+            )
+            return web.json_response(self._completion(body, words, tool_call))
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        async def send(choices: list[dict], **extra: Any) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": choices,
+                **extra,
+            }
+            await response.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+
+        await asyncio.sleep(self.config.first_token_seconds)
+        if tool_call is not None:
+            name, arguments = tool_call
+            await send(
+                [
+                    {
+                        "index": 0,
+                        "delta": {
+                            "role": "assistant",
+                            "tool_calls": [
+                                {
+                                    "index": 0,
+                                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                                    "type": "function",
+                                    "function": {"name": name, "arguments": ""},
+                                }
+                            ],
+                        },
+                        "finish_reason": None,
+                    }
+                ]
+            )
+            await send(
+                [
+                    {
+                        "index": 0,
+                        "delta": {
+                            "tool_calls": [
+                                {"index": 0, "function": {"arguments": arguments}}
+                            ]
+                        },
+                        "finish_reason": None,
+                    }
+                ]
+            )
+            finish_reason = "tool_calls"
+        else:
+            interval = 1 / self.config.tokens_per_second
+            for index, word in enumerate(words):
+                if index:
+                    await asyncio.sleep(interval)
+                delta = {"content": word if index == 0 else f" {word}"}
+                if index == 0:
+                    delta["role"] = "assistant"
+                await send([{"index": 0, "delta": delta, "finish_reason": None}])
+            finish_reason = "stop"
+
+        await send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send([], usage=self._usage(body, words))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        inputs = body.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        return web.json_response(
+            {
+                "object": "list",
+                "model": body.get("model", "fake"),
+                "data": [
+                    {"object": "embedding", "index": index, "embedding": _embed(text)}
+                    for index, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        )
+
+    def _tool_call(self, body: dict) -> tuple[str, str] | None:
+        messages = body.get("messages") or []
+        if not messages or messages[-1].get("role") != "user":
+            return None
+
+        tools = {
+            tool["function"]["name"]: tool["function"]
+            for tool in body.get("tools") or []
+        }
+        user_turns = sum(1 for message in messages if message.get("role") == "user")
+        if "perplexity_search" in tools and user_turns == 1:
+            return "perplexity_search", json.dumps({"query": "Fakten zur Migration"})
+
+        if user_turns < self.config.turns_per_stage:
+            return None
+        for name, function in tools.items():
+            if name.startswith("end_"):
+                properties = (function.get("parameters") or {}).get("properties", {})
+                arguments = {
+                    parameter: "Der Nutzer möchte eine ausgewogene Lösung."
+                    for parameter in properties
+                }
+                return name, json.dumps(arguments)
+        return None
+
+    def _reply(self, number: int) -> list[str]:
+        count = self.config.reply_tokens
+        words = [WORDS[(number + index) % len(WORDS)] for index in range(count - 1)]
+        return [*words, f"#{number}"]
+
+    def _completion(
+        self, body: dict, words: list[str], tool_call: tuple[str, str] | None
+    ) -> dict:
+        message: dict[str, Any] = {"role": "assistant", "content": " ".join(words)}
+        if tool_call is not None:
+            message["content"] = None
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": tool_call[0], "arguments": tool_call[1]},
+                }
+            ]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_call else "stop",
+                }
+            ],
+            "usage": self._usage(body, words),
+        }
+
+    @staticmethod
+    def _usage(body: dict, words: list[str]) -> dict:
+        prompt_tokens = sum(
+            len(str(message.get("content") or "")) // 4
+            for message in body.get("messages") or []
+        )
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+
+
+def _embed(text: str, dimensions: int = 64) -> list[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[index % len(digest)] - 128) / 128 for index in range(dimensions)]
@@ -0,0 +1,73 @@
+"""socket.io server that answers like the wahl.chat backend.
+
+Implements the events the service's ``wahl_chat_service`` speaks:
+``chat_session_init`` is acknowledged with ``chat_session_initialized``, and a
+``chat_answer_request`` is answered with ``sources_ready`` and
+``party_response_complete`` per party, spaced ``party_interval_seconds``
+apart, followed by ``chat_response_complete``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import socketio
+from aiohttp import web
+
+
+class FakeWahlChat:
+    def __init__(
+        self, *, first_party_seconds: float = 1.0, party_interval_seconds: float = 0.3
+    ) -> None:
+        self.first_party_seconds = first_party_seconds
+        self.party_interval_seconds = party_interval_seconds
+        self.sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*")
+        self.sio.on("chat_session_init", self.chat_session_init)
+        self.sio.on("chat_answer_request", self.chat_answer_request)
+        self._tasks: set[asyncio.Task] = set()
+
+    def attach(self, app: web.Application) -> None:
+        self.sio.attach(app)
+
+    async def chat_session_init(self, sid: str, data: dict) -> None:
+        await self.sio.emit(
+            "chat_session_initialized", {"session_id": data["session_id"]}, to=sid
+        )
+
+    async def chat_answer_request(self, sid: str, data: dict) -> None:
+        task = asyncio.get_running_loop().create_task(self._answer(sid, data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _answer(self, sid: str, data: dict) -> None:
+        session_id = data["session_id"]
+        await asyncio.sleep(self.first_party_seconds)
+        for index, party_id in enumerate(data["party_ids"]):
+            if index:
+                await asyncio.sleep(self.party_interval_seconds)
+            await self.sio.emit(
+                "sources_ready",
+                {
+                    "session_id": session_id,
+                    "party_id": party_id,
+                    "sources": [
+                        {"source": f"Wahlprogramm {party_id}", "page": 12 + index}
+                    ],
+                },
+                to=sid,
+            )
+            await self.sio.emit(
+                "party_response_complete",
+                {
+                    "session_id": session_id,
+                    "party_id": party_id,
+                    "complete_message": (
+                        f"Die Position von {party_id} zu '{data['user_message']}' "
+                        "ist im Wahlprogramm beschrieben [1]."
+                    ),
+                },
+                to=sid,
+            )
+        await self.sio.emit(
+            "chat_response_complete", {"session_id": session_id}, to=sid
+        )
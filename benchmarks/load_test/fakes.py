@@ -0,0 +1,72 @@
+"""Serve the fake OpenAI API and the fake wahl.chat backend on one port.
+
+poetry run python -m benchmarks.load_test.fakes --port 8790
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from aiohttp import web
+
+from benchmarks.load_test.fake_openai import FakeOpenAI, FakeOpenAIConfig
+from benchmarks.load_test.fake_wahl_chat import FakeWahlChat
+
+
+def create_app(
+    openai_config: FakeOpenAIConfig,
+    *,
+    first_party_seconds: float,
+    party_interval_seconds: float,
+) -> web.Application:
+    app = web.Application()
+    FakeOpenAI(openai_config).attach(app)
+    FakeWahlChat(
+        first_party_seconds=first_party_seconds,
+        party_interval_seconds=party_interval_seconds,
+    ).attach(app)
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--turns-per-stage", type=int, default=2)
+    parser.add_argument("--first-party-ms", type=float, default=1000)
+    parser.add_argument("--party-interval-ms", type=float, default=300)
+
+
+def fake_arguments(args: argparse.Namespace) -> list[str]:
+    """Command line options of this module from the parsed ``args``."""
+    return [
+        f"--tokens-per-second={args.tokens_per_second}",
+        f"--first-token-ms={args.first_token_ms}",
+        f"--reply-tokens={args.reply_tokens}",
+        f"--turns-per-stage={args.turns_per_stage}",
+        f"--first-party-ms={args.first_party_ms}",
+        f"--party-interval-ms={args.party_interval_ms}",
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8790)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(
+            FakeOpenAIConfig(
+                tokens_per_second=args.tokens_per_second,
+                first_token_seconds=args.first_token_ms / 1000,
+                reply_tokens=args.reply_tokens,
+                turns_per_stage=args.turns_per_stage,
+            ),
+            first_party_seconds=args.first_party_ms / 1000,
+            party_interval_seconds=args.party_interval_ms / 1000,
+        ),
+        host="127.0.0.1",
+        port=args.port,
+        print=None,
+    )
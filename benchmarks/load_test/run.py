@@ -0,0 +1,277 @@
+"""Drive full conversations through the service at increasing concurrency.
+
+Starts the fakes and the service as subprocesses (or targets ``--target``),
+then, for every concurrency level, lets that many simulated users each play
+``--conversations`` conversations from START to END. Reported per level:
+
+- time to first event of every /chat-stream turn (p50/p95/p99),
+- stage transition latency: on turns that end a stage, the time until the
+  next stage's first message starts (or its first event for party matching),
+- errors and throughput.
+
+The highest level whose p95 time to first event stays within ``--slo-ms``
+without errors is reported as the maximum sustainable concurrency.
+
+    poetry run python -m benchmarks.load_test.run --server asgi --concurrency 1,8,32
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import httpx
+
+from benchmarks.load_test.fakes import add_arguments, fake_arguments
+
+USER_MESSAGE = "Ich finde, wir brauchen klare Regeln und trotzdem Menschlichkeit."
+TOPIC = "Migration"
+
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    ttfe: list[float] = field(default_factory=list)
+    transitions: dict[str, list[float]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+    conversations: int = 0
+    turns: int = 0
+    errors: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def percentile(values: list[float], share: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[
+        round(share * 100) - 1
+    ]
+
+
+def parse_event(line: str) -> dict | None:
+    line = line.strip()
+    if line.startswith("data:"):
+        line = line[len("data:") :].strip()
+    return json.loads(line) if line else None
+
+
+async def play_turn(
+    client: httpx.AsyncClient, conversation_id: str
+) -> tuple[float, float | None, float | None]:
+    """Return the time to the first event, message start and end of a turn."""
+    started = time.perf_counter()
+    first_event = first_message = None
+    async with client.stream(
+        "POST",
+        "/chat-stream",
+        json={"conversation_id": conversation_id, "user_message": USER_MESSAGE},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            event = parse_event(line)
+            if event is None:
+                continue
+            elapsed = time.perf_counter() - started
+            if first_event is None:
+                first_event = elapsed
+            if first_message is None and event["type"] == "message_start":
+                first_message = elapsed
+    if first_event is None:
+        raise RuntimeError("Turn produced no events")
+    return first_event, first_message, time.perf_counter() - started
+
+
+async def stage_of(client: httpx.AsyncClient, conversation_id: str) -> str:
+    response = await client.get(f"/conversation-stage/{conversation_id}")
+    response.raise_for_status()
+    return response.json()["stage"]
+
+
+async def play_conversation(
+    client: httpx.AsyncClient, result: LevelResult, max_turns: int
+) -> None:
+    response = await client.post("/chat-start", json={"topic": TOPIC})
+    response.raise_for_status()
+    conversation_id = response.json()["conversation_id"]
+
+    stage = "start"
+    for _ in range(max_turns):
+        first_event, first_message, _duration = await play_turn(client, conversation_id)
+        result.turns += 1
+        result.ttfe.append(first_event)
+
+        next_stage = await stage_of(client, conversation_id)
+        if next_stage != stage and stage != "start":
+            # Party matching reports progress long before its message starts
+            latency = first_message if next_stage != "end" else first_event
+            result.transitions[f"{stage} -> {next_stage}"].append(
+                latency if latency is not None else first_event
+            )
+        stage = next_stage
+        if stage == "end":
+            result.conversations += 1
+            return
+    raise RuntimeError(f"Conversation did not end within {max_turns} turns")
+
+
+async def run_level(
+    base_url: str, concurrency: int, conversations: int, max_turns: int
+) -> LevelResult:
+    result = LevelResult(concurrency=concurrency)
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    timeout = httpx.Timeout(120.0)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=timeout
+    ) as client:
+
+        async def user() -> None:
+            for _ in range(conversations):
+                try:
+                    await play_conversation(client, result, max_turns)
+                except Exception as exc:  # noqa: BLE001 - counted as an error
+                    result.errors.append(f"{type(exc).__name__}: {exc}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        result.seconds = time.perf_counter() - started
+    return result
+
+
+def report(result: LevelResult) -> None:
+    ms = [value * 1000 for value in result.ttfe]
+    print(
+        f"\nconcurrency {result.concurrency}: {result.conversations} conversations, "
+        f"{result.turns} turns in {result.seconds:.1f}s "
+        f"({result.turns / result.seconds:.1f} turns/s), {len(result.errors)} errors"
+    )
+    print(
+        f"  time to first event   p50 {percentile(ms, 0.50):8.1f}ms  "
+        f"p95 {percentile(ms, 0.95):8.1f}ms  p99 {percentile(ms, 0.99):8.1f}ms"
+    )
+    for transition, values in sorted(result.transitions.items()):
+        transition_ms = [value * 1000 for value in values]
+        print(
+            f"  {transition:<38} p50 {percentile(transition_ms, 0.50):8.1f}ms  "
+            f"p95 {percentile(transition_ms, 0.95):8.1f}ms"
+        )
+    for error in sorted(set(result.errors))[:5]:
+        print(f"  error: {error}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Nothing listens on port {port} after {timeout}s")
+
+
+@contextmanager
+def local_service(args: argparse.Namespace) -> Iterator[str]:
+    fakes_port, server_port = free_port(), free_port()
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.load_test.fakes",
+                f"--port={fakes_port}",
+                *fake_arguments(args),
+            ]
+        )
+    ]
+    try:
+        wait_for_port(fakes_port)
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.load_test.server",
+                    f"--port={server_port}",
+                    f"--fakes-url=http://127.0.0.1:{fakes_port}",
+                    f"--server={args.server}",
+                    f"--firestore-latency-ms={args.firestore_latency_ms}",
+                ],
+                stdout=subprocess.DEVNULL if not args.server_output else None,
+            )
+        )
+        wait_for_port(server_port)
+        yield f"http://127.0.0.1:{server_port}"
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def run_levels(args: argparse.Namespace, base_url: str) -> None:
+    sustainable = None
+    for concurrency in args.concurrency:
+        result = asyncio.run(
+            run_level(base_url, concurrency, args.conversations, args.max_turns)
+        )
+        report(result)
+        p95_ms = percentile(result.ttfe, 0.95) * 1000
+        if result.errors or not p95_ms <= args.slo_ms:
+            print(f"  p95 time to first event above {args.slo_ms:.0f}ms or errors")
+            break
+        sustainable = concurrency
+
+    print(
+        f"\nmax sustainable concurrency (p95 time to first event <= "
+        f"{args.slo_ms:.0f}ms, no errors): {sustainable or 'none of the levels'}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(level) for level in value.split(",")],
+        default=[1, 4, 16, 64],
+    )
+    parser.add_argument("--conversations", type=int, default=2)
+    parser.add_argument("--max-turns", type=int, default=30)
+    parser.add_argument("--slo-ms", type=float, default=1500)
+    parser.add_argument("--server", choices=("asgi", "flask"), default="asgi")
+    parser.add_argument("--firestore-latency-ms", type=float, default=5)
+    parser.add_argument("--target", help="URL of an already running service")
+    parser.add_argument("--server-output", action="store_true")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.target:
+        run_levels(args, args.target)
+        return
+    with local_service(args) as base_url:
+        run_levels(args, base_url)
+
+
+if __name__ == "__main__":
+    main()
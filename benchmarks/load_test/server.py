@@ -0,0 +1,60 @@
+"""Run the service against the fakes with an in-memory Firestore.
+
+    poetry run python -m benchmarks.load_test.server --fakes-url http://127.0.0.1:8790
+
+``--server asgi`` serves the ASGI app with uvicorn; ``--server flask`` serves
+the Flask app with the threaded werkzeug server, which is not gunicorn but
+runs the same one-thread-per-stream code path.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--fakes-url", default="http://127.0.0.1:8790")
+    parser.add_argument("--server", choices=("asgi", "flask"), default="asgi")
+    parser.add_argument("--firestore-latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    # Configure the service before any of its modules read the environment
+    os.environ["OPENAI_BASE_URL"] = f"{args.fakes_url}/v1"
+    os.environ["OPENAI_API_KEY"] = "load-test"
+    os.environ["WAHL_CHAT_BACKEND_URL"] = args.fakes_url
+    os.environ.setdefault("PERPLEXITY_CACHE_TTL_SECONDS", "0")
+
+    from benchmarks.load_test.fake_firestore import install
+    from benchmarks.party_positions_token_benchmark import synthetic_positions
+
+    store = install(latency_seconds=args.firestore_latency_ms / 1000)
+
+    from src.stages.party_positioning import TOPIC_IDS
+
+    for topic_id in TOPIC_IDS.values():
+        for party_id, position in synthetic_positions(words_per_field=20):
+            store.documents[
+                ("wahl_agent_topics", topic_id, "party_positions", party_id)
+            ] = position
+
+    if args.server == "asgi":
+        import uvicorn
+
+        from src.asgi import app
+
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        from werkzeug.serving import make_server
+
+        from src.controller import app
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        make_server("127.0.0.1", args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Time spent on the request thread per log line: ``print`` vs. the queue logger.
+
+``--threads`` request threads each write ``--lines`` log lines, the way stage
+turns did with ``print``, into a sink whose writes take ``--write-us``
+microseconds (a container log pipe under load). ``print`` writes and formats
+on the calling thread and contends for the sink; the structured logger only
+enqueues the record. Reported is the time per call on the request threads,
+p50 and p99, plus how many records the full queue dropped.
+
+    poetry run python -m benchmarks.logging_benchmark --threads 32 --write-us 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import statistics
+import threading
+import time
+from typing import Callable
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.utils.structured_logging import (  # noqa: E402
+    configure_logging,
+    log_context,
+    shutdown_logging,
+)
+
+PROMPT = "Partei: SPD\nPosition: " + "Die Partei fordert klare Regeln. " * 200
+
+
+class SlowSink:
+    """File-like sink whose writes block for a fixed time, serialized."""
+
+    def __init__(self, write_seconds: float) -> None:
+        self.write_seconds = write_seconds
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            deadline = time.perf_counter() + self.write_seconds
+            while time.perf_counter() < deadline:
+                pass
+            self.lines += text.count("\n")
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def measure(threads: int, lines: int, log_line: Callable[[int], None]) -> list[float]:
+    durations: list[list[float]] = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads)
+
+    def request_thread(index: int) -> None:
+        barrier.wait()
+        with log_context(conversation_id=f"conversation-{index}", stage="deliberation"):
+            for line in range(lines):
+                started = time.perf_counter()
+                log_line(line)
+                durations[index].append(time.perf_counter() - started)
+
+    workers = [
+        threading.Thread(target=request_thread, args=(index,))
+        for index in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [duration for thread in durations for duration in thread]
+
+
+def report(name: str, durations: list[float]) -> None:
+    microseconds = sorted(duration * 1e6 for duration in durations)
+    p99 = microseconds[int(len(microseconds) * 0.99) - 1]
+    print(f"{name:<22} p50 {statistics.median(microseconds):9.1f}us  p99 {p99:9.1f}us")
+
+
+def run(threads: int, lines: int, write_us: float) -> None:
+    print_sink = SlowSink(write_us / 1e6)
+
+    def print_line(line: int) -> None:
+        if line % 10 == 0:
+            print("Party matching prompt: ", PROMPT, file=print_sink)
+        else:
+            print(
+                f"Stream [deliberation]: ttft={line}ms tokens/s=42.0 duration=900ms",
+                file=print_sink,
+            )
+
+    report("print", measure(threads, lines, print_line))
+
+    logger_sink = SlowSink(write_us / 1e6)
+    configure_logging(level="INFO", stream=logger_sink)
+    logger = logging.getLogger("benchmark")
+
+    def log_line(line: int) -> None:
+        if line % 10 == 0:
+            logger.info("Party matching prompt", extra={"payload": PROMPT})
+        else:
+            logger.info(
+                "Stream finished",
+                extra={"agent": "deliberation", "ttft_ms": line, "duration_ms": 900},
+            )
+
+    report("structured logger", measure(threads, lines, log_line))
+    shutdown_logging()
+    print(
+        f"{threads * lines} records, {logger_sink.lines} written, "
+        f"{threads * lines - logger_sink.lines} dropped by the full queue"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--write-us", type=float, default=50)
+    args = parser.parse_args()
+    run(args.threads, args.lines, args.write_us)
@@ -0,0 +1,86 @@
+"""Prompt tokens of the party positions block: Python repr vs. canonical renderer.
+
+Uses synthetic positions shaped like the documents in
+``wahl_agent_topics/<id>/party_positions`` and counts tokens with the
+``o200k_base`` encoding used by current OpenAI models. If the encoding cannot
+be loaded (it is downloaded on first use), tokens are approximated by counting
+words and punctuation marks.
+
+    poetry run python -m benchmarks.party_positions_token_benchmark
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import time
+from typing import Callable
+from datetime import datetime, timezone
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import tiktoken  # noqa: E402
+
+from src.prompts import render_party_positions  # noqa: E402
+
+PARTIES = ["linke", "gruene", "spd", "cdu", "afd"]
+
+
+def synthetic_positions(words_per_field: int) -> list[tuple[str, dict]]:
+    filler = " ".join(["Maßnahmen"] * words_per_field)
+    updated_at = datetime(2025, 1, 15, 9, 30, tzinfo=timezone.utc)
+    return [
+        (
+            party_id,
+            {
+                "positionLeftToRight": float(index),
+                "party": party_id,
+                "summary": f"Zusammenfassung der Position von {party_id}: {filler}",
+                "goals": [f"Ziel {n}: {filler}" for n in range(3)],
+                "methods": [f"Instrument {n}: {filler}" for n in range(3)],
+                "sources": [
+                    {"title": f"Wahlprogramm {party_id}", "page": 12 + index},
+                    {"title": "Bundestagsrede", "page": None},
+                ],
+                "isVerified": True,
+                "notes": None,
+                "updatedAt": updated_at,
+            },
+        )
+        for index, party_id in enumerate(PARTIES)
+    ]
+
+
+def token_counter() -> tuple[str, Callable[[str], int]]:
+    try:
+        encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as exc:  # noqa: BLE001 - offline or missing cache
+        print(f"o200k_base unavailable ({type(exc).__name__}), approximating tokens")
+        return "approx. tokens", lambda text: len(re.findall(r"\w+|[^\w\s]", text))
+    return "tokens", lambda text: len(encoding.encode(text))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words-per-field", type=int, default=20)
+    parser.add_argument("--renders", type=int, default=1000)
+    args = parser.parse_args()
+
+    unit, count_tokens = token_counter()
+    positions = synthetic_positions(args.words_per_field)
+
+    for name, render in (("repr", str), ("canonical", render_party_positions)):
+        block = render(positions)
+        started = time.perf_counter()
+        for _ in range(args.renders):
+            render(positions)
+        per_render_us = (time.perf_counter() - started) / args.renders * 1e6
+        print(
+            f"{name:>9}: {count_tokens(block):5d} {unit}, "
+            f"{len(block):6d} chars, {per_render_us:7.1f} µs per render"
+        )
+
+
+if __name__ == "__main__":
+    main()
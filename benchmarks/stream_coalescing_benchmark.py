@@ -0,0 +1,142 @@
+"""Writes, CPU time and added latency of /chat-stream with and without coalescing.
+
+A synthetic reply of ``--tokens`` tokens is encoded as NDJSON and every
+resulting line is written to ``/dev/null`` with one ``os.write`` call, the
+same one-write-per-frame pattern the server follows. Two scenarios:
+
+- burst: tokens arrive back to back, which measures encoding and write CPU;
+- paced: tokens arrive every ``--interval-ms`` like a streaming model, which
+  measures how many writes remain and how long chunks are held back.
+
+    poetry run python -m benchmarks.stream_coalescing_benchmark --tokens 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Iterator
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from src.events import EventType  # noqa: E402
+from src.utils.event_coalescing import (  # noqa: E402
+    acoalesce_events,
+    coalesce_events,
+)
+from src.utils.events import encode_event  # noqa: E402
+
+TOKENS = ["Die", " Parteien", " unterscheiden", " sich", " hier", " deutlich", "."]
+
+
+def reply_events(tokens: int, interval: float = 0.0) -> Iterator[dict]:
+    yield {"type": EventType.MESSAGE_START.value}
+    for index in range(tokens):
+        if interval:
+            time.sleep(interval)
+        yield {
+            "type": EventType.MESSAGE_CHUNK.value,
+            "content": TOKENS[index % len(TOKENS)],
+        }
+    yield {"type": EventType.MESSAGE_END.value}
+    yield {"type": EventType.END.value}
+
+
+async def areply_events(tokens: int, interval: float) -> AsyncIterator[dict]:
+    yield {"type": EventType.MESSAGE_START.value}
+    for index in range(tokens):
+        await asyncio.sleep(interval)
+        yield {
+            "type": EventType.MESSAGE_CHUNK.value,
+            "content": TOKENS[index % len(TOKENS)],
+        }
+    yield {"type": EventType.MESSAGE_END.value}
+    yield {"type": EventType.END.value}
+
+
+def write_all(events: Iterator[dict], fd: int) -> int:
+    writes = 0
+    for event in events:
+        os.write(fd, encode_event(event))
+        writes += 1
+    return writes
+
+
+def burst(tokens: int, replies: int, window_ms: float, fd: int) -> tuple[float, int]:
+    started = time.process_time()
+    writes = 0
+    for _ in range(replies):
+        writes += write_all(
+            coalesce_events(reply_events(tokens), window_seconds=window_ms / 1000),
+            fd,
+        )
+    cpu_ms = (time.process_time() - started) * 1000 / replies
+    return cpu_ms, writes // replies
+
+
+def paced(tokens: int, interval: float, window_ms: float, fd: int) -> tuple[int, float]:
+    writes = 0
+    last_write = time.perf_counter()
+    max_gap = 0.0
+    for event in coalesce_events(
+        reply_events(tokens, interval), window_seconds=window_ms / 1000
+    ):
+        os.write(fd, encode_event(event))
+        now = time.perf_counter()
+        max_gap = max(max_gap, now - last_write)
+        last_write = now
+        writes += 1
+    return writes, max_gap * 1000
+
+
+async def apaced(
+    tokens: int, interval: float, window_ms: float, fd: int
+) -> tuple[int, float]:
+    writes = 0
+    last_write = time.perf_counter()
+    max_gap = 0.0
+    async for event in acoalesce_events(
+        areply_events(tokens, interval), window_seconds=window_ms / 1000
+    ):
+        os.write(fd, encode_event(event))
+        now = time.perf_counter()
+        max_gap = max(max_gap, now - last_write)
+        last_write = now
+        writes += 1
+    return writes, max_gap * 1000
+
+
+def run(tokens: int, replies: int, interval_ms: float, window_ms: float) -> None:
+    fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        print(f"burst: {tokens} tokens per reply, {replies} replies")
+        print(f"{'window':>10} {'writes/reply':>13} {'cpu/reply':>10}")
+        for window in (0.0, window_ms):
+            cpu_ms, writes = burst(tokens, replies, window, fd)
+            print(f"{window:>8.0f}ms {writes:>13} {cpu_ms:>8.2f}ms")
+
+        print()
+        print(f"paced: {tokens} tokens every {interval_ms:.0f}ms")
+        print(
+            f"{'window':>10} {'path':>6} {'writes':>7} {'max gap between writes':>23}"
+        )
+        interval = interval_ms / 1000
+        for window in (0.0, window_ms):
+            writes, max_gap = paced(tokens, interval, window, fd)
+            print(f"{window:>8.0f}ms {'sync':>6} {writes:>7} {max_gap:>21.1f}ms")
+            writes, max_gap = asyncio.run(apaced(tokens, interval, window, fd))
+            print(f"{window:>8.0f}ms {'async':>6} {writes:>7} {max_gap:>21.1f}ms")
+    finally:
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--replies", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--window-ms", type=float, default=30)
+    args = parser.parse_args()
+    run(args.tokens, args.replies, args.interval_ms, args.window_ms)
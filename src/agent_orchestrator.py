@@ -1,82 +1,163 @@
-from typing import Iterator
-from openai import OpenAI
-import os
+import logging
+from typing import Any, AsyncIterator, Iterator
 from dotenv import load_dotenv
 
-from src.stages.deliberation import deliberation
-from src.utils.events import stream_single_message
+from src.stages.deliberation import deliberation, deliberation_async
+from src.utils.events import astream_single_message, stream_single_message
 
 from src.conversation.conversation_state import (
     ConversationState,
     ConversationStage,
-    deserialize_messages,
+    STAGE_MESSAGE_FIELDS,
 )
-from src.stages.active_listening import active_listening
-from src.stages.start import start
-from src.stages.party_positioning import party_positioning
-from src.stages.perspective_taking import perspective_taking
+from src.stages.active_listening import active_listening, active_listening_async
+from src.stages.start import start, start_async
+from src.stages.party_positioning import party_positioning, party_positioning_async
+from src.stages.perspective_taking import perspective_taking, perspective_taking_async
 
-from src.services.firestore_service import get_conversation
+# Registers the start of the party matching stage, entered from deliberation
+import src.stages.party_matching  # noqa: F401
+
+from src.services.firestore_service import (
+    ConversationWriteBatch,
+    get_conversation,
+    get_conversation_async,
+)
+from src.utils.structured_logging import log_context
+from src.utils.telemetry import metrics
 
 load_dotenv()
 
-openai_client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    base_url=os.getenv("OPENAI_BASE_URL"),
+logger = logging.getLogger(__name__)
+
+CHAT_TURNS = metrics.counter(
+    "chat_turns_total", "Chat turns by the stage they started in.", ("stage",)
 )
 
 
+class ConversationNotFoundError(ValueError):
+    pass
+
+
 def chat(conversation_id: str, user_message: str) -> Iterator[dict]:
-    conversation = get_conversation_by_id(conversation_id)
+    # Stage functions write eagerly before returning their iterators, so the
+    # batch already collects while the turn is dispatched.
+    batch = ConversationWriteBatch(conversation_id)
+    try:
+        conversation = get_conversation_by_id(conversation_id)
+        context = {
+            "conversation_id": conversation_id,
+            "stage": conversation.stage.value,
+        }
+        with batch.collecting(), log_context(**context):
+            events = dispatch_stage(conversation, user_message)
+    except BaseException:
+        batch.flush()
+        raise
+    return flush_after_stream(batch, events, context)
+
+
+def flush_after_stream(
+    batch: ConversationWriteBatch,
+    events: Iterator[dict],
+    context: dict[str, Any] | None = None,
+) -> Iterator[dict]:
+    try:
+        with batch.collecting(), log_context(**(context or {})):
+            yield from events
+    finally:
+        batch.flush()
+
+
+def dispatch_stage(
+    conversation: ConversationState, user_message: str
+) -> Iterator[dict]:
     stage = conversation.stage
+    CHAT_TURNS.inc(stage=stage.value)
+    logger.info("Conversation in %s stage", stage.value)
     match stage:
         case ConversationStage.START:
-            print("Starting conversation")
             return start(conversation, user_message)
         case ConversationStage.ACTIVE_LISTENING:
-            print("Conversation in active listening stage")
             return active_listening(conversation, user_message)
         case ConversationStage.PARTY_POSITIONING:
-            print("Conversation in party positioning stage")
             return party_positioning(conversation, user_message)
         case ConversationStage.PERSPECTIVE_TAKING:
-            print("Conversation in perspective taking stage")
             return perspective_taking(conversation, user_message)
         case ConversationStage.DELIBERATION:
-            print("Conversation in deliberation stage")
             return deliberation(conversation, user_message)
         case ConversationStage.PARTY_MATCHING:
-            print("Conversation in party matching stage")
             return stream_single_message("Implement party matching stage")
         case ConversationStage.END:
-            print("Reached End tage")
             return stream_single_message("Dialog ist beendet. Danke für die Teilnahme.")
 
 
+async def chat_async(
+    conversation: ConversationState, user_message: str
+) -> AsyncIterator[dict]:
+    """Async counterpart of :func:`chat` used by the ASGI entry point.
+
+    The caller loads ``conversation`` with :func:`get_conversation_by_id_async`
+    before it starts the response, so a missing one can still be answered
+    with a 404. Writes are not batched here; the caller wraps the stream in
+    :func:`conversation_write_batch_async` so it can flush before the
+    response ends.
+    """
+    conversation_id = conversation.id
+    stage = conversation.stage
+    CHAT_TURNS.inc(stage=stage.value)
+    with log_context(conversation_id=conversation_id, stage=stage.value):
+        logger.info("Conversation in %s stage", stage.value)
+        match stage:
+            case ConversationStage.START:
+                events = start_async(conversation, user_message)
+            case ConversationStage.ACTIVE_LISTENING:
+                events = active_listening_async(conversation, user_message)
+            case ConversationStage.PARTY_POSITIONING:
+                events = party_positioning_async(conversation, user_message)
+            case ConversationStage.PERSPECTIVE_TAKING:
+                events = perspective_taking_async(conversation, user_message)
+            case ConversationStage.DELIBERATION:
+                events = deliberation_async(conversation, user_message)
+            case ConversationStage.PARTY_MATCHING:
+                events = astream_single_message("Implement party matching stage")
+            case ConversationStage.END:
+                events = astream_single_message(
+                    "Dialog ist beendet. Danke für die Teilnahme."
+                )
+
+        async for event in events:
+            yield event
+
+
 def get_conversation_by_id(conversation_id: str) -> ConversationState:
-    firestore_doc = get_conversation(conversation_id)
+    return conversation_state_from_document(
+        conversation_id, get_conversation(conversation_id)
+    )
+
+
+async def get_conversation_by_id_async(conversation_id: str) -> ConversationState:
+    return conversation_state_from_document(
+        conversation_id, await get_conversation_async(conversation_id)
+    )
+
 
+def conversation_state_from_document(
+    conversation_id: str, firestore_doc: dict[str, Any] | None
+) -> ConversationState:
     if not firestore_doc:
-        raise ValueError(
+        raise ConversationNotFoundError(
             f"Conversation with ID '{conversation_id}' not found in Firestore"
         )
 
-    # Create ConversationState with topic from Firestore
+    # Create ConversationState with topic from Firestore. The transcripts are
+    # only deserialized when a stage reads them.
     conversation_state = ConversationState(
         topic=firestore_doc["topic"],
         id=conversation_id,
-        active_listening_messages=deserialize_messages(
-            firestore_doc.get("active_listening_messages", [])
-        ),
-        party_positioning_messages=deserialize_messages(
-            firestore_doc.get("party_positioning_messages", [])
-        ),
-        perspective_taking_messages=deserialize_messages(
-            firestore_doc.get("perspective_taking_messages", [])
-        ),
-        deliberation_messages=deserialize_messages(
-            firestore_doc.get("deliberation_messages", [])
-        ),
+        raw_messages={
+            field: firestore_doc.get(field) or [] for field in STAGE_MESSAGE_FIELDS
+        },
         active_listening_summary=firestore_doc.get("active_listening_summary", None),
         party_positioning_summary=firestore_doc.get("party_positioning_summary", None),
         perspective_taking_summary=firestore_doc.get(
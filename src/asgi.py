@@ -0,0 +1,139 @@
+"""ASGI entry point that serves /chat-stream natively on the event loop.
+
+The stage pipeline runs on ``agent.astream``, async Firestore and the async
+socket.io client, so a single worker can hold many concurrent streams instead
+of pinning one thread per conversation. Every other route is delegated to the
+Flask app in ``src.controller``.
+
+Run with e.g. ``uvicorn src.asgi:app --workers 1``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+from typing import Any, Awaitable, Callable
+
+from asgiref.wsgi import WsgiToAsgi
+
+from src.agent_orchestrator import (
+    ConversationNotFoundError,
+    chat_async,
+    get_conversation_by_id_async,
+)
+from src.controller import app as flask_app
+from src.services.firestore_service import conversation_write_batch_async
+from src.utils.event_coalescing import acoalesce_events
+from src.utils.events import encode_event
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+
+_flask_asgi_app = WsgiToAsgi(flask_app)
+
+
+async def app(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if (
+        scope["type"] == "http"
+        and scope["path"] == "/chat-stream"
+        and scope["method"] == "POST"
+    ):
+        await chat_stream(scope, receive, send)
+        return
+
+    # asgiref keeps its executor state in context variables, which leak into
+    # the next request on a reused keep-alive connection and fail it with
+    # "CurrentThreadExecutor already quit or is broken"
+    await asyncio.create_task(
+        _flask_asgi_app(scope, receive, send), context=contextvars.Context()
+    )
+
+
+async def chat_stream(scope: Scope, receive: Receive, send: Send) -> None:
+    try:
+        payload = json.loads(await _read_body(receive) or b"{}") or {}
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        await _send_json(send, 400, {"error": "Invalid JSON payload"})
+        return
+
+    required_fields = ["user_message", "conversation_id"]
+    missing_fields = [field for field in required_fields if payload.get(field) is None]
+    if missing_fields:
+        await _send_json(
+            send,
+            400,
+            {"error": f"Missing required fields: {', '.join(missing_fields)}"},
+        )
+        return
+
+    # Loaded before the response starts, so that a missing conversation is a
+    # 404 like on the Flask route rather than a truncated 200 stream
+    try:
+        conversation = await get_conversation_by_id_async(payload["conversation_id"])
+    except ConversationNotFoundError:
+        await _send_json(send, 404, {"error": "Conversation not found"})
+        return
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8")],
+        }
+    )
+
+    # The batched Firestore write is saved before the response ends, so a
+    # client that reads the conversation right afterwards sees this turn
+    async with conversation_write_batch_async(payload["conversation_id"]):
+        events = acoalesce_events(chat_async(conversation, payload["user_message"]))
+        try:
+            async for event in events:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": encode_event(event),
+                        "more_body": True,
+                    }
+                )
+        finally:
+            await events.aclose()
+
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def _send_json(send: Send, status: int, data: dict) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": json.dumps(data).encode()})
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -1,17 +1,37 @@
-import json
-
 from dotenv import load_dotenv
 from flask import Flask, Response, jsonify, request
 
-from src.agent_orchestrator import chat
+from src.agent_orchestrator import ConversationNotFoundError, chat
+from src.stages.agent_registry import build_registered_agents
+from src.stages.party_positioning import preload_party_positions
+from src.stages.perspective_taking import (
+    PERPLEXITY_PREWARM_PATH,
+    prewarm_perplexity_search,
+)
+from src.services.party_position_store import PARTY_POSITIONS_PRELOAD
+from src.utils.event_coalescing import coalesce_events
+from src.utils.events import encode_event
+from src.utils.structured_logging import configure_logging
+from src.utils.telemetry import metrics
+from src.services.conversation_cache import CONVERSATION_CACHE_MAX_STALENESS_SECONDS
 from src.services.firestore_service import (
     save_conversation_metadata,
     get_conversation,
 )
 
 load_dotenv()
+configure_logging()
 app = Flask(__name__)
 
+# Compile every stage agent graph once per process, not on each chat turn
+build_registered_agents()
+
+if PARTY_POSITIONS_PRELOAD:
+    preload_party_positions()
+
+if PERPLEXITY_PREWARM_PATH:
+    prewarm_perplexity_search(PERPLEXITY_PREWARM_PATH)
+
 
 @app.route("/chat-start", methods=["POST"])
 def start_chat():
@@ -51,6 +71,8 @@ def start_chat():
 @app.route("/chat-stream", methods=["POST"])
 def chat_stream():
     payload = request.get_json(force=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Invalid JSON payload"}), 400
     required_fields = ["user_message", "conversation_id"]
     missing_fields = [field for field in required_fields if payload.get(field) is None]
     if missing_fields:
@@ -61,18 +83,28 @@ def chat_stream():
     user_message = payload.get("user_message")
     conversation_id = payload.get("conversation_id")
 
+    try:
+        events = chat(conversation_id, user_message)
+    except ConversationNotFoundError:
+        return jsonify({"error": "Conversation not found"}), 404
+
     return Response(
-        (
-            json.dumps(event).encode("utf-8") + b"\n"
-            for event in chat(conversation_id, user_message)
-        ),
+        (encode_event(event) for event in coalesce_events(events)),
         mimetype="text/event-stream",
     )
 
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/conversation-stage/<conversation_id>", methods=["GET"])
 def get_conversation_stage(conversation_id: str):
-    conversation = get_conversation(conversation_id)
+    conversation = get_conversation(
+        conversation_id,
+        max_staleness_seconds=CONVERSATION_CACHE_MAX_STALENESS_SECONDS,
+    )
 
     if conversation is None:
         return jsonify({"error": "Conversation not found"}), 404
@@ -82,7 +114,10 @@ def get_conversation_stage(conversation_id: str):
 
 @app.route("/conversation-messages/<conversation_id>", methods=["GET"])
 def get_conversation_messages(conversation_id: str):
-    conversation = get_conversation(conversation_id)
+    conversation = get_conversation(
+        conversation_id,
+        max_staleness_seconds=CONVERSATION_CACHE_MAX_STALENESS_SECONDS,
+    )
 
     if conversation is None:
         return jsonify({"error": "Conversation not found"}), 404
@@ -122,7 +157,10 @@ def get_conversation_messages(conversation_id: str):
 
 @app.route("/conversation-topic/<conversation_id>", methods=["GET"])
 def get_conversation_topic(conversation_id: str):
-    conversation = get_conversation(conversation_id)
+    conversation = get_conversation(
+        conversation_id,
+        max_staleness_seconds=CONVERSATION_CACHE_MAX_STALENESS_SECONDS,
+    )
 
     if conversation is None:
         return jsonify({"error": "Conversation not found"}), 404
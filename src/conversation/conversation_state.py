@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Iterable, Sequence
+from typing import Any, Iterable, Mapping, Sequence
 
 from langchain_core.messages import (
     BaseMessage,
@@ -21,7 +21,49 @@ class ConversationStage(Enum):
     END = "end"
 
 
+STAGE_MESSAGE_FIELDS = (
+    "active_listening_messages",
+    "party_positioning_messages",
+    "perspective_taking_messages",
+    "deliberation_messages",
+)
+
+
+class _StageMessages:
+    """Stage transcript that is deserialized on first access.
+
+    A turn only works on the transcript of the current stage, so the stored
+    payloads of the other stages are never turned into message objects.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.field = name
+
+    def __get__(
+        self, state: "ConversationState | None", owner: type
+    ) -> "list[BaseMessage] | _StageMessages":
+        if state is None:
+            return self
+        messages = state._messages.get(self.field)
+        if messages is None:
+            payloads = state._raw_messages.pop(self.field, ())
+            messages = deserialize_messages(payloads)
+            state._messages[self.field] = messages
+        return messages
+
+    def __set__(
+        self, state: "ConversationState", messages: Iterable[BaseMessage]
+    ) -> None:
+        state._raw_messages.pop(self.field, None)
+        state._messages[self.field] = list(messages)
+
+
 class ConversationState:
+    active_listening_messages = _StageMessages()
+    party_positioning_messages = _StageMessages()
+    perspective_taking_messages = _StageMessages()
+    deliberation_messages = _StageMessages()
+
     def __init__(
         self,
         topic: str,
@@ -35,26 +77,53 @@ class ConversationState:
         party_positioning_summary: str | None = None,
         perspective_taking_summary: str | None = None,
         deliberation_summary: str | None = None,
+        raw_messages: Mapping[str, Sequence[Any]] | None = None,
     ):
         self.id: str = id
         self.stage: ConversationStage = stage
         self.topic: str = topic
-        self.active_listening_messages: list[BaseMessage] = (
-            list(active_listening_messages) if active_listening_messages else []
-        )
-        self.party_positioning_messages: list[BaseMessage] = (
-            list(party_positioning_messages) if party_positioning_messages else []
-        )
-        self.perspective_taking_messages: list[BaseMessage] = (
-            list(perspective_taking_messages) if perspective_taking_messages else []
-        )
-        self.deliberation_messages: list[BaseMessage] = (
-            list(deliberation_messages) if deliberation_messages else []
-        )
+        # Stored payloads per stage transcript, deserialized on first access
+        self._raw_messages: dict[str, Sequence[Any]] = {
+            field: payloads
+            for field, payloads in (raw_messages or {}).items()
+            if field in STAGE_MESSAGE_FIELDS
+        }
+        self._messages: dict[str, list[BaseMessage]] = {}
+        for field, messages in (
+            ("active_listening_messages", active_listening_messages),
+            ("party_positioning_messages", party_positioning_messages),
+            ("perspective_taking_messages", perspective_taking_messages),
+            ("deliberation_messages", deliberation_messages),
+        ):
+            if messages is not None or field not in self._raw_messages:
+                setattr(self, field, messages or [])
         self.active_listening_summary: str | None = active_listening_summary
         self.party_positioning_summary: str | None = party_positioning_summary
         self.perspective_taking_summary: str | None = perspective_taking_summary
         self.deliberation_summary: str | None = deliberation_summary
+        # Messages passed in are the ones already stored in Firestore
+        self._persisted_message_counts: dict[str, int] = {
+            field: len(
+                self._raw_messages[field]
+                if field in self._raw_messages
+                else self._messages[field]
+            )
+            for field in STAGE_MESSAGE_FIELDS
+        }
+
+    def messages_loaded(self, field: str) -> bool:
+        """Whether the stage transcript ``field`` has been deserialized."""
+        return field in self._messages
+
+    def unpersisted_messages(self, field: str) -> list[BaseMessage]:
+        """Messages of the stage transcript ``field`` not yet stored in Firestore."""
+        return getattr(self, field)[self.persisted_message_count(field) :]
+
+    def persisted_message_count(self, field: str) -> int:
+        return self._persisted_message_counts.get(field, 0)
+
+    def mark_messages_persisted(self, field: str) -> None:
+        self._persisted_message_counts[field] = len(getattr(self, field))
 
 
 MESSAGE_TYPE_TO_CLASS = {
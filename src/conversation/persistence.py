@@ -0,0 +1,69 @@
+"""Incremental persistence of stage transcripts.
+
+Each turn only appends the messages created during that turn to the stage's
+message array instead of rewriting the whole transcript. Appended messages
+carry their position in the transcript as ``seq``, which keeps them unique for
+``ArrayUnion`` and lets readers order them. Documents written before ``seq``
+existed need no migration: their arrays are read as they are and new
+messages are appended behind them.
+"""
+
+from __future__ import annotations
+
+from src.conversation.conversation_state import ConversationState, serialize_message
+from src.services.firestore_service import (
+    append_conversation_messages,
+    append_conversation_messages_async,
+    update_conversation,
+    update_conversation_async,
+)
+
+
+def _new_message_payloads(state: ConversationState, field: str) -> list[dict]:
+    offset = state.persisted_message_count(field)
+    return [
+        {**serialize_message(message), "seq": offset + index}
+        for index, message in enumerate(state.unpersisted_messages(field))
+    ]
+
+
+def persist_new_messages(state: ConversationState, field: str) -> None:
+    """Append the not yet stored messages of the stage transcript ``field``."""
+    payloads = _new_message_payloads(state, field)
+    if not payloads:
+        return
+    append_conversation_messages(
+        conversation_id=state.id, field=field, messages=payloads
+    )
+    state.mark_messages_persisted(field)
+
+
+async def persist_new_messages_async(state: ConversationState, field: str) -> None:
+    payloads = _new_message_payloads(state, field)
+    if not payloads:
+        return
+    await append_conversation_messages_async(
+        conversation_id=state.id, field=field, messages=payloads
+    )
+    state.mark_messages_persisted(field)
+
+
+def reset_stage_messages(state: ConversationState, field: str) -> None:
+    """Start the stage transcript ``field`` from scratch."""
+    setattr(state, field, [])
+    update_conversation(conversation_id=state.id, extra={field: []})
+    state.mark_messages_persisted(field)
+
+
+async def reset_stage_messages_async(state: ConversationState, field: str) -> None:
+    setattr(state, field, [])
+    await update_conversation_async(conversation_id=state.id, extra={field: []})
+    state.mark_messages_persisted(field)
+
+
+__all__ = [
+    "persist_new_messages",
+    "persist_new_messages_async",
+    "reset_stage_messages",
+    "reset_stage_messages_async",
+]
@@ -7,4 +7,6 @@ class EventType(Enum):
     MESSAGE_CHUNK = "message_chunk"
     PROGRESS_UPDATE = "progress_update"
     SOURCES_READY = "sources_ready"
+    PARTY_RESPONSE_READY = "party_response_ready"
+    PHASE_TIMINGS = "phase_timings"
     END = "end"
@@ -1,10 +1,18 @@
+from functools import cache, lru_cache
 from typing import Any
 from langchain_core.messages import AIMessage, SystemMessage
 import re
 
-from src.services.wahl_chat_service import WahlChatResponse
+from src.services.wahl_chat_service import PartyResponse, WahlChatResponse
 
 
+# Stage prompts are split into a static prefix (personality, stage instructions
+# and topic data) and a per-conversation suffix (summaries, user profile). The
+# prefix is memoized per (stage, topic) and is byte-identical across turns and
+# users, so provider-side prompt caching can reuse it.
+
+
+@cache
 def get_wahl_agent_personality() -> str:
     return (
         "# Your Personality and Purpose:\n"
@@ -50,64 +58,127 @@ def get_initial_message(topic: str) -> AIMessage:
 
 
 def get_active_listening_prompt(topic: str) -> SystemMessage:
-    return SystemMessage(
-        content=(
-            get_wahl_agent_personality() + "# Your Current Task: Active Listening\n"
-            f"You are in an active listening phase about the political topic of {topic}."
-            "Your goal is to deeply understand the user's reasons, concerns, experiences and emotions before talking about political parties, policies or solutions.\n"
-            "This conversation stage MUST follow these rules:\n"
-            "1) Acknowledge the user's messages VERY BRIEFLY to show understanding, DO NOT just repeat what the user just said.\n"
-            "2) Do not use bullet points, lists or headings in your answers. Write 2 to 5 short, natural sentences in German.\n"
-            "3) In this active listening phase, do not yet explain political parties, programmes, concrete policies or solutions. Focus only on understanding and clarifying the user's perspective.\n"
-            "4) Do not classify the user's perspectives as extreme, light or any judgemental language. Just understand and clarify the user's perspective (unless they go against the constitutional law of Germany or the basic rights of the German constitution).\n"
-            "5) The user might bring up several different subtopics, guide the conversation to only one subtopic.\n"
-            "6) Ask at most one follow-up question per message and place this question at the end of your answer.\n\n"
-            "Complete this stage in at most 3 exchanges with the following flow:\n"
-            f"   Message 1: After the user answers the initial question, briefly acknowledge and ask a combined follow-up: what bothers them about the current situation regarding {topic} and whether they or people close to them are directly affected.\n"
-            "   Message 2: Briefly acknowledge, then give a very short summary of their complaints and perspective so far. Ask for explicit confirmation whether you understood correctly or if they want to add anything.\n"
-            "   Message 3: Only if the user corrects or adds details, update the summary and ask for confirmation again.\n\n"
-            "Only call the tool 'end_active_listening' after the user gives explicit confirmation (for example: 'ja', 'genau', 'stimmt', 'passt so', 'richtig') to your summary. If the user adds or corrects details, update the summary and ask for explicit confirmation again.\n"
-            "When you call the tool 'end_active_listening', populate the parameter with the final approved user's perspectives summary in 3rd person form (the user...) to finish the active listening phase.\n\n"
-        )
+    return SystemMessage(content=get_active_listening_instructions(topic))
+
+
+@lru_cache(maxsize=32)
+def get_active_listening_instructions(topic: str) -> str:
+    return (
+        get_wahl_agent_personality() + "# Your Current Task: Active Listening\n"
+        f"You are in an active listening phase about the political topic of {topic}."
+        "Your goal is to deeply understand the user's reasons, concerns, experiences and emotions before talking about political parties, policies or solutions.\n"
+        "This conversation stage MUST follow these rules:\n"
+        "1) Acknowledge the user's messages VERY BRIEFLY to show understanding, DO NOT just repeat what the user just said.\n"
+        "2) Do not use bullet points, lists or headings in your answers. Write 2 to 5 short, natural sentences in German.\n"
+        "3) In this active listening phase, do not yet explain political parties, programmes, concrete policies or solutions. Focus only on understanding and clarifying the user's perspective.\n"
+        "4) Do not classify the user's perspectives as extreme, light or any judgemental language. Just understand and clarify the user's perspective (unless they go against the constitutional law of Germany or the basic rights of the German constitution).\n"
+        "5) The user might bring up several different subtopics, guide the conversation to only one subtopic.\n"
+        "6) Ask at most one follow-up question per message and place this question at the end of your answer.\n\n"
+        "Complete this stage in at most 3 exchanges with the following flow:\n"
+        f"   Message 1: After the user answers the initial question, briefly acknowledge and ask a combined follow-up: what bothers them about the current situation regarding {topic} and whether they or people close to them are directly affected.\n"
+        "   Message 2: Briefly acknowledge, then give a very short summary of their complaints and perspective so far. Ask for explicit confirmation whether you understood correctly or if they want to add anything.\n"
+        "   Message 3: Only if the user corrects or adds details, update the summary and ask for confirmation again.\n\n"
+        "Only call the tool 'end_active_listening' after the user gives explicit confirmation (for example: 'ja', 'genau', 'stimmt', 'passt so', 'richtig') to your summary. If the user adds or corrects details, update the summary and ask for explicit confirmation again.\n"
+        "When you call the tool 'end_active_listening', populate the parameter with the final approved user's perspectives summary in 3rd person form (the user...) to finish the active listening phase.\n\n"
     )
 
 
+def render_party_positions(party_positions: list[tuple[str, dict[str, Any]]]) -> str:
+    """Render the sorted party positions as a compact, canonical block.
+
+    Every party gets a header line with its id followed by one ``key: value``
+    line per non-empty field in sorted key order. Values are normalized so the
+    output only depends on the data, not on dict order or Firestore types.
+    """
+    blocks = []
+    for party_id, position in party_positions:
+        lines = [f"[{party_id}]"]
+        for key, value in _flatten_position(position):
+            lines.append(f"{key}: {value}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def _flatten_position(
+    position: dict[str, Any], prefix: str = ""
+) -> list[tuple[str, str]]:
+    fields = []
+    for key in sorted(position):
+        value = position[key]
+        if isinstance(value, dict):
+            fields.extend(_flatten_position(value, f"{prefix}{key}."))
+            continue
+        rendered = _render_position_value(value)
+        if rendered:
+            fields.append((f"{prefix}{key}", rendered))
+    return fields
+
+
+def _render_position_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, dict):
+        return ", ".join(
+            f"{key}={rendered}"
+            for key in sorted(value)
+            if (rendered := _render_position_value(value[key]))
+        )
+    if isinstance(value, (list, tuple)):
+        return "; ".join(
+            rendered for item in value if (rendered := _render_position_value(item))
+        )
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return " ".join(str(value).split())
+
+
 def get_party_positioning_prompt(
     topic: str,
-    party_positions: list[tuple[str, dict[str, Any]]],
+    party_positions_block: str,
     active_listening_summary: str,
 ) -> SystemMessage:
     return SystemMessage(
         content=(
-            get_wahl_agent_personality() + "# Summary of Previous Stages\n"
+            get_party_positioning_instructions(topic, party_positions_block)
+            + "# Summary of Previous Stages\n"
             f"This is the summary of the user's perspective on the topic of {topic}:\n{active_listening_summary}\n\n"
-            "# Your Current Task: Party Positioning\n"
-            f"These are the available party positions on {topic}:\n{party_positions}\n\n"
-            "The positions are ordered from left to right in the political spectrum (positionLeftToRight key).\n\n"
-            "Hard output rules for EVERY reply in this stage:\n"
-            "- Ask exactly one question, and it must be the last sentence.\n"
-            "- Never ask more than one question in a single reply.\n"
-            "- No numbered sections.\n"
-            "- Do not repeat long summaries of what the user just said.\n\n"
-            "Markdown formatting rules for perspective overviews:\n"
-            "- Use one short heading.\n"
-            "- Present contrasts with short bullet points using '*'.\n"
-            "- Keep each bullet to one short sentence.\n"
-            "- Highlight only key terms in bold.\n"
-            "- Leave one blank line between sections for readability.\n\n"
-            "Complete this stage in at most 3 exchanges with the following flow:\n"
-            "   Message 1: In one sentence explain what you will present, then briefly contrast the two poles and mention compromise dimensions. Ask for the user's ideal solution.\n"
-            '   Message 2: Paraphrase in one short sentence, ask for hard "no-gos" and how they would implement their preferred solution (goal vs method).\n'
-            "   Message 3: Give a short confirmation summary of the user's goal and methods. Ask for explicit confirmation.\n"
-            "Once the user confirms, call the tool 'end_party_positioning' with the approved goal and methods in 3rd person form (the user...).\n\n"
-            "Additional rules:\n"
-            "- Do not mention party names in the user-facing text.\n"
-            "- Do not invent facts; rely on provided positions or explicitly mark uncertainty.\n"
-            "- If the user is unsure, offer one short concrete prompt derived from their prior statements.\n\n"
         )
     )
 
 
+@lru_cache(maxsize=32)
+def get_party_positioning_instructions(topic: str, party_positions_block: str) -> str:
+    return (
+        get_wahl_agent_personality() + "# Your Current Task: Party Positioning\n"
+        f"These are the available party positions on {topic}:\n{party_positions_block}\n\n"
+        "Each party is introduced by its id in square brackets. The positions are ordered from left to right in the political spectrum (positionLeftToRight key).\n\n"
+        "Hard output rules for EVERY reply in this stage:\n"
+        "- Ask exactly one question, and it must be the last sentence.\n"
+        "- Never ask more than one question in a single reply.\n"
+        "- No numbered sections.\n"
+        "- Do not repeat long summaries of what the user just said.\n\n"
+        "Markdown formatting rules for perspective overviews:\n"
+        "- Use one short heading.\n"
+        "- Present contrasts with short bullet points using '*'.\n"
+        "- Keep each bullet to one short sentence.\n"
+        "- Highlight only key terms in bold.\n"
+        "- Leave one blank line between sections for readability.\n\n"
+        "Complete this stage in at most 3 exchanges with the following flow:\n"
+        "   Message 1: In one sentence explain what you will present, then briefly contrast the two poles and mention compromise dimensions. Ask for the user's ideal solution.\n"
+        '   Message 2: Paraphrase in one short sentence, ask for hard "no-gos" and how they would implement their preferred solution (goal vs method).\n'
+        "   Message 3: Give a short confirmation summary of the user's goal and methods. Ask for explicit confirmation.\n"
+        "Once the user confirms, call the tool 'end_party_positioning' with the approved goal and methods in 3rd person form (the user...).\n\n"
+        "Additional rules:\n"
+        "- Do not mention party names in the user-facing text.\n"
+        "- Do not invent facts; rely on provided positions or explicitly mark uncertainty.\n"
+        "- If the user is unsure, offer one short concrete prompt derived from their prior statements.\n\n"
+    )
+
+
 def get_perspective_taking_prompt(
     topic: str,
     active_listening_summary: str,
@@ -119,12 +190,20 @@ def get_perspective_taking_prompt(
         user_profile_str = f"This is the user's profile, consider it when formulating the situation:\n{user_profile}\n\n"
 
     return (
-        get_wahl_agent_personality() + "# Summary of Previous Stages\n"
+        get_perspective_taking_instructions() + "\n# Summary of Previous Stages\n"
         f"This is the user's perspective on the topic of {topic}:\n"
         f"{active_listening_summary}\n\n"
         "After exposing the user to different political positions on the topic, the user formed the following position based on their own situation and opinions:\n"
         f"{party_positioning_summary}\n\n"
-        "# Your Current Task: Analogical Perspective Taking\n"
+        f"{user_profile_str}"
+    )
+
+
+@cache
+def get_perspective_taking_instructions() -> str:
+    return (
+        get_wahl_agent_personality()
+        + "# Your Current Task: Analogical Perspective Taking\n"
         "You will now conduct an analogical perspective-taking exercise.\n"
         "Goal: broaden the user's perspective and clarify trade-offs without persuading them.\n"
         "Hard output rules for EVERY reply in this stage:\n"
@@ -137,7 +216,6 @@ def get_perspective_taking_prompt(
         "   Message 3: Give a short summary of the exercise and ask for explicit confirmation.\n"
         "Only after explicit confirmation, call the tool 'end_perspective_taking' with the approved summary in 3rd person form (the user...).\n"
         "Support consequences with real-world facts whenever possible. If concrete external information is needed, call the tool 'perplexity_search' and only use its results to support your answer.\n"
-        f"{user_profile_str}"
     )
 
 
@@ -148,13 +226,19 @@ def get_deliberation_prompt(
     perspective_taking_summary: str,
 ) -> str:
     return (
-        get_wahl_agent_personality() + "# Summary of Previous Stages\n"
+        get_deliberation_instructions(topic) + "\n# Summary of Previous Stages\n"
         f"This is the user's perspective on the topic of {topic}:\n"
         f"{active_listening_summary}\n\n"
         f"This is the user's proposed solution:\n{party_positioning_summary}\n\n"
         f"This is the summary of the perspective taking exercise:\n{perspective_taking_summary}\n"
-        f"The analogic perspective-taking phase is complete. The user imagined how a plausible negative consequence of an opposing view on {topic} could affect their own life, described the feelings it might trigger, the treatment they would hope for, and the support they would need.\n\n"
-        "# Your Current Task: Deliberation\n"
+    )
+
+
+@lru_cache(maxsize=32)
+def get_deliberation_instructions(topic: str) -> str:
+    return (
+        get_wahl_agent_personality() + "# Your Current Task: Deliberation\n"
+        f"The analogic perspective-taking phase is complete. The user imagined how a plausible negative consequence of an opposing view on {topic} could affect their own life, described the feelings it might trigger, the treatment they would hope for, and the support they would need.\n"
         "You are now in the deliberation phase. Your role is to help the user decide whether, and how, those reflections should influence their ideal solution.\n"
         "Hard output rules for EVERY reply in this stage:\n"
         "- Ask exactly one question, and it must be the last sentence.\n"
@@ -188,13 +272,40 @@ def get_distillation_prompt() -> str:
     )
 
 
-def get_party_matching_prompt(wahl_chat_response: WahlChatResponse) -> str:
-    party_responses_str = ""
-    for party_response in wahl_chat_response.party_responses:
-        party_name = party_id_to_name(party_response.party_id)
-        party_responses_str += f"Party: {party_name}\n"
-        party_responses_str += f"Response: {add_party_ids_to_references(party_response.response, party_response.party_id)}\n"
-        party_responses_str += "\n"
+def get_party_pre_analysis_prompt() -> str:
+    return (
+        "Compare one political party's answer with a user's perspective on the topic of {topic}.\n"
+        "The user's perspective is:\n{deliberation_summary}\n\n"
+        "The party was asked the following question:\n{question}\n\n"
+        "Answer of the party {party_name}:\n{party_response}\n\n"
+        "In at most 3 short sentences in English, state where the party agrees and where it disagrees with the user's perspective. "
+        "Keep the citations of the party's answer exactly as they are, e.g. [spd][2].\n"
+        "Return ONLY these sentences, nothing else."
+    )
+
+
+def get_party_response_section(
+    party_response: PartyResponse, pre_analysis: str | None = None
+) -> str:
+    party_name = party_id_to_name(party_response.party_id)
+    section = f"Party: {party_name}\n"
+    section += f"Response: {add_party_ids_to_references(party_response.response, party_response.party_id)}\n"
+    if pre_analysis:
+        section += f"Alignment with the user's perspective: {pre_analysis}\n"
+    return section + "\n"
+
+
+def get_party_matching_prompt(
+    wahl_chat_response: WahlChatResponse,
+    party_sections: dict[str, str] | None = None,
+) -> str:
+    """``party_sections`` holds sections rendered ahead of time, keyed by party id."""
+    party_sections = party_sections or {}
+    party_responses_str = "".join(
+        party_sections.get(party_response.party_id)
+        or get_party_response_section(party_response)
+        for party_response in wahl_chat_response.party_responses
+    )
 
     return (
         "Your task is to find the political party that matches the best based on the user's perspective on the topic of {topic}\n"
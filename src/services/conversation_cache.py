@@ -0,0 +1,165 @@
+"""In-process read-through cache of conversation documents.
+
+Every chat turn and every polling request used to read the full conversation
+document. Documents are kept in a bounded LRU instead and updated in place
+whenever this process writes them, so the next read is served from memory.
+
+Other workers may write the same conversation, so each entry remembers the
+``updated_at`` it was stored with. A read older than the allowed staleness
+fetches only ``updated_at`` and compares it before trusting the entry; on a
+mismatch the full document is read again.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from src.utils.telemetry import metrics
+
+load_dotenv()
+
+CONVERSATION_CACHE_MAX_ENTRIES = int(
+    os.getenv("CONVERSATION_CACHE_MAX_ENTRIES", "1024")
+)
+CONVERSATION_CACHE_MAX_STALENESS_SECONDS = float(
+    os.getenv("CONVERSATION_CACHE_MAX_STALENESS_SECONDS", "2")
+)
+
+
+class AppendedMessages(list):
+    """Messages that are appended to, not replacing, the stored array."""
+
+
+class _Entry:
+    __slots__ = ("document", "checked_at")
+
+    def __init__(self, document: Dict[str, Any], checked_at: float) -> None:
+        self.document = document
+        self.checked_at = checked_at
+
+    @property
+    def version(self) -> Optional[datetime]:
+        return self.document.get("updated_at")
+
+
+class ConversationCache:
+    def __init__(self, *, max_entries: int = CONVERSATION_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.revalidated = 0
+        self.stale = 0
+        self.misses = 0
+        self.write_throughs = 0
+        self.evictions = 0
+
+    def get_fresh(
+        self, conversation_id: str, max_staleness_seconds: float
+    ) -> Optional[Dict[str, Any]]:
+        """Return the document if it was confirmed within the staleness window."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.checked_at > max_staleness_seconds:
+                return None
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            return dict(entry.document)
+
+    def version(self, conversation_id: str) -> Optional[datetime]:
+        """Return the cached ``updated_at``, or ``None`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            return entry.version
+
+    def confirm(
+        self, conversation_id: str, version: Optional[datetime]
+    ) -> Optional[Dict[str, Any]]:
+        """Return the document if ``version`` is still the cached one."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or version is None or entry.version != version:
+                self.stale += 1
+                return None
+            entry.checked_at = time.monotonic()
+            self._entries.move_to_end(conversation_id)
+            self.revalidated += 1
+            return dict(entry.document)
+
+    def put(self, conversation_id: str, document: Dict[str, Any]) -> None:
+        with self._lock:
+            self._remember(conversation_id, dict(document))
+
+    def apply(self, conversation_id: str, fields: Dict[str, Any]) -> None:
+        """Merge fields written by this process into the cached document.
+
+        ``AppendedMessages`` extend the stored array like ``ArrayUnion`` does;
+        every other value replaces the stored one. Arrays are replaced rather
+        than extended in place so copies handed out earlier stay unchanged.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            document = entry.document
+            for key, value in fields.items():
+                if isinstance(value, AppendedMessages):
+                    current = list(document.get(key) or [])
+                    document[key] = current + [m for m in value if m not in current]
+                else:
+                    document[key] = value
+            entry.checked_at = time.monotonic()
+            self._entries.move_to_end(conversation_id)
+            self.write_throughs += 1
+
+    def discard(self, conversation_id: str) -> None:
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "stale": self.stale,
+                "misses": self.misses,
+                "write_throughs": self.write_throughs,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, conversation_id: str, document: Dict[str, Any]) -> None:
+        self._entries[conversation_id] = _Entry(document, time.monotonic())
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+conversation_cache = ConversationCache()
+metrics.register_stats("conversation_cache", conversation_cache.stats)
+
+
+__all__ = [
+    "AppendedMessages",
+    "ConversationCache",
+    "conversation_cache",
+    "CONVERSATION_CACHE_MAX_STALENESS_SECONDS",
+]
@@ -3,15 +3,22 @@
 from __future__ import annotations
 
 import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
 
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 from google.auth.exceptions import DefaultCredentialsError
+from google.cloud.firestore_v1 import AsyncClient as AsyncFirestoreClient
 from google.cloud.firestore_v1 import Client as FirestoreClient
 
+from src.services.conversation_cache import AppendedMessages, conversation_cache
+from src.utils.telemetry import metrics, span
+
 
 _conversations_collection_name = os.getenv(
     "FIRESTORE_CONVERSATIONS_COLLECTION", "wahl_agent_conversations"
@@ -20,6 +27,11 @@ _topics_collection_name = os.getenv("FIRESTORE_TOPICS_COLLECTION", "wahl_agent_t
 _credential_env_vars = ("FIREBASE_CREDENTIALS_PATH", "GOOGLE_APPLICATION_CREDENTIALS")
 
 firestore_client: Optional[FirestoreClient] = None
+async_firestore_client: Optional[AsyncFirestoreClient] = None
+
+_active_write_batch: ContextVar[Optional["ConversationWriteBatch"]] = ContextVar(
+    "active_write_batch", default=None
+)
 
 
 def _initialize_firebase_app() -> firebase_admin.App:
@@ -69,6 +81,17 @@ def get_firestore_client():
     return firestore_client
 
 
+def get_async_firestore_client() -> AsyncFirestoreClient:
+    """Return a cached async Firestore client for the ASGI serving path."""
+    global async_firestore_client
+    if async_firestore_client is not None:
+        return async_firestore_client
+
+    _initialize_firebase_app()
+    async_firestore_client = firestore_async.client()
+    return async_firestore_client
+
+
 def save_conversation_metadata(
     *,
     topic: str,
@@ -97,7 +120,9 @@ def save_conversation_metadata(
     if extra:
         payload.update(extra)
 
-    doc_ref.set(payload)
+    with span("firestore.write", operation="create"):
+        doc_ref.set(payload)
+    conversation_cache.put(doc_ref.id, payload)
     return doc_ref.id
 
 
@@ -107,49 +132,323 @@ def update_conversation(
     stage: Optional[str] = None,
     extra: Optional[Dict[str, Any]] = None,
 ) -> None:
-    """Update specific fields in an existing conversation document."""
-    client = get_firestore_client()
-    doc_ref = client.collection(_conversations_collection_name).document(
-        conversation_id
+    """Update specific fields in an existing conversation document.
+
+    Inside :func:`conversation_write_batch` for the same conversation the
+    fields are only recorded and written together when the batch flushes.
+    """
+    batch = _write_batch_for(conversation_id)
+    if batch is not None:
+        batch.set_fields(_conversation_fields(stage, extra))
+        return
+
+    _write_conversation_fields(conversation_id, _conversation_fields(stage, extra))
+
+
+async def update_conversation_async(
+    *,
+    conversation_id: str,
+    stage: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Async variant of :func:`update_conversation`."""
+    batch = _write_batch_for(conversation_id)
+    if batch is not None:
+        batch.set_fields(_conversation_fields(stage, extra))
+        return
+
+    await _write_conversation_fields_async(
+        conversation_id, _conversation_fields(stage, extra)
+    )
+
+
+def append_conversation_messages(
+    *,
+    conversation_id: str,
+    field: str,
+    messages: list[Dict[str, Any]],
+) -> None:
+    """Append messages to an array field without rewriting the existing ones.
+
+    ``ArrayUnion`` skips elements equal to one already stored, so every message
+    must carry something unique such as its sequence number.
+    """
+    batch = _write_batch_for(conversation_id)
+    if batch is not None:
+        batch.append_messages(field, messages)
+        return
+
+    _write_conversation_fields(conversation_id, {field: AppendedMessages(messages)})
+
+
+async def append_conversation_messages_async(
+    *,
+    conversation_id: str,
+    field: str,
+    messages: list[Dict[str, Any]],
+) -> None:
+    """Async variant of :func:`append_conversation_messages`."""
+    batch = _write_batch_for(conversation_id)
+    if batch is not None:
+        batch.append_messages(field, messages)
+        return
+
+    await _write_conversation_fields_async(
+        conversation_id, {field: AppendedMessages(messages)}
     )
 
-    update_data: Dict[str, Any] = {"updated_at": datetime.now(timezone.utc)}
+
+def _conversation_fields(
+    stage: Optional[str], extra: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {}
     if stage is not None:
-        update_data["stage"] = stage
+        fields["stage"] = stage
     if extra:
-        update_data.update(extra)
+        fields.update(extra)
+    return fields
+
+
+def _stamped(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {**fields, "updated_at": datetime.now(timezone.utc)}
 
-    doc_ref.update(update_data)
 
+def _firestore_update(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: firestore.ArrayUnion(list(value))
+        if isinstance(value, AppendedMessages)
+        else value
+        for key, value in fields.items()
+    }
+
+
+def _write_conversation_fields(conversation_id: str, fields: Dict[str, Any]) -> None:
+    fields = _stamped(fields)
+    client = get_firestore_client()
+    with span("firestore.write", operation="update", fields=len(fields)):
+        client.collection(_conversations_collection_name).document(
+            conversation_id
+        ).update(_firestore_update(fields))
+    conversation_cache.apply(conversation_id, fields)
+
+
+async def _write_conversation_fields_async(
+    conversation_id: str, fields: Dict[str, Any]
+) -> None:
+    fields = _stamped(fields)
+    client = get_async_firestore_client()
+    with span("firestore.write", operation="update", fields=len(fields)):
+        await (
+            client.collection(_conversations_collection_name)
+            .document(conversation_id)
+            .update(_firestore_update(fields))
+        )
+    conversation_cache.apply(conversation_id, fields)
+
+
+class ConversationWriteBatch:
+    """Collects the writes of one request to a conversation document.
+
+    A turn with a stage transition otherwise costs one round-trip for the end
+    tool, one for the transcript and one for resetting the next stage. Field
+    updates are merged in order: a later value replaces an earlier one and
+    appended messages are folded into an array that was set in the same batch,
+    so the whole turn becomes a single ``update()``.
+    """
+
+    def __init__(self, conversation_id: str) -> None:
+        self.conversation_id = conversation_id
+        self.recorded_writes = 0
+        self._fields: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._fields)
+
+    @contextmanager
+    def collecting(self) -> Iterator[ConversationWriteBatch]:
+        """Route writes to this conversation into the batch while active."""
+        token = _active_write_batch.set(self)
+        try:
+            yield self
+        finally:
+            _active_write_batch.reset(token)
+
+    def set_fields(self, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self._fields.update(fields)
+            self.recorded_writes += 1
+
+    def append_messages(self, field: str, messages: list[Dict[str, Any]]) -> None:
+        with self._lock:
+            current = self._fields.get(field)
+            if isinstance(current, list):
+                self._fields[field] = type(current)([*current, *messages])
+            else:
+                self._fields[field] = AppendedMessages(messages)
+            self.recorded_writes += 1
+
+    def flush(self) -> None:
+        fields = self._take_fields()
+        if fields:
+            _write_conversation_fields(self.conversation_id, fields)
+
+    async def flush_async(self) -> None:
+        fields = self._take_fields()
+        if fields:
+            await _write_conversation_fields_async(self.conversation_id, fields)
+
+    def _take_fields(self) -> Dict[str, Any]:
+        with self._lock:
+            fields, self._fields = self._fields, {}
+            recorded, self.recorded_writes = self.recorded_writes, 0
+
+        if fields:
+            _record_batch_flush(recorded)
+        return fields
+
+
+_write_batch_stats = {"flushes": 0, "recorded_writes": 0, "round_trips_saved": 0}
+_write_batch_stats_lock = threading.Lock()
+
+
+def _record_batch_flush(recorded_writes: int) -> None:
+    with _write_batch_stats_lock:
+        _write_batch_stats["flushes"] += 1
+        _write_batch_stats["recorded_writes"] += recorded_writes
+        _write_batch_stats["round_trips_saved"] += recorded_writes - 1
+
+
+def write_batch_stats() -> Dict[str, int]:
+    """Return how many conversation writes were batched and round-trips saved."""
+    with _write_batch_stats_lock:
+        return dict(_write_batch_stats)
+
+
+metrics.register_stats("write_batch", write_batch_stats)
+
+
+def _write_batch_for(conversation_id: str) -> Optional[ConversationWriteBatch]:
+    batch = _active_write_batch.get()
+    if batch is not None and batch.conversation_id == conversation_id:
+        return batch
+    return None
+
+
+@contextmanager
+def conversation_write_batch(conversation_id: str) -> Iterator[ConversationWriteBatch]:
+    """Batch conversation writes made in this context and flush them on exit.
+
+    The flush runs on normal exit as well as on errors and generator close, so
+    a client that disconnects mid-stream does not lose the turn.
+    """
+    batch = ConversationWriteBatch(conversation_id)
+    try:
+        with batch.collecting():
+            yield batch
+    finally:
+        batch.flush()
+
+
+@asynccontextmanager
+async def conversation_write_batch_async(
+    conversation_id: str,
+) -> AsyncIterator[ConversationWriteBatch]:
+    """Async variant of :func:`conversation_write_batch`."""
+    batch = ConversationWriteBatch(conversation_id)
+    try:
+        with batch.collecting():
+            yield batch
+    finally:
+        await batch.flush_async()
+
+
+def get_conversation(
+    conversation_id: str, *, max_staleness_seconds: float = 0.0
+) -> Optional[Dict[str, Any]]:
+    """Retrieve a conversation document by ID.
+
+    Documents are served from :data:`conversation_cache`. An entry confirmed
+    within ``max_staleness_seconds`` is returned without a round-trip; older
+    entries are checked against the stored ``updated_at`` first, which only
+    transfers that one field.
+    """
+    document = conversation_cache.get_fresh(conversation_id, max_staleness_seconds)
+    if document is not None:
+        return document
 
-def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieve a conversation document by ID."""
     client: FirestoreClient = get_firestore_client()
     doc_ref = client.collection(_conversations_collection_name).document(
         conversation_id
     )
-    doc = doc_ref.get()
+
+    if conversation_cache.version(conversation_id) is not None:
+        with span("firestore.read", operation="version"):
+            version_doc = doc_ref.get(field_paths=["updated_at"])
+        if version_doc.exists:
+            document = conversation_cache.confirm(
+                conversation_id, (version_doc.to_dict() or {}).get("updated_at")
+            )
+            if document is not None:
+                return document
+
+    with span("firestore.read", operation="conversation"):
+        doc = doc_ref.get()
 
     if not doc.exists:
+        conversation_cache.discard(conversation_id)
         return None
 
-    return doc.to_dict()
+    document = doc.to_dict()
+    conversation_cache.put(conversation_id, document)
+    return document
 
 
-def get_party_positions_by_topic_id(
-    topic_id: str,
-) -> list[tuple[str, Dict[str, Any]]] | None:
-    client = get_firestore_client()
-    collection_ref = (
+async def get_conversation_async(
+    conversation_id: str, *, max_staleness_seconds: float = 0.0
+) -> Optional[Dict[str, Any]]:
+    """Async variant of :func:`get_conversation`."""
+    document = conversation_cache.get_fresh(conversation_id, max_staleness_seconds)
+    if document is not None:
+        return document
+
+    client = get_async_firestore_client()
+    doc_ref = client.collection(_conversations_collection_name).document(
+        conversation_id
+    )
+
+    if conversation_cache.version(conversation_id) is not None:
+        with span("firestore.read", operation="version"):
+            version_doc = await doc_ref.get(field_paths=["updated_at"])
+        if version_doc.exists:
+            document = conversation_cache.confirm(
+                conversation_id, (version_doc.to_dict() or {}).get("updated_at")
+            )
+            if document is not None:
+                return document
+
+    with span("firestore.read", operation="conversation"):
+        doc = await doc_ref.get()
+
+    if not doc.exists:
+        conversation_cache.discard(conversation_id)
+        return None
+
+    document = doc.to_dict()
+    conversation_cache.put(conversation_id, document)
+    return document
+
+
+def _party_positions_collection(client: Any, topic_id: str) -> Any:
+    return (
         client.collection(_topics_collection_name)
         .document(topic_id)
         .collection("party_positions")
     )
 
-    docs = list(collection_ref.stream())
-    if not docs:
-        return None
 
+def _sorted_party_positions(docs: list[Any]) -> list[tuple[str, Dict[str, Any]]]:
     # Return as list of tuples (id, document), sorted by document[positionLeftToRight]
     return sorted(
         [(doc.id, doc.to_dict()) for doc in docs],
@@ -157,10 +456,64 @@ def get_party_positions_by_topic_id(
     )
 
 
+def get_party_positions_by_topic_id(
+    topic_id: str,
+) -> list[tuple[str, Dict[str, Any]]] | None:
+    client = get_firestore_client()
+    with span("firestore.read", operation="party_positions"):
+        docs = list(_party_positions_collection(client, topic_id).stream())
+    if not docs:
+        return None
+
+    return _sorted_party_positions(docs)
+
+
+async def get_party_positions_by_topic_id_async(
+    topic_id: str,
+) -> list[tuple[str, Dict[str, Any]]] | None:
+    """Async variant of :func:`get_party_positions_by_topic_id`."""
+    client = get_async_firestore_client()
+    collection_ref = _party_positions_collection(client, topic_id)
+    with span("firestore.read", operation="party_positions"):
+        docs = [doc async for doc in collection_ref.stream()]
+    if not docs:
+        return None
+
+    return _sorted_party_positions(docs)
+
+
+def watch_party_positions(
+    topic_id: str,
+    on_change: Callable[[list[tuple[str, Dict[str, Any]]] | None], None],
+) -> Any:
+    """Call ``on_change`` with the sorted positions whenever the topic changes.
+
+    Returns the Firestore watch; call ``unsubscribe()`` on it to stop. The
+    callback runs on the listener's background thread.
+    """
+    client = get_firestore_client()
+
+    def on_snapshot(docs: list[Any], changes: Any, read_time: Any) -> None:
+        on_change(_sorted_party_positions(docs) if docs else None)
+
+    return _party_positions_collection(client, topic_id).on_snapshot(on_snapshot)
+
+
 __all__ = [
     "get_firestore_client",
+    "get_async_firestore_client",
     "save_conversation_metadata",
     "update_conversation",
+    "update_conversation_async",
+    "append_conversation_messages",
+    "append_conversation_messages_async",
+    "ConversationWriteBatch",
+    "conversation_write_batch",
+    "conversation_write_batch_async",
+    "write_batch_stats",
     "get_conversation",
+    "get_conversation_async",
     "get_party_positions_by_topic_id",
+    "get_party_positions_by_topic_id_async",
+    "watch_party_positions",
 ]
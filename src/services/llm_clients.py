@@ -0,0 +1,142 @@
+"""Shared chat model clients.
+
+Every model talks to the same OpenAI-compatible endpoint, so all of them share
+one pooled ``httpx`` client per flavour (sync and async) instead of opening a
+connection pool per module. Models and HTTP clients are created on first use
+and cached, so nothing is constructed for stages or tools that never run.
+
+The model of every stage or tool is configured by name: ``OPENAI_MODEL_<NAME>``
+(e.g. ``OPENAI_MODEL_PARTY_MATCHING``) overrides ``OPENAI_MODEL``.
+
+Requests on these clients are admitted by the process-wide
+:data:`~src.services.llm_scheduler.llm_scheduler`, which is also the only
+layer that retries them; the OpenAI SDK's own retries are turned off so a
+rate-limited request is not retried by both.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+from pydantic import SecretStr
+
+from src.services.llm_scheduler import (
+    AsyncScheduledTransport,
+    ScheduledTransport,
+    llm_scheduler,
+)
+
+load_dotenv()
+
+DEFAULT_MODEL = "openai/gpt-5.1"
+# Models that must not fall back to OPENAI_MODEL because they are a different
+# product rather than a different size
+DEFAULT_MODELS = {"perplexity_search": "perplexity/sonar-pro"}
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", "60")
+)
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() == "true"
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+
+_http_client: httpx.Client | None = None
+_async_http_client: httpx.AsyncClient | None = None
+_chat_models: dict[tuple[str, bool], ChatOpenAI] = {}
+_lock = threading.Lock()
+
+
+def _transport_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "http2": LLM_HTTP2,
+    }
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def get_http_client() -> httpx.Client:
+    """Return the process-wide pooled sync HTTP client."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                transport=ScheduledTransport(
+                    httpx.HTTPTransport(**_transport_options()), llm_scheduler
+                ),
+                timeout=_timeout(),
+            )
+        return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled async HTTP client."""
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            _async_http_client = httpx.AsyncClient(
+                transport=AsyncScheduledTransport(
+                    httpx.AsyncHTTPTransport(**_transport_options()), llm_scheduler
+                ),
+                timeout=_timeout(),
+            )
+        return _async_http_client
+
+
+def model_name_for(name: str) -> str:
+    return (
+        os.getenv(f"OPENAI_MODEL_{name.upper()}")
+        or DEFAULT_MODELS.get(name)
+        or os.getenv("OPENAI_MODEL")
+        or DEFAULT_MODEL
+    )
+
+
+def get_chat_model(name: str, *, stream_usage: bool = True) -> ChatOpenAI:
+    """Return the chat model configured for the stage or tool ``name``.
+
+    Stages that resolve to the same model share one instance.
+    """
+    key = (model_name_for(name), stream_usage)
+    model = _chat_models.get(key)
+    if model is not None:
+        return model
+
+    http_client = get_http_client()
+    http_async_client = get_async_http_client()
+    with _lock:
+        model = _chat_models.get(key)
+        if model is None:
+            model = ChatOpenAI(
+                model=key[0],
+                base_url=os.getenv("OPENAI_BASE_URL"),
+                api_key=SecretStr(os.getenv("OPENAI_API_KEY", "")),
+                stream_usage=stream_usage,
+                max_retries=0,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _chat_models[key] = model
+    return model
+
+
+__all__ = [
+    "get_chat_model",
+    "get_http_client",
+    "get_async_http_client",
+    "model_name_for",
+]
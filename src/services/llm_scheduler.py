@@ -0,0 +1,532 @@
+"""Process-wide admission control for requests to the LLM endpoint.
+
+Every chat model and embedding client shares the pooled ``httpx`` clients of
+:mod:`src.services.llm_clients`, whose transports are wrapped in
+:class:`ScheduledTransport`. Before a request is sent it waits for the
+:data:`llm_scheduler`, which admits requests while
+
+- fewer than ``LLM_MAX_CONCURRENCY`` responses are open (a streamed reply
+  holds its slot until the stream is closed),
+- the ``LLM_REQUESTS_PER_MINUTE`` and ``LLM_TOKENS_PER_MINUTE`` token buckets
+  have room (0 disables a bucket). Tokens are estimated from the request body
+  plus ``LLM_EXPECTED_OUTPUT_TOKENS``, since usage is only known afterwards.
+
+Waiting requests are admitted by priority, then in arrival order. Requests
+are :attr:`Priority.INTERACTIVE` unless the caller marks background work with
+:func:`llm_priority`. A request that waited ``LLM_QUEUE_TIMEOUT_SECONDS``
+fails with :class:`LLMQueueTimeout`, an ``httpx.PoolTimeout``, so the clients
+treat it like an exhausted connection pool.
+
+A 429 response pauses admission for everyone until its ``Retry-After`` (or an
+exponential backoff with jitter) has passed, then the request queues again,
+up to ``LLM_RATE_LIMIT_RETRIES`` times. Only then does the client see it.
+Transient failures of a single request, 408, 409 and 5xx responses as well as
+timeouts and connection errors, are retried after the same backoff up to
+``LLM_TRANSIENT_RETRIES`` times without pausing anyone else. The clients'
+own retries are turned off, so this is the only retry layer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Any, AsyncIterator, Callable, Iterator
+
+import httpx
+from dotenv import load_dotenv
+
+from src.utils.telemetry import metrics
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "500"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+LLM_TRANSIENT_RETRIES = int(os.getenv("LLM_TRANSIENT_RETRIES", "2"))
+LLM_RATE_LIMIT_BASE_DELAY_SECONDS = 1.0
+LLM_RATE_LIMIT_MAX_DELAY_SECONDS = 30.0
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_priority: ContextVar[Priority] = ContextVar(
+    "llm_priority", default=Priority.INTERACTIVE
+)
+
+LLM_QUEUE_WAIT = metrics.histogram(
+    "llm_queue_wait_seconds",
+    "Time LLM requests waited for admission.",
+    ("priority",),
+)
+LLM_QUEUE_TIMEOUTS = metrics.counter(
+    "llm_queue_timeouts_total",
+    "LLM requests that gave up waiting for admission.",
+    ("priority",),
+)
+LLM_RATE_LIMIT_RETRIED = metrics.counter(
+    "llm_rate_limit_retries_total", "LLM requests retried after a 429 response."
+)
+LLM_TRANSIENT_RETRIED = metrics.counter(
+    "llm_transient_retries_total",
+    "LLM requests retried after a server, timeout or connection error.",
+)
+
+# Failures the OpenAI SDK retries by default, apart from 429
+TRANSIENT_ERRORS = (
+    httpx.TimeoutException,
+    httpx.NetworkError,
+    httpx.RemoteProtocolError,
+)
+
+
+@contextmanager
+def llm_priority(priority: Priority) -> Iterator[None]:
+    """Queue the LLM requests made inside this block with ``priority``."""
+    previous = _priority.get()
+    _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.set(previous)
+
+
+class LLMQueueTimeout(httpx.PoolTimeout):
+    """The request was not admitted before its queue deadline."""
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units evenly; holds at most one minute's worth."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self._updated = time.monotonic()
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.available -= min(amount, self.capacity)
+
+    def _refill(self, now: float) -> None:
+        self.available = min(
+            self.capacity, self.available + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: Priority
+    sequence: int
+    tokens: int = field(compare=False)
+    wake: Callable[[], None] = field(compare=False)
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        queue_timeout_seconds: float = LLM_QUEUE_TIMEOUT_SECONDS,
+        rate_limit_retries: int = LLM_RATE_LIMIT_RETRIES,
+        transient_retries: int = LLM_TRANSIENT_RETRIES,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.rate_limit_retries = rate_limit_retries
+        self.transient_retries = transient_retries
+        self._requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        )
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.admitted = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+
+    def acquire(self, tokens: int, priority: Priority | None = None) -> float:
+        """Block until the request is admitted; return the seconds waited."""
+        event = threading.Event()
+        waiter = self._enqueue(tokens, priority, event.set)
+        started = time.monotonic()
+        deadline = started + self.queue_timeout_seconds
+        try:
+            while True:
+                event.clear()
+                wait = self._poll(waiter, deadline)
+                if wait is None:
+                    return self._admitted(waiter, started)
+                event.wait(wait)
+        except BaseException:
+            self._remove(waiter)
+            raise
+
+    async def acquire_async(
+        self, tokens: int, priority: Priority | None = None
+    ) -> float:
+        """Async variant of :meth:`acquire` that does not block the loop."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(
+            tokens, priority, lambda: loop.call_soon_threadsafe(event.set)
+        )
+        started = time.monotonic()
+        deadline = started + self.queue_timeout_seconds
+        try:
+            while True:
+                event.clear()
+                wait = self._poll(waiter, deadline)
+                if wait is None:
+                    return self._admitted(waiter, started)
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._remove(waiter)
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._wake_head()
+
+    def pause(self, seconds: float) -> None:
+        """Admit nothing for ``seconds``, e.g. after a 429 response."""
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            queued = {priority: 0 for priority in Priority}
+            for waiter in self._waiters:
+                queued[waiter.priority] += 1
+            return {
+                "in_flight": self._in_flight,
+                **{
+                    f"queued_{priority.name.lower()}": count
+                    for priority, count in queued.items()
+                },
+                "admitted": self.admitted,
+                "timeouts": self.timeouts,
+                "rate_limited": self.rate_limited,
+            }
+
+    def _enqueue(
+        self, tokens: int, priority: Priority | None, wake: Callable[[], None]
+    ) -> _Waiter:
+        waiter = _Waiter(
+            priority=_priority.get() if priority is None else priority,
+            sequence=next(self._sequence),
+            tokens=tokens,
+            wake=wake,
+        )
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+        return waiter
+
+    def _poll(self, waiter: _Waiter, deadline: float) -> float | None:
+        """Admit ``waiter`` and return ``None``, or return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._admission_wait(waiter, now)
+            if wait == 0.0:
+                heapq.heappop(self._waiters)
+                self._in_flight += 1
+                if self._requests is not None:
+                    self._requests.take(1, now)
+                if self._tokens is not None:
+                    self._tokens.take(waiter.tokens, now)
+                self.admitted += 1
+                # The next waiter may fit as well
+                self._wake_head()
+                return None
+
+            remaining = deadline - now
+            if remaining <= 0:
+                self._remove_locked(waiter)
+                self.timeouts += 1
+                LLM_QUEUE_TIMEOUTS.inc(priority=waiter.priority.name.lower())
+                raise LLMQueueTimeout(
+                    f"LLM request not admitted within {self.queue_timeout_seconds}s"
+                )
+            # Not at the head or no free slot: woken by the next release
+            return min(wait, remaining) if wait is not None else remaining
+
+    def _admission_wait(self, waiter: _Waiter, now: float) -> float | None:
+        if self._waiters[0] is not waiter or self._in_flight >= self.max_concurrency:
+            return None
+        wait = max(0.0, self._paused_until - now)
+        if self._requests is not None:
+            wait = max(wait, self._requests.seconds_until(1, now))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.seconds_until(waiter.tokens, now))
+        return wait
+
+    def _admitted(self, waiter: _Waiter, started: float) -> float:
+        waited = time.monotonic() - started
+        LLM_QUEUE_WAIT.observe(waited, priority=waiter.priority.name.lower())
+        return waited
+
+    def _remove(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._remove_locked(waiter)
+
+    def _remove_locked(self, waiter: _Waiter) -> None:
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self._wake_head()
+
+    def _wake_head(self) -> None:
+        if self._waiters:
+            self._waiters[0].wake()
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Prompt tokens from the body size (about 4 bytes each) plus the reply."""
+    return len(request.content) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def is_transient_status(status_code: int) -> bool:
+    return status_code in (408, 409) or status_code >= 500
+
+
+def retry_after_seconds(response: httpx.Response | None, attempt: int) -> float:
+    """The server's ``Retry-After``, else exponential backoff with jitter."""
+    header = response.headers.get("retry-after") if response is not None else None
+    if header:
+        try:
+            seconds = float(header)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(header).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = None
+        if seconds is not None:
+            return min(max(seconds, 0.0), LLM_RATE_LIMIT_MAX_DELAY_SECONDS)
+
+    delay = min(
+        LLM_RATE_LIMIT_BASE_DELAY_SECONDS * 2**attempt,
+        LLM_RATE_LIMIT_MAX_DELAY_SECONDS,
+    )
+    return delay * (0.5 + random.random())
+
+
+class _Retries:
+    """Retry budget of one request; returns the delay before the next attempt."""
+
+    def __init__(self, scheduler: LLMScheduler) -> None:
+        self._scheduler = scheduler
+        self._rate_limited = 0
+        self._transient = 0
+
+    def after_response(self, response: httpx.Response) -> float | None:
+        """``None`` if ``response`` goes to the client; pauses on a 429."""
+        if response.status_code == 429:
+            if self._rate_limited >= self._scheduler.rate_limit_retries:
+                return None
+            delay = retry_after_seconds(response, self._rate_limited)
+            self._rate_limited += 1
+            self._scheduler.pause(delay)
+            LLM_RATE_LIMIT_RETRIED.inc()
+            return delay
+        if not is_transient_status(response.status_code):
+            return None
+        return self._transient_delay(response)
+
+    def after_error(self) -> float | None:
+        """``None`` if the transport error is raised to the client."""
+        return self._transient_delay(None)
+
+    def _transient_delay(self, response: httpx.Response | None) -> float | None:
+        if self._transient >= self._scheduler.transient_retries:
+            return None
+        delay = retry_after_seconds(response, self._transient)
+        self._transient += 1
+        LLM_TRANSIENT_RETRIED.inc()
+        return delay
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees the scheduler slot once it is closed."""
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        # Also frees the slot of a response that is dropped without closing
+        self._release = weakref.finalize(self, release)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = weakref.finalize(self, release)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """Sends every request through the scheduler and retries failed attempts."""
+
+    def __init__(self, transport: httpx.BaseTransport, scheduler: LLMScheduler) -> None:
+        self._transport = transport
+        self._scheduler = scheduler
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_tokens(request)
+        retries = _Retries(self._scheduler)
+        while True:
+            self._scheduler.acquire(tokens)
+            try:
+                response = self._transport.handle_request(request)
+            except TRANSIENT_ERRORS:
+                self._scheduler.release()
+                delay = retries.after_error()
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self._scheduler.release()
+                raise
+
+            delay = retries.after_response(response)
+            if delay is None:
+                if response.is_closed:
+                    # Already read, e.g. a response built from bytes
+                    self._scheduler.release()
+                else:
+                    response.stream = _ReleasingStream(
+                        response.stream, self._scheduler.release
+                    )
+                return response
+
+            try:
+                response.read()
+            finally:
+                response.close()
+                self._scheduler.release()
+            # A 429 has paused the scheduler instead
+            if response.status_code != 429:
+                time.sleep(delay)
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    """Async variant of :class:`ScheduledTransport`."""
+
+    def __init__(
+        self, transport: httpx.AsyncBaseTransport, scheduler: LLMScheduler
+    ) -> None:
+        self._transport = transport
+        self._scheduler = scheduler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_tokens(request)
+        retries = _Retries(self._scheduler)
+        while True:
+            await self._scheduler.acquire_async(tokens)
+            try:
+                response = await self._transport.handle_async_request(request)
+            except TRANSIENT_ERRORS:
+                self._scheduler.release()
+                delay = retries.after_error()
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self._scheduler.release()
+                raise
+
+            delay = retries.after_response(response)
+            if delay is None:
+                if response.is_closed:
+                    # Already read, e.g. a response built from bytes
+                    self._scheduler.release()
+                else:
+                    response.stream = _AsyncReleasingStream(
+                        response.stream, self._scheduler.release
+                    )
+                return response
+
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+                self._scheduler.release()
+            # A 429 has paused the scheduler instead
+            if response.status_code != 429:
+                await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+llm_scheduler = LLMScheduler()
+metrics.register_stats("llm_scheduler", llm_scheduler.stats)
+
+
+__all__ = [
+    "Priority",
+    "llm_priority",
+    "LLMQueueTimeout",
+    "LLMScheduler",
+    "llm_scheduler",
+    "ScheduledTransport",
+    "AsyncScheduledTransport",
+    "TokenBucket",
+]
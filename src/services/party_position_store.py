@@ -0,0 +1,167 @@
+"""In-memory store of the party positions per topic.
+
+The positions in ``wahl_agent_topics/<id>/party_positions`` change about once
+per election, yet every party positioning turn streamed and re-sorted the
+whole subcollection. The store keeps the sorted positions per topic together
+with the prompt block rendered from them. Topics are loaded lazily and kept
+for ``ttl_seconds``, or preloaded at startup and kept current by a Firestore
+snapshot listener, in which case they never expire.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from dotenv import load_dotenv
+
+from src.services.firestore_service import (
+    get_party_positions_by_topic_id,
+    get_party_positions_by_topic_id_async,
+    watch_party_positions,
+)
+
+load_dotenv()
+
+PARTY_POSITIONS_TTL_SECONDS = float(os.getenv("PARTY_POSITIONS_TTL_SECONDS", "3600"))
+PARTY_POSITIONS_PRELOAD = (
+    os.getenv("PARTY_POSITIONS_PRELOAD", "false").lower() == "true"
+)
+
+PartyPositions = list[tuple[str, dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class TopicPositions:
+    topic_id: str
+    positions: PartyPositions
+    prompt_block: str
+    loaded_at: float
+
+
+class PartyPositionStore:
+    def __init__(
+        self,
+        *,
+        render: Callable[[PartyPositions], str],
+        ttl_seconds: float = PARTY_POSITIONS_TTL_SECONDS,
+        load: Callable[[str], PartyPositions | None] = get_party_positions_by_topic_id,
+        load_async: Callable[
+            [str], Awaitable[PartyPositions | None]
+        ] = get_party_positions_by_topic_id_async,
+        watch: Callable[..., Any] = watch_party_positions,
+    ) -> None:
+        self.render = render
+        self.ttl_seconds = ttl_seconds
+        self._load = load
+        self._load_async = load_async
+        self._watch = watch
+
+        self._topics: dict[str, TopicPositions] = {}
+        self._watches: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.loads = 0
+        self.live_updates = 0
+
+    def get(self, topic_id: str) -> TopicPositions | None:
+        topic = self._cached(topic_id)
+        if topic is not None:
+            return topic
+        return self._store(topic_id, self._load(topic_id))
+
+    async def get_async(self, topic_id: str) -> TopicPositions | None:
+        topic = self._cached(topic_id)
+        if topic is not None:
+            return topic
+        return self._store(topic_id, await self._load_async(topic_id))
+
+    def preload(self, topic_ids: Iterable[str], *, watch: bool = False) -> None:
+        """Load ``topic_ids`` now and optionally keep them live via listeners."""
+        for topic_id in topic_ids:
+            if watch:
+                self.watch(topic_id)
+            else:
+                self._store(topic_id, self._load(topic_id))
+
+    def watch(self, topic_id: str) -> None:
+        """Attach a snapshot listener that replaces the topic on every change.
+
+        The listener delivers the current positions right away, so this also
+        loads the topic.
+        """
+        with self._lock:
+            if topic_id in self._watches:
+                return
+        self._store(topic_id, self._load(topic_id))
+
+        def on_change(positions: PartyPositions | None) -> None:
+            with self._lock:
+                self.live_updates += 1
+            if positions is None:
+                self.invalidate(topic_id)
+            else:
+                self._store(topic_id, positions)
+
+        handle = self._watch(topic_id, on_change)
+        with self._lock:
+            self._watches[topic_id] = handle
+
+    def invalidate(self, topic_id: str) -> None:
+        with self._lock:
+            self._topics.pop(topic_id, None)
+
+    def close(self) -> None:
+        with self._lock:
+            watches, self._watches = self._watches, {}
+        for handle in watches.values():
+            handle.unsubscribe()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "loads": self.loads,
+                "live_updates": self.live_updates,
+                "topics": sorted(self._topics),
+                "watched": sorted(self._watches),
+            }
+
+    def _cached(self, topic_id: str) -> TopicPositions | None:
+        with self._lock:
+            topic = self._topics.get(topic_id)
+            if topic is None:
+                return None
+            expired = time.monotonic() - topic.loaded_at > self.ttl_seconds
+            if expired and topic_id not in self._watches:
+                del self._topics[topic_id]
+                return None
+            self.hits += 1
+            return topic
+
+    def _store(
+        self, topic_id: str, positions: PartyPositions | None
+    ) -> TopicPositions | None:
+        if positions is None:
+            return None
+        topic = TopicPositions(
+            topic_id=topic_id,
+            positions=positions,
+            prompt_block=self.render(positions),
+            loaded_at=time.monotonic(),
+        )
+        with self._lock:
+            self._topics[topic_id] = topic
+            self.loads += 1
+        return topic
+
+
+__all__ = [
+    "PartyPositionStore",
+    "TopicPositions",
+    "PARTY_POSITIONS_PRELOAD",
+]
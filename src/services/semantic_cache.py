@@ -0,0 +1,349 @@
+"""Semantic near-duplicate cache for distilled party-matching questions.
+
+Distilled questions are embedded and matched per topic against previously
+answered questions. Above the similarity threshold the stored
+``WahlChatResponse`` is reused and the wahl.chat round-trip is skipped.
+
+The index keeps unit-normalized vectors in NumPy. Small topics are searched by
+brute-force cosine similarity; once a topic grows past ``ivf_threshold`` an
+inverted-file index (k-means lists, probing the closest ``n_probe`` lists)
+narrows the candidates. The embedding function is pluggable:
+:func:`hashing_embedder` is deterministic and offline, :func:`openai_embedder`
+uses the configured OpenAI-compatible endpoint.
+
+Entries expire after ``WAHL_CHAT_CACHE_TTL_SECONDS``, like the exact answer
+cache. The cache is an optimization only: when embedding or searching fails,
+the error is logged and counted and the caller asks wahl.chat as usual.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Generic, TypeVar
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.services.wahl_chat_cache import normalize_question
+from src.services.wahl_chat_models import WahlChatResponse
+from src.utils.telemetry import metrics
+
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+SEMANTIC_CACHE_INDEX_MODE = os.getenv("SEMANTIC_CACHE_INDEX_MODE", "auto")
+# Same lifetime as the exact answer cache in wahl_chat_service
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("WAHL_CHAT_CACHE_TTL_SECONDS", "86400"))
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], np.ndarray]
+T = TypeVar("T")
+
+
+def hashing_embedder(dim: int = 512) -> Embedder:
+    """Deterministic bag of hashed character trigrams and words, no network."""
+
+    def embed(text: str) -> np.ndarray:
+        normalized = f" {normalize_question(text)} "
+        features = [normalized[i : i + 3] for i in range(len(normalized) - 2)]
+        features += normalized.split()
+        vector = np.zeros(dim, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    return embed
+
+
+def openai_embedder(model: str | None = None) -> Embedder:
+    """Embed through the OpenAI-compatible endpoint used for chat models."""
+    from langchain_openai import OpenAIEmbeddings
+    from pydantic import SecretStr
+
+    from src.services.llm_clients import get_async_http_client, get_http_client
+
+    embeddings = OpenAIEmbeddings(
+        model=model
+        or os.getenv("OPENAI_EMBEDDING_MODEL", "openai/text-embedding-3-small"),
+        base_url=os.getenv("OPENAI_BASE_URL"),
+        api_key=SecretStr(os.getenv("OPENAI_API_KEY", "")),
+        # Retried by the LLM scheduler behind the shared HTTP clients
+        max_retries=0,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+    )
+
+    def embed(text: str) -> np.ndarray:
+        return np.asarray(embeddings.embed_query(text), dtype=np.float32)
+
+    return embed
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorIndex(Generic[T]):
+    """Top-1 cosine similarity index over unit vectors.
+
+    ``mode`` is ``"flat"`` (always brute force), ``"ivf"`` (always inverted
+    lists once there are enough vectors to train) or ``"auto"`` (brute force
+    below ``ivf_threshold``).
+    """
+
+    def __init__(
+        self,
+        *,
+        mode: str = "auto",
+        ivf_threshold: int = 4096,
+        n_probe: int = 4,
+        max_entries: int = 20000,
+    ) -> None:
+        if mode not in ("auto", "flat", "ivf"):
+            raise ValueError(f"Unknown index mode: {mode}")
+        self.mode = mode
+        self.ivf_threshold = ivf_threshold
+        self.n_probe = n_probe
+        self.max_entries = max_entries
+
+        self._vectors: np.ndarray | None = None
+        self._size = 0
+        self._payloads: list[T] = []
+        self._centroids: np.ndarray | None = None
+        self._lists: list[list[int]] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def drop_oldest_while(self, predicate: Callable[[T], bool]) -> int:
+        """Drop the oldest entries as long as their payload matches ``predicate``."""
+        count = 0
+        while count < self._size and predicate(self._payloads[count]):
+            count += 1
+        if count:
+            self._drop_oldest(count)
+        return count
+
+    def add(self, vector: np.ndarray, payload: T) -> None:
+        vector = _normalize(np.asarray(vector, dtype=np.float32))
+        if self._vectors is None:
+            self._vectors = np.empty((16, vector.shape[0]), dtype=np.float32)
+        elif self._size == len(self._vectors):
+            grown = np.empty(
+                (max(16, self._size * 2), vector.shape[0]), dtype=np.float32
+            )
+            grown[: self._size] = self._vectors[: self._size]
+            self._vectors = grown
+
+        self._vectors[self._size] = vector
+        self._payloads.append(payload)
+        self._size += 1
+
+        if self._size > self.max_entries:
+            self._drop_oldest(max(1, self.max_entries // 10))
+        elif self._uses_ivf():
+            if self._size >= 2 * self._trained_size:
+                self._train()
+            else:
+                self._assign_last()
+
+    def search(self, vector: np.ndarray) -> tuple[float, T] | None:
+        if self._size == 0 or self._vectors is None:
+            return None
+
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        if self._uses_ivf() and self._centroids is not None:
+            candidates = self._probe(query)
+            if len(candidates) == 0:
+                return None
+            scores = self._vectors[candidates] @ query
+            best = int(np.argmax(scores))
+            return float(scores[best]), self._payloads[int(candidates[best])]
+
+        scores = self._vectors[: self._size] @ query
+        best = int(np.argmax(scores))
+        return float(scores[best]), self._payloads[best]
+
+    def _uses_ivf(self) -> bool:
+        if self.mode == "flat":
+            return False
+        if self.mode == "ivf":
+            return self._size >= 64
+        return self._size >= self.ivf_threshold
+
+    def _probe(self, query: np.ndarray) -> np.ndarray:
+        assert self._centroids is not None
+        centroid_scores = self._centroids @ query
+        n_probe = min(self.n_probe, len(self._centroids))
+        probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.fromiter(
+            (member for list_id in probed for member in self._lists[list_id]),
+            dtype=np.intp,
+        )
+
+    def _train(self, iterations: int = 8) -> None:
+        assert self._vectors is not None
+        data = self._vectors[: self._size]
+        n_lists = max(1, int(np.sqrt(self._size)))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(self._size, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for list_id in range(n_lists):
+                members = data[assignments == list_id]
+                if len(members):
+                    centroids[list_id] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        self._centroids = centroids
+        self._lists = [[] for _ in range(n_lists)]
+        for member, list_id in enumerate(np.argmax(data @ centroids.T, axis=1)):
+            self._lists[list_id].append(member)
+        self._trained_size = self._size
+
+    def _assign_last(self) -> None:
+        assert self._vectors is not None
+        if self._centroids is None:
+            self._train()
+            return
+        list_id = int(np.argmax(self._centroids @ self._vectors[self._size - 1]))
+        self._lists[list_id].append(self._size - 1)
+
+    def _drop_oldest(self, count: int) -> None:
+        assert self._vectors is not None
+        self._vectors = self._vectors[count : self._size].copy()
+        self._payloads = self._payloads[count:]
+        self._size -= count
+        self._centroids = None
+        self._lists = []
+        self._trained_size = 0
+        if self._uses_ivf():
+            self._train()
+
+
+class SemanticAnswerCache:
+    """Per-topic near-duplicate lookup of answered party-matching questions."""
+
+    def __init__(
+        self,
+        embedder: Embedder | None = None,
+        *,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        index_mode: str = SEMANTIC_CACHE_INDEX_MODE,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS,
+    ) -> None:
+        self._embedder = embedder
+        self.threshold = threshold
+        self.index_mode = index_mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Payloads are (stored at, response), oldest first
+        self._indexes: dict[str, VectorIndex[tuple[float, WahlChatResponse]]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.errors = 0
+
+    @property
+    def embedder(self) -> Embedder:
+        if self._embedder is None:
+            self._embedder = openai_embedder()
+        return self._embedder
+
+    def embed(self, question: str) -> np.ndarray | None:
+        """Embed ``question``, or return ``None`` if the embedder failed."""
+        try:
+            return self.embedder(question)
+        except Exception:
+            self._record_error("Embedding the question failed")
+            return None
+
+    def lookup(self, topic: str, question: str) -> WahlChatResponse | None:
+        vector = self.embed(question)
+        return self.lookup_vector(topic, vector) if vector is not None else None
+
+    def lookup_vector(self, topic: str, vector: np.ndarray) -> WahlChatResponse | None:
+        try:
+            with self._lock:
+                index = self._indexes.get(topic)
+                if index is not None:
+                    self.expired += index.drop_oldest_while(self._is_expired)
+                match = index.search(vector) if index is not None else None
+                if match is not None and match[0] >= self.threshold:
+                    self.hits += 1
+                    return match[1][1]
+                self.misses += 1
+                return None
+        except Exception:
+            self._record_error("Semantic cache lookup failed")
+            return None
+
+    def add(self, topic: str, question: str, response: WahlChatResponse) -> None:
+        vector = self.embed(question)
+        if vector is not None:
+            self.add_vector(topic, vector, response)
+
+    def add_vector(
+        self, topic: str, vector: np.ndarray, response: WahlChatResponse
+    ) -> None:
+        """Index ``response``; only pass answers fetched from wahl.chat."""
+        try:
+            with self._lock:
+                index = self._indexes.get(topic)
+                if index is None:
+                    index = VectorIndex(
+                        mode=self.index_mode, max_entries=self.max_entries
+                    )
+                    self._indexes[topic] = index
+                index.add(vector, (time.monotonic(), response))
+        except Exception:
+            self._record_error("Adding to the semantic cache failed")
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "errors": self.errors,
+                "entries": {
+                    topic: len(index) for topic, index in self._indexes.items()
+                },
+            }
+
+    def _is_expired(self, payload: tuple[float, WahlChatResponse]) -> bool:
+        return time.monotonic() - payload[0] > self.ttl_seconds
+
+    def _record_error(self, message: str) -> None:
+        with self._lock:
+            self.errors += 1
+        logger.warning(message, exc_info=True)
+
+
+semantic_cache = SemanticAnswerCache()
+metrics.register_stats("semantic_cache", semantic_cache.stats)
+
+
+__all__ = [
+    "Embedder",
+    "VectorIndex",
+    "SemanticAnswerCache",
+    "semantic_cache",
+    "hashing_embedder",
+    "openai_embedder",
+    "SEMANTIC_CACHE_ENABLED",
+]
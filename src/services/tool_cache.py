@@ -0,0 +1,167 @@
+"""Result cache for agent tools that call slow external services.
+
+Results are keyed by the normalized query and kept in an in-memory LRU with a
+TTL. Concurrent calls with the same query while it is being computed wait for
+the first call instead of hitting the service again. Every cache keeps hit
+and latency counters, collected by :func:`tool_cache_stats`.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable
+
+from src.services.wahl_chat_cache import normalize_question
+from src.utils.telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+_caches: dict[str, ToolResultCache] = {}
+
+
+class ToolResultCache:
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+    ) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, Future[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+        self.compute_count = 0
+        self.compute_seconds_total = 0.0
+        self.compute_seconds_max = 0.0
+
+        _caches[name] = self
+
+    def get(self, query: str) -> str | None:
+        """Return the cached result for ``query``; a miss is not counted."""
+        key = normalize_question(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_or_compute(self, query: str, compute: Callable[[str], str]) -> str:
+        """Return the cached result for ``query`` or compute it once."""
+        key = normalize_question(query)
+        owner = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                inflight = Future()
+                self._inflight[key] = inflight
+                owner = True
+        if not owner:
+            return inflight.result()
+
+        started = time.perf_counter()
+        try:
+            result = compute(query)
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self.errors += 1
+            inflight.set_exception(exc)
+            raise
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._remember(key, result)
+            self.compute_count += 1
+            self.compute_seconds_total += elapsed
+            self.compute_seconds_max = max(self.compute_seconds_max, elapsed)
+        inflight.set_result(result)
+        return result
+
+    def prewarm(
+        self,
+        queries: Iterable[str],
+        compute: Callable[[str], str],
+        *,
+        max_workers: int = 4,
+    ) -> None:
+        """Compute ``queries`` in the background; failures are only counted."""
+        executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{self.name}-prewarm"
+        )
+        for query in queries:
+            executor.submit(self._prewarm_one, query, compute)
+        executor.shutdown(wait=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "compute_count": self.compute_count,
+                "compute_ms_avg": (
+                    self.compute_seconds_total / self.compute_count * 1000
+                    if self.compute_count
+                    else 0.0
+                ),
+                "compute_ms_max": self.compute_seconds_max * 1000,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _prewarm_one(self, query: str, compute: Callable[[str], str]) -> None:
+        try:
+            self.get_or_compute(query, compute)
+        except Exception as exc:  # noqa: BLE001 - pre-warming is best effort
+            logger.warning("Pre-warming %s failed for %r: %s", self.name, query, exc)
+
+    def _remember(self, key: str, result: str) -> None:
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+def tool_cache_stats() -> dict[str, dict[str, Any]]:
+    """Return the counters of every tool cache, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+metrics.register_stats("tool_cache", tool_cache_stats, label="cache")
+
+
+__all__ = ["ToolResultCache", "tool_cache_stats"]
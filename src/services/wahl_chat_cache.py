@@ -0,0 +1,300 @@
+"""Content-addressed cache for wahl.chat party answers.
+
+Answers are keyed on the normalized question together with the context id and
+the requested parties. Entries live in an in-memory LRU with a TTL and, if a
+SQLite path is configured, in an on-disk tier that survives restarts. The
+disk tier is read and written on its own thread, so lookups and the event
+loops never wait for SQLite. Identical requests that are already in flight
+share one upstream call.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, Sequence, TypeVar
+
+from src.services.wahl_chat_models import PartyResponse, Source, WahlChatResponse
+
+Fetch = Callable[[str], "Future[WahlChatResponse]"]
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Normalize unicode, case and whitespace so trivial variants share a key."""
+    return " ".join(unicodedata.normalize("NFKC", question).casefold().split())
+
+
+def serialize_response(response: WahlChatResponse) -> str:
+    return json.dumps(asdict(response), ensure_ascii=False)
+
+
+def deserialize_response(payload: str) -> WahlChatResponse:
+    data = json.loads(payload)
+    return WahlChatResponse(
+        party_responses=[
+            PartyResponse(
+                party_id=party["party_id"],
+                response=party["response"],
+                sources=[Source(**source) for source in party["sources"]],
+            )
+            for party in data["party_responses"]
+        ]
+    )
+
+
+class PartyAnswerCache:
+    def __init__(
+        self,
+        *,
+        context_id: str,
+        party_ids: Sequence[str],
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        sqlite_path: str | None = None,
+    ) -> None:
+        self.context_id = context_id
+        self.party_ids = list(party_ids)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[str, tuple[float, WahlChatResponse]] = OrderedDict()
+        self._inflight: dict[str, Future[WahlChatResponse]] = {}
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        # The SQLite tier is only used from this thread, so neither a slow
+        # read nor a commit holds the lock or runs on an event loop
+        self._disk: ThreadPoolExecutor | None = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS party_answers "
+                "(key TEXT PRIMARY KEY, payload TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._disk = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="wahl-chat-cache"
+            )
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def key_for(self, question: str) -> str:
+        material = json.dumps(
+            [self.context_id, self.party_ids, normalize_question(question)],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, question: str) -> WahlChatResponse | None:
+        """Return the cached answer; blocks on the SQLite tier on a memory miss."""
+        key = self.key_for(question)
+        with self._lock:
+            response = self._lookup(key)
+        if response is None and self._disk is not None:
+            response = self._disk.submit(self._read, key).result()
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, question: str, response: WahlChatResponse) -> None:
+        key = self.key_for(question)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, response)
+        self._write_later(key, stored_at, response)
+
+    def get_or_fetch(self, question: str, fetch: Fetch) -> Future[WahlChatResponse]:
+        """Return a future for the answer, calling ``fetch`` only on a cold miss.
+
+        Concurrent callers asking the same question while it is being fetched
+        receive the same future instead of starting another upstream request.
+        With a SQLite tier, a memory miss is looked up on disk first, and on a
+        disk miss ``fetch`` is called from the disk thread.
+        """
+        key = self.key_for(question)
+        with self._lock:
+            response = self._lookup(key)
+            if response is not None:
+                self.hits += 1
+                future: Future[WahlChatResponse] = Future()
+                future.set_result(response)
+                return future
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+                return inflight
+
+            if self._disk is None:
+                self.misses += 1
+                future = fetch(question)
+            else:
+                future = Future()
+            self._inflight[key] = future
+
+        if self._disk is None:
+            future.add_done_callback(lambda done: self._on_fetched(key, done))
+        else:
+            self._disk.submit(self._load_or_fetch, key, question, fetch, future)
+        return future
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.submit(self._delete_all).result()
+
+    def close(self) -> None:
+        """Finish the pending disk writes and close the SQLite tier."""
+        if self._disk is not None:
+            self._disk.shutdown(wait=True)
+            self._db.close()
+
+    def _on_fetched(self, key: str, future: Future[WahlChatResponse]) -> None:
+        fetched = not future.cancelled() and future.exception() is None
+        stored_at = time.time()
+        with self._lock:
+            self._inflight.pop(key, None)
+            if fetched:
+                self._remember(key, stored_at, future.result())
+        if fetched:
+            self._write_later(key, stored_at, future.result())
+
+    def _lookup(self, key: str) -> WahlChatResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, response = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _remember(self, key: str, stored_at: float, response: WahlChatResponse) -> None:
+        self._entries[key] = (stored_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _write_later(
+        self, key: str, stored_at: float, response: WahlChatResponse
+    ) -> None:
+        if self._disk is not None:
+            self._disk.submit(self._write, key, stored_at, response)
+
+    # The methods below run on the disk thread
+
+    def _load_or_fetch(
+        self,
+        key: str,
+        question: str,
+        fetch: Fetch,
+        future: Future[WahlChatResponse],
+    ) -> None:
+        try:
+            response = self._read(key)
+        except Exception:
+            # A broken disk tier degrades to a miss
+            logger.warning("Reading the wahl.chat answer cache failed", exc_info=True)
+            response = None
+
+        if response is not None:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._remember(key, time.time(), response)
+                self.hits += 1
+                self.disk_hits += 1
+            if not future.cancelled():
+                future.set_result(response)
+            return
+
+        with self._lock:
+            self.misses += 1
+        try:
+            upstream = fetch(question)
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            if not future.cancelled():
+                future.set_exception(exc)
+            return
+        upstream.add_done_callback(lambda done: self._on_fetched(key, done))
+        upstream.add_done_callback(lambda done: _copy_outcome(done, future))
+
+    def _read(self, key: str) -> WahlChatResponse | None:
+        row = self._db.execute(
+            "SELECT payload, stored_at FROM party_answers WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        payload, stored_at = row
+        if time.time() - stored_at > self.ttl_seconds:
+            self._db.execute("DELETE FROM party_answers WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        return deserialize_response(payload)
+
+    def _write(self, key: str, stored_at: float, response: WahlChatResponse) -> None:
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO party_answers (key, payload, stored_at) "
+                "VALUES (?, ?, ?)",
+                (key, serialize_response(response), stored_at),
+            )
+            self._db.commit()
+        except Exception:
+            logger.warning("Writing the wahl.chat answer cache failed", exc_info=True)
+
+    def _delete_all(self) -> None:
+        self._db.execute("DELETE FROM party_answers")
+        self._db.commit()
+
+
+def _copy_outcome(source: Future[T], target: Future[T]) -> None:
+    if target.cancelled():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+__all__ = [
+    "PartyAnswerCache",
+    "normalize_question",
+    "serialize_response",
+    "deserialize_response",
+]
@@ -0,0 +1,27 @@
+"""Data model for answers returned by the wahl.chat backend."""
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Source:
+    name: str
+    page: int
+    url: str | None = None
+    document_publish_date: str | None = None
+    source_document: str | None = None
+
+
+@dataclass
+class PartyResponse:
+    party_id: str
+    response: str
+    sources: list[Source] = field(default_factory=list)
+
+
+@dataclass
+class WahlChatResponse:
+    party_responses: list[PartyResponse]
+
+
+__all__ = ["Source", "PartyResponse", "WahlChatResponse"]
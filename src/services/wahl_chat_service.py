@@ -1,11 +1,29 @@
+"""Client for the wahl.chat backend used to query party answers.
+
+Requests are multiplexed over a small pool of long-lived socket.io
+connections that live on a dedicated background event loop, so neither the
+websocket handshake nor an event loop is set up per party-matching request.
+"""
+
 import asyncio
+import logging
 import os
+import queue
+import random
+import threading
+import time
 import uuid
+from concurrent.futures import Future
 from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterator, TypeVar
 
 import socketio
 from dotenv import load_dotenv
 
+from src.services.wahl_chat_cache import PartyAnswerCache
+from src.services.wahl_chat_models import PartyResponse, Source, WahlChatResponse
+from src.utils.telemetry import metrics, record_span
+
 load_dotenv()
 
 BACKEND_URL = os.getenv(
@@ -15,40 +33,142 @@ BACKEND_URL = os.getenv(
 CONTEXT_ID = os.getenv("WAHL_CHAT_CONTEXT_ID", "bundestagswahl-2025")
 PARTY_IDS = ["spd", "cdu", "gruene", "afd", "linke"]
 TIMEOUT_SECONDS = 60
+POOL_SIZE = int(os.getenv("WAHL_CHAT_POOL_SIZE", "2"))
+CONNECT_ATTEMPTS = 5
+CONNECT_BASE_DELAY_SECONDS = 0.5
+CONNECT_MAX_DELAY_SECONDS = 10
+CACHE_TTL_SECONDS = float(os.getenv("WAHL_CHAT_CACHE_TTL_SECONDS", "86400"))
+CACHE_MAX_ENTRIES = int(os.getenv("WAHL_CHAT_CACHE_MAX_ENTRIES", "1024"))
+CACHE_PATH = os.getenv("WAHL_CHAT_CACHE_PATH") or None
 
+T = TypeVar("T")
 
-@dataclass
-class Source:
-    name: str
-    page: int
-    url: str | None = None
-    document_publish_date: str | None = None
-    source_document: str | None = None
+logger = logging.getLogger(__name__)
+
+WAHL_CHAT_FIRST_PARTY_SECONDS = metrics.histogram(
+    "wahl_chat_first_party_seconds",
+    "Time from the answer request to the first complete party answer.",
+)
+OnParty = Callable[[PartyResponse], None]
 
 
 @dataclass
-class PartyResponse:
-    party_id: str
-    response: str
-    sources: list[Source] = field(default_factory=list)
+class _PendingSession:
+    responses: dict[str, str] = field(default_factory=dict)
+    sources: dict[str, list[Source]] = field(default_factory=dict)
+    initialized: asyncio.Event = field(default_factory=asyncio.Event)
+    complete: asyncio.Event = field(default_factory=asyncio.Event)
+    error: Exception | None = None
+    on_party: OnParty | None = None
+    first_party_ns: int | None = None
 
+    def fail(self, error: Exception) -> None:
+        self.error = error
+        self.initialized.set()
+        self.complete.set()
+
+    def to_response(self) -> WahlChatResponse:
+        return WahlChatResponse(
+            party_responses=[
+                PartyResponse(
+                    party_id=party_id,
+                    response=self.responses.get(party_id, ""),
+                    sources=self.sources.get(party_id, []),
+                )
+                for party_id in PARTY_IDS
+            ]
+        )
 
-@dataclass
-class WahlChatResponse:
-    party_responses: list[PartyResponse]
 
+class _WahlChatConnection:
+    """One socket.io connection carrying many chat sessions, keyed by session_id."""
+
+    def __init__(self) -> None:
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sessions: dict[str, _PendingSession] = {}
+        self._connect_lock = asyncio.Lock()
+        self._closed = False
+        # The loop only keeps a weak reference to its tasks
+        self._reconnect_task: asyncio.Task | None = None
+
+        self.sio.on("chat_session_initialized", self._on_initialized)
+        self.sio.on("sources_ready", self._on_sources)
+        self.sio.on("party_response_complete", self._on_party_complete)
+        self.sio.on("chat_response_complete", self._on_complete)
+        self.sio.on("disconnect", self._on_disconnect)
+
+    async def ensure_connected(self) -> None:
+        """Connect if needed, retrying with exponential backoff and jitter."""
+        if self.sio.connected:
+            return
+
+        async with self._connect_lock:
+            delay = CONNECT_BASE_DELAY_SECONDS
+            for attempt in range(1, CONNECT_ATTEMPTS + 1):
+                if self.sio.connected:
+                    return
+                try:
+                    await self.sio.connect(
+                        BACKEND_URL,
+                        transports=["websocket"],
+                        headers={"Origin": "http://localhost:3000"},
+                    )
+                    return
+                except (socketio.exceptions.ConnectionError, ValueError):
+                    # ValueError: the previous socket is still being torn down
+                    if attempt == CONNECT_ATTEMPTS:
+                        raise
+                await asyncio.sleep(delay * (0.5 + random.random()))
+                delay = min(delay * 2, CONNECT_MAX_DELAY_SECONDS)
+
+    async def ask(
+        self, question: str, on_party: OnParty | None = None
+    ) -> WahlChatResponse:
+        await self.ensure_connected()
+
+        started_ns = time.time_ns()
+        session_id = str(uuid.uuid4())
+        session = _PendingSession(on_party=on_party)
+        self.sessions[session_id] = session
+        try:
+            await self.sio.emit(
+                "chat_session_init",
+                {
+                    "session_id": session_id,
+                    "context_id": CONTEXT_ID,
+                    "party_ids": PARTY_IDS,
+                    "chat_history": [],
+                    "current_title": "",
+                    "chat_response_llm_size": "large",
+                    "last_quick_replies": [],
+                    "is_cacheable": True,
+                },
+            )
+            await asyncio.wait_for(
+                self._answer(session_id, session, question, started_ns),
+                timeout=TIMEOUT_SECONDS,
+            )
+        finally:
+            self.sessions.pop(session_id, None)
 
-async def _ask_parties_async(question: str) -> WahlChatResponse:
-    sio = socketio.AsyncClient()
-    session_id = str(uuid.uuid4())
+        if session.error is not None:
+            raise session.error
+        return session.to_response()
 
-    responses: dict[str, str] = {}
-    sources: dict[str, list[Source]] = {}
-    complete_event = asyncio.Event()
+    async def _answer(
+        self,
+        session_id: str,
+        session: _PendingSession,
+        question: str,
+        started_ns: int,
+    ) -> None:
+        await session.initialized.wait()
+        if session.error is not None:
+            return
+        initialized_ns = time.time_ns()
+        record_span("wahl_chat.session_init", started_ns, initialized_ns)
 
-    @sio.on("chat_session_initialized")
-    async def on_initialized(data):
-        await sio.emit(
+        await self.sio.emit(
             "chat_answer_request",
             {
                 "session_id": session_id,
@@ -58,11 +178,55 @@ async def _ask_parties_async(question: str) -> WahlChatResponse:
                 "user_is_logged_in": False,
             },
         )
+        await session.complete.wait()
+        if session.error is not None:
+            return
 
-    @sio.on("sources_ready")
-    async def on_sources(data):
-        party_id = data["party_id"]
-        sources[party_id] = [
+        attributes = {}
+        if session.first_party_ns is not None:
+            first_party_seconds = (session.first_party_ns - initialized_ns) / 1e9
+            WAHL_CHAT_FIRST_PARTY_SECONDS.observe(first_party_seconds)
+            attributes["first_party_ms"] = round(first_party_seconds * 1000, 1)
+        record_span("wahl_chat.answer", initialized_ns, time.time_ns(), **attributes)
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self.sio.connected:
+            await self.sio.disconnect()
+
+    def _session_for(self, data: Any) -> _PendingSession | None:
+        session_id = data.get("session_id") if isinstance(data, dict) else None
+        if session_id is not None:
+            return self.sessions.get(session_id)
+        if len(self.sessions) == 1:
+            # Events without a session id can only belong to the single session
+            return next(iter(self.sessions.values()))
+        if self.sessions:
+            # The event cannot be routed, so any of the sessions would wait for
+            # it until the timeout; fail them all instead
+            logger.error(
+                "wahl.chat event without a session_id on a connection with %d "
+                "open sessions",
+                len(self.sessions),
+            )
+            for session in list(self.sessions.values()):
+                session.fail(
+                    RuntimeError("wahl.chat backend sent an event without session_id")
+                )
+        return None
+
+    async def _on_initialized(self, data) -> None:
+        session = self._session_for(data)
+        if session is not None:
+            session.initialized.set()
+
+    async def _on_sources(self, data) -> None:
+        session = self._session_for(data)
+        if session is None:
+            return
+        session.sources[data["party_id"]] = [
             Source(
                 name=s.get("source", ""),
                 page=s.get("page", 0),
@@ -73,51 +237,217 @@ async def _ask_parties_async(question: str) -> WahlChatResponse:
             for s in data.get("sources", [])
         ]
 
-    @sio.on("party_response_complete")
-    async def on_party_complete(data):
-        responses[data["party_id"]] = data["complete_message"]
+    async def _on_party_complete(self, data) -> None:
+        session = self._session_for(data)
+        if session is None:
+            return
+        party_id = data["party_id"]
+        session.responses[party_id] = data["complete_message"]
+        if session.first_party_ns is None:
+            session.first_party_ns = time.time_ns()
+        if session.on_party is not None:
+            session.on_party(
+                PartyResponse(
+                    party_id=party_id,
+                    response=data["complete_message"],
+                    sources=session.sources.get(party_id, []),
+                )
+            )
 
-    @sio.on("chat_response_complete")
-    async def on_complete(data):
-        complete_event.set()
+    async def _on_complete(self, data) -> None:
+        session = self._session_for(data)
+        if session is not None:
+            session.complete.set()
 
-    await sio.connect(
-        BACKEND_URL,
-        transports=["websocket"],
-        headers={"Origin": "http://localhost:3000"},
-    )
+    async def _on_disconnect(self, *args) -> None:
+        for session in list(self.sessions.values()):
+            session.fail(ConnectionError("Lost connection to the wahl.chat backend"))
+        if not self._closed and self._reconnect_task is None:
+            # Reconnect in the background so the next request finds a live socket
+            self._reconnect_task = asyncio.get_running_loop().create_task(
+                self._reconnect()
+            )
+            self._reconnect_task.add_done_callback(self._on_reconnected)
 
-    await sio.emit(
-        "chat_session_init",
-        {
-            "session_id": session_id,
-            "context_id": CONTEXT_ID,
-            "party_ids": PARTY_IDS,
-            "chat_history": [],
-            "current_title": "",
-            "chat_response_llm_size": "large",
-            "last_quick_replies": [],
-            "is_cacheable": True,
-        },
-    )
+    def _on_reconnected(self, task: asyncio.Task) -> None:
+        if self._reconnect_task is task:
+            self._reconnect_task = None
 
-    await asyncio.wait_for(complete_event.wait(), timeout=TIMEOUT_SECONDS)
-    await sio.disconnect()
+    async def _reconnect(self) -> None:
+        await asyncio.sleep(CONNECT_BASE_DELAY_SECONDS)
+        try:
+            await self.ensure_connected()
+        except (socketio.exceptions.ConnectionError, ValueError):
+            pass
 
-    return WahlChatResponse(
-        party_responses=[
-            PartyResponse(
-                party_id=party_id,
-                response=responses.get(party_id, ""),
-                sources=sources.get(party_id, []),
-            )
-            for party_id in PARTY_IDS
-        ]
+
+class WahlChatConnectionPool:
+    """Pool of persistent wahl.chat connections on a background event loop."""
+
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        self._size = max(1, size)
+        self._connections: list[_WahlChatConnection] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    def _submit(self, coro: Coroutine[Any, Any, T]) -> Future[T]:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="wahl-chat-connections",
+                    daemon=True,
+                ).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _get_connections(self) -> list[_WahlChatConnection]:
+        # Only called on the background loop, so no locking is needed
+        if not self._connections:
+            self._connections = [_WahlChatConnection() for _ in range(self._size)]
+        return self._connections
+
+    async def _ask(
+        self, question: str, on_party: OnParty | None = None
+    ) -> WahlChatResponse:
+        connection = min(self._get_connections(), key=lambda c: len(c.sessions))
+        return await connection.ask(question, on_party)
+
+    async def _connect_all(self) -> None:
+        await asyncio.gather(
+            *(connection.ensure_connected() for connection in self._get_connections())
+        )
+
+    async def _close_all(self) -> None:
+        await asyncio.gather(*(c.close() for c in self._connections))
+        self._connections = []
+
+    def submit(
+        self, question: str, on_party: OnParty | None = None
+    ) -> Future[WahlChatResponse]:
+        """Schedule a question on the pool's loop and return its future.
+
+        ``on_party`` is called on the pool's loop for every party answer as
+        soon as it is complete, before the whole response is.
+        """
+        return self._submit(self._ask(question, on_party))
+
+    def ask(self, question: str) -> WahlChatResponse:
+        """Blocking facade for request threads."""
+        return self.submit(question).result()
+
+    async def ask_async(self, question: str) -> WahlChatResponse:
+        """Awaitable from any event loop; the work runs on the pool's loop."""
+        return await asyncio.wrap_future(self.submit(question))
+
+    def connect(self) -> Future[None]:
+        """Open all pool connections in the background, e.g. at startup."""
+        return self._submit(self._connect_all())
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+        self._submit(self._close_all()).result()
+
+
+connection_pool = WahlChatConnectionPool()
+answer_cache = PartyAnswerCache(
+    context_id=CONTEXT_ID,
+    party_ids=PARTY_IDS,
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    sqlite_path=CACHE_PATH,
+)
+metrics.register_stats("wahl_chat_cache", answer_cache.stats)
+
+
+async def ask_bundestag_parties_async(question: str) -> WahlChatResponse:
+    # Shielded so a cancelled caller does not cancel a request others share
+    return await asyncio.shield(
+        asyncio.wrap_future(answer_cache.get_or_fetch(question, connection_pool.submit))
     )
 
 
 def ask_bundestag_parties(question: str) -> WahlChatResponse:
-    return asyncio.run(_ask_parties_async(question))
+    return answer_cache.get_or_fetch(question, connection_pool.submit).result()
+
+
+_DONE = object()
+
+
+class PartyAnswerStream:
+    """Yields party answers as they land; ``response`` is set once exhausted.
+
+    Answers served from the cache, or shared with an identical request already
+    in flight, arrive all at once when the full response is available.
+    ``fetched`` tells whether this stream asked wahl.chat itself.
+    """
+
+    def __init__(self, question: str) -> None:
+        self._queue: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        self.fetched = False
+
+        def fetch(question: str) -> Future[WahlChatResponse]:
+            self.fetched = True
+            return connection_pool.submit(question, on_party=self._queue.put)
+
+        self._future = answer_cache.get_or_fetch(question, fetch)
+        self._future.add_done_callback(lambda _: self._queue.put(_DONE))
+        self.response: WahlChatResponse | None = None
+
+    def __iter__(self) -> Iterator[PartyResponse]:
+        seen: set[str] = set()
+        while (item := self._queue.get()) is not _DONE:
+            seen.add(item.party_id)
+            yield item
+
+        self.response = self._future.result()
+        for party_response in self.response.party_responses:
+            if party_response.party_id not in seen:
+                yield party_response
+
+
+class AsyncPartyAnswerStream:
+    """Async counterpart of :class:`PartyAnswerStream`."""
+
+    def __init__(self, question: str) -> None:
+        loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[Any] = asyncio.Queue()
+
+        def put(item: Any) -> None:
+            loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+        self.fetched = False
+
+        def fetch(question: str) -> Future[WahlChatResponse]:
+            self.fetched = True
+            return connection_pool.submit(question, on_party=put)
+
+        self._future = answer_cache.get_or_fetch(question, fetch)
+        self._future.add_done_callback(lambda _: put(_DONE))
+        self.response: WahlChatResponse | None = None
+
+    async def __aiter__(self) -> AsyncIterator[PartyResponse]:
+        seen: set[str] = set()
+        while (item := await self._queue.get()) is not _DONE:
+            seen.add(item.party_id)
+            yield item
+
+        self.response = self._future.result()
+        for party_response in self.response.party_responses:
+            if party_response.party_id not in seen:
+                yield party_response
 
 
-__all__ = ["Source", "PartyResponse", "WahlChatResponse", "ask_bundestag_parties"]
+__all__ = [
+    "Source",
+    "PartyResponse",
+    "WahlChatResponse",
+    "WahlChatConnectionPool",
+    "connection_pool",
+    "answer_cache",
+    "PartyAnswerStream",
+    "AsyncPartyAnswerStream",
+    "ask_bundestag_parties",
+    "ask_bundestag_parties_async",
+]
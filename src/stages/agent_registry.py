@@ -0,0 +1,80 @@
+"""Process-wide registry of compiled stage agents.
+
+Building a LangGraph agent compiles a new graph, so stages register a builder
+once at import time and fetch the compiled agent per turn. Everything that
+differs between conversations travels in :class:`AgentContext`, which is
+passed to ``agent.stream(..., context=...)`` and read by tools through
+``ToolRuntime`` and by :func:`context_system_prompt` through the model request.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from langchain.agents.middleware import ModelRequest, dynamic_prompt
+from langchain_core.runnables import Runnable
+
+from src.conversation.conversation_state import ConversationState
+from src.utils.telemetry import span
+
+AgentBuilder = Callable[[], Runnable]
+
+
+@dataclass
+class AgentContext:
+    state: ConversationState
+    system_prompt: str
+
+
+_builders: dict[str, AgentBuilder] = {}
+_agents: dict[str, Runnable] = {}
+_lock = threading.Lock()
+
+
+@dynamic_prompt
+def context_system_prompt(request: ModelRequest) -> str:
+    """Use the per-turn system prompt carried in the runtime context."""
+    context: AgentContext = request.runtime.context
+    return context.system_prompt
+
+
+def register_agent(name: str, builder: AgentBuilder) -> None:
+    """Register the builder that compiles the agent graph for ``name``."""
+    with _lock:
+        _builders[name] = builder
+        _agents.pop(name, None)
+
+
+def get_agent(name: str) -> Runnable:
+    """Return the compiled agent for ``name``, building it on first use."""
+    agent = _agents.get(name)
+    if agent is not None:
+        return agent
+
+    with _lock:
+        agent = _agents.get(name)
+        if agent is None:
+            builder = _builders.get(name)
+            if builder is None:
+                raise KeyError(f"No agent registered under '{name}'")
+            with span("agent.build", agent=name):
+                agent = builder()
+            _agents[name] = agent
+    return agent
+
+
+def build_registered_agents() -> None:
+    """Compile every registered agent up front, e.g. at process start."""
+    for name in list(_builders):
+        get_agent(name)
+
+
+__all__ = [
+    "AgentContext",
+    "context_system_prompt",
+    "register_agent",
+    "get_agent",
+    "build_registered_agents",
+]
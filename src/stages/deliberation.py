@@ -1,94 +1,153 @@
-import os
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 from langchain.agents import create_agent
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.language_models import BaseChatModel
 from langchain_core.tools import tool
+from langchain.tools import ToolRuntime
 from langgraph.graph.state import Runnable
-from pydantic import SecretStr
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from src.services.llm_clients import get_chat_model
 
+from src.conversation.persistence import (
+    reset_stage_messages,
+    reset_stage_messages_async,
+)
 from src.conversation.conversation_state import (
     ConversationStage,
     ConversationState,
-    serialize_messages,
 )
-from src.events import EventType
 from src.prompts import get_deliberation_prompt
-from src.utils.events import stream_single_message
-from src.utils.messages import chunk_to_text
-from src.services.firestore_service import update_conversation
+from src.stages.agent_registry import (
+    AgentContext,
+    context_system_prompt,
+    register_agent,
+)
+from src.stages.streaming import (
+    StageTurn,
+    astream_stage_turn,
+    register_stage_start,
+    stream_stage_turn,
+)
+from src.services.firestore_service import (
+    update_conversation,
+)
 
 load_dotenv()
 
-llm = ChatOpenAI(
-    model=os.getenv("OPENAI_MODEL") or "openai/gpt-5.1",
-    base_url=os.getenv("OPENAI_BASE_URL"),
-    api_key=SecretStr(os.getenv("OPENAI_API_KEY", "")),
-)
 
+START_DELIBERATION_AGENT = "start_deliberation"
 
-def start_deliberation(state: ConversationState):
-    active_listening_summary, party_positioning_summary, perspective_taking_summary = (
-        get_required_summaries(state)
+
+@tool
+def end_deliberation(
+    deliberation_summary: str, runtime: ToolRuntime[AgentContext]
+) -> str:
+    """This tool is used to end the deliberation phase, populate the parameters with the user's reflections, updated perspective and defending arguments (approved by the user) to finish this conversation phase phase.
+    Formulate the the summary in 3rd person form (the user...)"""
+    state = runtime.context.state
+    state.stage = ConversationStage.PARTY_MATCHING
+    state.deliberation_summary = deliberation_summary
+    update_conversation(
+        conversation_id=state.id,
+        stage=ConversationStage.PARTY_MATCHING.value,
+        extra={"deliberation_summary": deliberation_summary},
     )
-    deliberation_prompt = get_deliberation_prompt(
-        state.topic,
-        active_listening_summary,
-        party_positioning_summary,
-        perspective_taking_summary,
+    return "Deliberation phase completed"
+
+
+def build_start_deliberation_agent(model: BaseChatModel | None = None) -> Runnable:
+    return create_agent(
+        model=model or get_chat_model(ConversationStage.DELIBERATION.value),
+        middleware=[context_system_prompt],
+        context_schema=AgentContext,
     )
 
-    deliberation_agent: Runnable = create_agent(
-        model=llm,
-        system_prompt=str(deliberation_prompt),
+
+def build_deliberation_agent(model: BaseChatModel | None = None) -> Runnable:
+    return create_agent(
+        model=model or get_chat_model(ConversationStage.DELIBERATION.value),
+        tools=[end_deliberation],
+        middleware=[context_system_prompt],
+        context_schema=AgentContext,
     )
 
-    state.deliberation_messages = []
-    update_conversation(
-        conversation_id=state.id,
-        extra={
-            "deliberation_messages": serialize_messages(state.deliberation_messages)
-        },
+
+register_agent(START_DELIBERATION_AGENT, build_start_deliberation_agent)
+register_agent(ConversationStage.DELIBERATION.value, build_deliberation_agent)
+
+
+START_DELIBERATION_TURN = StageTurn(
+    stage=ConversationStage.DELIBERATION,
+    agent_name=START_DELIBERATION_AGENT,
+    messages_field="deliberation_messages",
+)
+DELIBERATION_TURN = StageTurn(
+    stage=ConversationStage.DELIBERATION,
+    agent_name=ConversationStage.DELIBERATION.value,
+    messages_field="deliberation_messages",
+    next_stage=ConversationStage.PARTY_MATCHING,
+)
+
+
+def start_deliberation(state: ConversationState) -> Iterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_deliberation_system_prompt(state)
     )
-    return stream_response_and_update_state(state, deliberation_agent)
+
+    reset_stage_messages(state, "deliberation_messages")
+    return stream_stage_turn(START_DELIBERATION_TURN, state, context)
 
 
 def deliberation(state: ConversationState, user_message: str) -> Iterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_deliberation_system_prompt(state)
+    )
+
+    state.deliberation_messages.append(HumanMessage(content=user_message))
+
+    return stream_stage_turn(DELIBERATION_TURN, state, context)
+
+
+async def start_deliberation_async(state: ConversationState) -> AsyncIterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_deliberation_system_prompt(state)
+    )
+
+    await reset_stage_messages_async(state, "deliberation_messages")
+    async for event in astream_stage_turn(START_DELIBERATION_TURN, state, context):
+        yield event
+
+
+async def deliberation_async(
+    state: ConversationState, user_message: str
+) -> AsyncIterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_deliberation_system_prompt(state)
+    )
+
+    state.deliberation_messages.append(HumanMessage(content=user_message))
+
+    async for event in astream_stage_turn(DELIBERATION_TURN, state, context):
+        yield event
+
+
+register_stage_start(
+    ConversationStage.DELIBERATION, start_deliberation, start_deliberation_async
+)
+
+
+def build_deliberation_system_prompt(state: ConversationState) -> str:
     active_listening_summary, party_positioning_summary, perspective_taking_summary = (
         get_required_summaries(state)
     )
-    deliberation_prompt = get_deliberation_prompt(
+    return get_deliberation_prompt(
         state.topic,
         active_listening_summary,
         party_positioning_summary,
         perspective_taking_summary,
     )
 
-    state.deliberation_messages.append(HumanMessage(content=user_message))
-
-    @tool
-    def end_deliberation(deliberation_summary: str) -> str:
-        """This tool is used to end the deliberation phase, populate the parameters with the user's reflections, updated perspective and defending arguments (approved by the user) to finish this conversation phase phase.
-        Formulate the the summary in 3rd person form (the user...)"""
-        state.stage = ConversationStage.PARTY_MATCHING
-        state.deliberation_summary = deliberation_summary
-        update_conversation(
-            conversation_id=state.id,
-            stage=ConversationStage.PARTY_MATCHING.value,
-            extra={"deliberation_summary": deliberation_summary},
-        )
-        return "Deliberation phase completed"
-
-    deliberation_agent: Runnable = create_agent(
-        model=llm,
-        tools=[end_deliberation],
-        system_prompt=deliberation_prompt,
-    )
-
-    return stream_response_and_update_state(state, deliberation_agent)
-
 
 def get_required_summaries(state: ConversationState) -> tuple[str, str, str]:
     party_positioning_summary = state.party_positioning_summary
@@ -114,52 +173,3 @@ def get_required_summaries(state: ConversationState) -> tuple[str, str, str]:
         party_positioning_summary,
         perspective_taking_summary,
     )
-
-
-def stream_response_and_update_state(
-    state: ConversationState, agent: Runnable
-) -> Iterator[dict]:
-    assistant_message_text = ""
-    tool_called = False
-    stream_open = False
-
-    for chunk, metadata in agent.stream(
-        {"messages": state.deliberation_messages}, stream_mode="messages"
-    ):
-        chunk_type = getattr(chunk, "type", None)
-        if isinstance(chunk, BaseMessage):
-            chunk_type = chunk.type
-
-        if chunk_type == "tool":
-            tool_called = True
-            break
-
-        chunk_text = chunk_to_text(chunk)
-        if chunk_text:
-            if not stream_open:
-                yield {"type": EventType.MESSAGE_START.value}
-                stream_open = True
-            assistant_message_text += chunk_text
-            yield {
-                "type": EventType.MESSAGE_CHUNK.value,
-                "content": chunk_text,
-            }
-
-    if assistant_message_text and not tool_called:
-        state.deliberation_messages.append(AIMessage(content=assistant_message_text))
-
-    if stream_open and not tool_called:
-        yield {"type": EventType.MESSAGE_END.value}
-
-    update_conversation(
-        conversation_id=state.id,
-        extra={
-            "deliberation_messages": serialize_messages(state.deliberation_messages)
-        },
-    )
-
-    if tool_called:
-        print("Ending deliberation phase, starting party matching")
-        from src.stages.party_matching import start_party_matching
-
-        yield from start_party_matching(state)
@@ -1,101 +1,308 @@
+import asyncio
+import logging
 import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import cache
 from langchain_core.prompts import ChatPromptTemplate
-from typing import Iterator
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Generator,
+    Iterable,
+    Iterator,
+)
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from src.services.llm_clients import get_chat_model
+from src.services.llm_scheduler import Priority, llm_priority
 from langchain_core.output_parsers import StrOutputParser
-from pydantic import SecretStr
+from langchain_core.runnables import Runnable
 
 from src.conversation.conversation_state import (
     ConversationStage,
     ConversationState,
 )
 from src.prompts import (
+    add_party_ids_to_references,
     get_distillation_prompt,
     get_party_matching_prompt,
+    get_party_pre_analysis_prompt,
+    get_party_response_section,
+    party_id_to_name,
+)
+from src.utils.events import (
+    astream_text_as_events,
+    end_event,
+    party_response_ready_event,
+    phase_timings_event,
+    stream_text_as_events,
+    progress_event,
+    sources_ready_event,
+)
+from src.services.firestore_service import (
+    update_conversation,
+    update_conversation_async,
 )
-from src.utils.events import stream_single_message, progress_event, sources_ready_event
-from src.services.firestore_service import update_conversation
+from src.stages.prefetch import register_stage_prefetch, stage_prefetcher
+from src.stages.streaming import register_stage_start
+from src.utils.telemetry import metrics, record_span
+from src.services.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
 from src.services.wahl_chat_service import (
+    AsyncPartyAnswerStream,
+    PartyAnswerStream,
+    PartyResponse,
     WahlChatResponse,
-    ask_bundestag_parties,
+    connection_pool,
 )
 
 
 load_dotenv()
 
-llm = ChatOpenAI(
-    model=os.getenv("OPENAI_MODEL") or "openai/gpt-5.1",
-    base_url=os.getenv("OPENAI_BASE_URL"),
-    api_key=SecretStr(os.getenv("OPENAI_API_KEY", "")),
+logger = logging.getLogger(__name__)
+
+# Per-party LLM comparison of each answer with the user's perspective, started
+# as soon as the answer arrives and fed into the final matching prompt
+PRE_ANALYSIS_ENABLED = (
+    os.getenv("PARTY_MATCHING_PRE_ANALYSIS", "false").lower() == "true"
+)
+# Shared by all parties; a late or failed pre-analysis is left out
+PRE_ANALYSIS_TIMEOUT_SECONDS = float(
+    os.getenv("PARTY_MATCHING_PRE_ANALYSIS_TIMEOUT_SECONDS", "20")
+)
+
+pre_analysis_executor = ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="party-pre-analysis"
+)
+
+PARTY_MATCHING_PHASE_SECONDS = metrics.histogram(
+    "party_matching_phase_seconds",
+    "Duration of the party matching phases and the time to their milestones.",
+    ("phase",),
+)
+PRE_ANALYSIS_FALLBACKS = metrics.counter(
+    "party_pre_analysis_fallbacks_total",
+    "Party sections built without their pre-analysis after a timeout or error.",
 )
 
 
+class PhaseTimer:
+    """Records the duration of consecutive party matching phases in ms.
+
+    Every phase is also recorded as a ``party_matching.<phase>`` span.
+    """
+
+    def __init__(self) -> None:
+        self._started = self._phase_started = time.perf_counter()
+        self._started_ns = self._phase_started_ns = time.time_ns()
+        self.timings: dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        """Close the current phase under ``phase`` and start the next one."""
+        now = time.perf_counter()
+        now_ns = time.time_ns()
+        self.timings[f"{phase}_ms"] = round((now - self._phase_started) * 1000, 1)
+        record_span(f"party_matching.{phase}", self._phase_started_ns, now_ns)
+        self._phase_started = now
+        self._phase_started_ns = now_ns
+
+    def mark_once(self, name: str) -> None:
+        """Record the time into the current phase the first time it is called."""
+        self.timings.setdefault(
+            f"{name}_ms", round((time.perf_counter() - self._phase_started) * 1000, 1)
+        )
+
+    def finish(self) -> dict[str, float]:
+        self.timings["total_ms"] = round(
+            (time.perf_counter() - self._started) * 1000, 1
+        )
+        record_span("party_matching", self._started_ns, time.time_ns())
+        for name, milliseconds in self.timings.items():
+            PARTY_MATCHING_PHASE_SECONDS.observe(
+                milliseconds / 1000, phase=name.removesuffix("_ms")
+            )
+        return self.timings
+
+
 def start_party_matching(state: ConversationState) -> Iterator[dict]:
+    timer = PhaseTimer()
     yield progress_event("Deine Diskussion wird zusammengefasst")
     deliberation_summary = get_required_summaries(state)
 
-    party_question_distillation_prompt = ChatPromptTemplate.from_template(
-        get_distillation_prompt()
-    )
-
-    question_distillation_chain = (
-        party_question_distillation_prompt | llm | StrOutputParser()
-    )
+    # Open the wahl.chat connections while the question is being distilled,
+    # unless the prefetch already did
+    if stage_prefetcher.take(state.id, ConversationStage.PARTY_MATCHING) is None:
+        connection_pool.connect()
 
     yield progress_event("Kernfrage wird formuliert")
-    question = question_distillation_chain.invoke(
-        {"topic": state.topic, "deliberation_summary": deliberation_summary}
-    )
-    print("Question asked to parties: ", question)
+    with llm_priority(Priority.BACKGROUND):
+        question = get_question_distillation_chain().invoke(
+            {"topic": state.topic, "deliberation_summary": deliberation_summary}
+        )
+    logger.info("Question asked to parties", extra={"question": question})
+    timer.mark("distillation")
 
     yield progress_event("Parteipositionen werden abgefragt")
-    party_responses: WahlChatResponse = ask_bundestag_parties(question)
+    party_sections: dict[str, Future[str]] = {}
 
-    # Build sources payload for frontend (per-party grouped)
-    sources_payload = [
-        {
-            "party_id": party_response.party_id,
-            "sources": [
+    def on_party(party_response: PartyResponse) -> None:
+        timer.mark_once("first_party_response")
+        party_sections[party_response.party_id] = pre_analysis_executor.submit(
+            pre_analyze_party_response,
+            party_response,
+            state.topic,
+            deliberation_summary,
+            question,
+        )
+
+    try:
+        party_responses = yield from query_parties(state.topic, question, on_party)
+        sources_payload = build_sources_payload(party_responses)
+        timer.mark("wahl_chat")
+
+        party_matching_prompt = ChatPromptTemplate.from_template(
+            get_party_matching_prompt(
+                party_responses, collect_party_sections(party_responses, party_sections)
+            )
+        )
+        timer.mark("pre_analysis")
+    finally:
+        for future in party_sections.values():
+            future.cancel()
+
+    # The prompt holds every party answer, so it is only logged for a sample
+    logger.info("Party matching prompt", extra={"payload": party_matching_prompt})
+
+    party_matching_chain = (
+        party_matching_prompt
+        | get_chat_model(ConversationStage.PARTY_MATCHING.value)
+        | StrOutputParser()
+    )
+
+    yield progress_event("Übereinstimmung wird analysiert")
+
+    # Emit sources before the message content
+    if sources_payload:
+        yield sources_ready_event(sources_payload)
+
+    result_chunks: list[str] = []
+    yield from stream_text_as_events(
+        collect_chunks(
+            party_matching_chain.stream(
                 {
-                    "source": s.name,
-                    "page": s.page,
-                    "url": s.url or "",
-                    "document_publish_date": s.document_publish_date or "",
-                    "source_document": s.source_document or "",
+                    "topic": state.topic,
+                    "deliberation_summary": deliberation_summary,
+                    "question": question,
                 }
-                for s in party_response.sources
-            ],
-        }
-        for party_response in party_responses.party_responses
-        if party_response.sources
-    ]
+            ),
+            result_chunks,
+            on_first=lambda: timer.mark_once("matching_first_token"),
+        ),
+        end=False,
+    )
+    party_matching_result = "".join(result_chunks)
+    timer.mark("matching")
 
-    party_matching_prompt = ChatPromptTemplate.from_template(
-        get_party_matching_prompt(party_responses)
+    yield phase_timings_event(timer.finish())
+    yield end_event()
+
+    update_conversation(
+        conversation_id=state.id,
+        stage=ConversationStage.END.value,
+        extra={
+            "party_matching_result": party_matching_result,
+            "party_matching_sources": sources_payload,
+            "ended_at": datetime.now(timezone.utc),
+        },
     )
 
-    print("Party matching prompt: ", party_matching_prompt)
 
-    party_matching_chain = party_matching_prompt | llm | StrOutputParser()
+async def start_party_matching_async(state: ConversationState) -> AsyncIterator[dict]:
+    timer = PhaseTimer()
+    yield progress_event("Deine Diskussion wird zusammengefasst")
+    deliberation_summary = get_required_summaries(state)
 
-    yield progress_event("Übereinstimmung wird analysiert")
-    party_matching_result = party_matching_chain.invoke(
-        {
-            "topic": state.topic,
-            "deliberation_summary": deliberation_summary,
-            "question": question,
-        }
+    prefetched = await stage_prefetcher.take_async(
+        state.id, ConversationStage.PARTY_MATCHING
     )
+    if prefetched is None:
+        connection_pool.connect()
+
+    yield progress_event("Kernfrage wird formuliert")
+    with llm_priority(Priority.BACKGROUND):
+        question = await get_question_distillation_chain().ainvoke(
+            {"topic": state.topic, "deliberation_summary": deliberation_summary}
+        )
+    logger.info("Question asked to parties", extra={"question": question})
+    timer.mark("distillation")
+
+    yield progress_event("Parteipositionen werden abgefragt")
+    party_sections: dict[str, asyncio.Task[str]] = {}
+    try:
+        party_responses: WahlChatResponse | None = None
+        async for party_response in aquery_parties(state.topic, question):
+            if isinstance(party_response, WahlChatResponse):
+                party_responses = party_response
+                break
+            timer.mark_once("first_party_response")
+            party_sections[party_response.party_id] = asyncio.create_task(
+                apre_analyze_party_response(
+                    party_response, state.topic, deliberation_summary, question
+                )
+            )
+            yield party_response_ready_event(party_response.party_id)
+        assert party_responses is not None
+        sources_payload = build_sources_payload(party_responses)
+        timer.mark("wahl_chat")
+
+        party_matching_prompt = ChatPromptTemplate.from_template(
+            get_party_matching_prompt(
+                party_responses,
+                await acollect_party_sections(party_responses, party_sections),
+            )
+        )
+        timer.mark("pre_analysis")
+    finally:
+        for task in party_sections.values():
+            task.cancel()
+
+    logger.info("Party matching prompt", extra={"payload": party_matching_prompt})
+
+    party_matching_chain = (
+        party_matching_prompt
+        | get_chat_model(ConversationStage.PARTY_MATCHING.value)
+        | StrOutputParser()
+    )
+
+    yield progress_event("Übereinstimmung wird analysiert")
 
-    # Emit sources before the message content
     if sources_payload:
         yield sources_ready_event(sources_payload)
 
-    yield from stream_single_message(party_matching_result)
+    result_chunks: list[str] = []
+    async for event in astream_text_as_events(
+        acollect_chunks(
+            party_matching_chain.astream(
+                {
+                    "topic": state.topic,
+                    "deliberation_summary": deliberation_summary,
+                    "question": question,
+                }
+            ),
+            result_chunks,
+            on_first=lambda: timer.mark_once("matching_first_token"),
+        ),
+        end=False,
+    ):
+        yield event
+    party_matching_result = "".join(result_chunks)
+    timer.mark("matching")
+
+    yield phase_timings_event(timer.finish())
+    yield end_event()
 
-    update_conversation(
+    await update_conversation_async(
         conversation_id=state.id,
         stage=ConversationStage.END.value,
         extra={
@@ -106,6 +313,252 @@ def start_party_matching(state: ConversationState) -> Iterator[dict]:
     )
 
 
+register_stage_start(
+    ConversationStage.PARTY_MATCHING, start_party_matching, start_party_matching_async
+)
+
+
+def prefetch_party_matching(state: ConversationState) -> Future[None]:
+    """Open the wahl.chat connections and build the chains of the stage.
+
+    The prompts themselves depend on the deliberation summary and the party
+    answers, so they cannot be rendered ahead of time.
+    """
+    connecting = connection_pool.connect()
+    get_question_distillation_chain()
+    if PRE_ANALYSIS_ENABLED:
+        get_pre_analysis_chain()
+    if SEMANTIC_CACHE_ENABLED:
+        # Creates the embeddings client on first access
+        _ = semantic_cache.embedder
+    return connecting
+
+
+register_stage_prefetch(ConversationStage.PARTY_MATCHING, prefetch_party_matching)
+
+
+@cache
+def get_question_distillation_chain() -> Runnable:
+    return (
+        ChatPromptTemplate.from_template(get_distillation_prompt())
+        | get_chat_model(ConversationStage.PARTY_MATCHING.value)
+        | StrOutputParser()
+    )
+
+
+def query_parties(
+    topic: str, question: str, on_party: Callable[[PartyResponse], None]
+) -> Generator[dict, None, WahlChatResponse]:
+    """Query wahl.chat, handing every party answer to ``on_party`` as it lands.
+
+    Yields a ``party_response_ready`` event per party and returns the full
+    response. Near-identical questions on the same topic are answered from the
+    semantic cache if it is enabled.
+    """
+    vector = None
+    if SEMANTIC_CACHE_ENABLED:
+        vector = semantic_cache.embed(question)
+        cached = (
+            semantic_cache.lookup_vector(topic, vector) if vector is not None else None
+        )
+        if cached is not None:
+            for party_response in cached.party_responses:
+                on_party(party_response)
+                yield party_response_ready_event(party_response.party_id)
+            return cached
+
+    stream = PartyAnswerStream(question)
+    for party_response in stream:
+        on_party(party_response)
+        yield party_response_ready_event(party_response.party_id)
+    assert stream.response is not None
+
+    # Answers from the exact cache were indexed when they were fetched
+    if vector is not None and stream.fetched:
+        semantic_cache.add_vector(topic, vector, stream.response)
+    return stream.response
+
+
+async def aquery_parties(
+    topic: str, question: str
+) -> AsyncIterator[PartyResponse | WahlChatResponse]:
+    """Async counterpart of :func:`query_parties`.
+
+    Yields every ``PartyResponse`` as it lands, then the full response.
+    """
+    vector = None
+    if SEMANTIC_CACHE_ENABLED:
+        vector = await asyncio.to_thread(semantic_cache.embed, question)
+        cached = (
+            semantic_cache.lookup_vector(topic, vector) if vector is not None else None
+        )
+        if cached is not None:
+            for party_response in cached.party_responses:
+                yield party_response
+            yield cached
+            return
+
+    stream = AsyncPartyAnswerStream(question)
+    async for party_response in stream:
+        yield party_response
+    assert stream.response is not None
+
+    # Answers from the exact cache were indexed when they were fetched
+    if vector is not None and stream.fetched:
+        semantic_cache.add_vector(topic, vector, stream.response)
+    yield stream.response
+
+
+def get_pre_analysis_input(
+    party_response: PartyResponse, topic: str, deliberation_summary: str, question: str
+) -> dict[str, str]:
+    return {
+        "topic": topic,
+        "deliberation_summary": deliberation_summary,
+        "question": question,
+        "party_name": party_id_to_name(party_response.party_id),
+        "party_response": add_party_ids_to_references(
+            party_response.response, party_response.party_id
+        ),
+    }
+
+
+@cache
+def get_pre_analysis_chain() -> Runnable:
+    return (
+        ChatPromptTemplate.from_template(get_party_pre_analysis_prompt())
+        | get_chat_model(ConversationStage.PARTY_MATCHING.value)
+        | StrOutputParser()
+    )
+
+
+def pre_analyze_party_response(
+    party_response: PartyResponse, topic: str, deliberation_summary: str, question: str
+) -> str:
+    """Render the party's section of the matching prompt as soon as it arrives."""
+    pre_analysis = None
+    if PRE_ANALYSIS_ENABLED:
+        with llm_priority(Priority.BACKGROUND):
+            pre_analysis = get_pre_analysis_chain().invoke(
+                get_pre_analysis_input(
+                    party_response, topic, deliberation_summary, question
+                )
+            )
+    return get_party_response_section(party_response, pre_analysis)
+
+
+async def apre_analyze_party_response(
+    party_response: PartyResponse, topic: str, deliberation_summary: str, question: str
+) -> str:
+    pre_analysis = None
+    if PRE_ANALYSIS_ENABLED:
+        with llm_priority(Priority.BACKGROUND):
+            pre_analysis = await get_pre_analysis_chain().ainvoke(
+                get_pre_analysis_input(
+                    party_response, topic, deliberation_summary, question
+                )
+            )
+    return get_party_response_section(party_response, pre_analysis)
+
+
+def collect_party_sections(
+    party_responses: WahlChatResponse, sections: dict[str, Future[str]]
+) -> dict[str, str]:
+    """Wait for the pre-analyzed sections until ``PRE_ANALYSIS_TIMEOUT_SECONDS``."""
+    deadline = time.monotonic() + PRE_ANALYSIS_TIMEOUT_SECONDS
+    collected: dict[str, str] = {}
+    for party_response in party_responses.party_responses:
+        future = sections.get(party_response.party_id)
+        if future is None:
+            continue
+        try:
+            collected[party_response.party_id] = future.result(
+                timeout=max(0.0, deadline - time.monotonic())
+            )
+        except Exception:
+            collected[party_response.party_id] = _section_without_pre_analysis(
+                party_response
+            )
+    return collected
+
+
+async def acollect_party_sections(
+    party_responses: WahlChatResponse, sections: dict[str, asyncio.Task[str]]
+) -> dict[str, str]:
+    """Async counterpart of :func:`collect_party_sections`."""
+    if sections:
+        await asyncio.wait(sections.values(), timeout=PRE_ANALYSIS_TIMEOUT_SECONDS)
+    collected: dict[str, str] = {}
+    for party_response in party_responses.party_responses:
+        task = sections.get(party_response.party_id)
+        if task is None:
+            continue
+        if task.done() and not task.cancelled() and task.exception() is None:
+            collected[party_response.party_id] = task.result()
+        else:
+            collected[party_response.party_id] = _section_without_pre_analysis(
+                party_response
+            )
+    return collected
+
+
+def _section_without_pre_analysis(party_response: PartyResponse) -> str:
+    PRE_ANALYSIS_FALLBACKS.inc()
+    logger.warning(
+        "Pre-analysis of %s failed or timed out, matching without it",
+        party_response.party_id,
+    )
+    return get_party_response_section(party_response, None)
+
+
+def collect_chunks(
+    chunks: Iterable[str],
+    collected: list[str],
+    on_first: Callable[[], None] | None = None,
+) -> Iterator[str]:
+    """Pass non-empty text chunks through while keeping them for persistence."""
+    for chunk in chunks:
+        if chunk:
+            if not collected and on_first is not None:
+                on_first()
+            collected.append(chunk)
+            yield chunk
+
+
+async def acollect_chunks(
+    chunks: AsyncIterable[str],
+    collected: list[str],
+    on_first: Callable[[], None] | None = None,
+) -> AsyncIterator[str]:
+    async for chunk in chunks:
+        if chunk:
+            if not collected and on_first is not None:
+                on_first()
+            collected.append(chunk)
+            yield chunk
+
+
+def build_sources_payload(party_responses: WahlChatResponse) -> list[dict]:
+    """Build the per-party grouped sources payload for the frontend."""
+    return [
+        {
+            "party_id": party_response.party_id,
+            "sources": [
+                {
+                    "source": s.name,
+                    "page": s.page,
+                    "url": s.url or "",
+                    "document_publish_date": s.document_publish_date or "",
+                    "source_document": s.source_document or "",
+                }
+                for s in party_response.sources
+            ],
+        }
+        for party_response in party_responses.party_responses
+        if party_response.sources
+    ]
+
+
 def get_required_summaries(state: ConversationState) -> str:
     deliberation_summary = state.deliberation_summary
     if deliberation_summary is None:
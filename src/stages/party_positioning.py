@@ -1,170 +1,235 @@
-from typing import Iterator, Any
+from typing import AsyncIterator, Iterator
 from dotenv import load_dotenv
-from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+from langchain_core.messages import HumanMessage
 from langchain_core.runnables import Runnable
+from langchain_core.language_models import BaseChatModel
 from langchain_core.tools import tool
-from pydantic import SecretStr
+from langchain.tools import ToolRuntime
+from src.conversation.persistence import (
+    reset_stage_messages,
+    reset_stage_messages_async,
+)
 from src.conversation.conversation_state import (
     ConversationState,
     ConversationStage,
-    serialize_messages,
 )
-from src.events import EventType
-from src.stages.perspective_taking import start_perspective_taking
-from src.utils.messages import chunk_to_text
+from src.stages.agent_registry import (
+    AgentContext,
+    context_system_prompt,
+    get_agent,
+    register_agent,
+)
+from src.stages.prefetch import register_stage_prefetch, stage_prefetcher
+from src.stages.streaming import (
+    StageTurn,
+    astream_stage_turn,
+    register_stage_start,
+    stream_stage_turn,
+)
 from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
-from src.prompts import get_party_positioning_prompt
-import os
-
-from src.services.firestore_service import (
-    update_conversation,
-    get_party_positions_by_topic_id,
+from src.services.llm_clients import get_chat_model
+from src.prompts import (
+    get_party_positioning_instructions,
+    get_party_positioning_prompt,
+    render_party_positions,
 )
 
+from src.services.firestore_service import update_conversation
+from src.services.party_position_store import PartyPositionStore, TopicPositions
+from src.utils.telemetry import metrics
+
 load_dotenv()
 
 
-llm = ChatOpenAI(
-    model=os.getenv("OPENAI_MODEL") or "openai/gpt-5.1",
-    base_url=os.getenv("OPENAI_BASE_URL"),
-    api_key=SecretStr(os.getenv("OPENAI_API_KEY", "")),
-)
+START_PARTY_POSITIONING_AGENT = "start_party_positioning"
 
+TOPIC_IDS = {
+    "Migration": "migration_security_state",
+    "Wirtschaft": "economy_work_social",
+    "Umwelt und Klima": "energy_climate_environment",
+}
 
-def start_party_positioning(state: ConversationState) -> Iterator[dict]:
-    active_listening_summary = state.active_listening_summary
-    if active_listening_summary is None:
-        raise ValueError(
-            "User perspective summary is required to start the party positioning phase"
-        )
-    party_positions = get_party_positions(state.topic)
-    party_positioning_prompt = get_party_positioning_prompt(
-        topic=state.topic,
-        party_positions=party_positions,
-        active_listening_summary=active_listening_summary,
+party_position_store = PartyPositionStore(render=render_party_positions)
+metrics.register_stats("party_positions", party_position_store.stats)
+
+
+@tool
+def end_party_positioning(
+    user_desired_goal_and_methods: str, runtime: ToolRuntime[AgentContext]
+) -> str:
+    """This tool is used to end the party positioning phase, populate the parameters with the user's desired goals and method (approved by the user)to finish this conversation phase phase.
+    Formulate the summary in 3rd person form (the user...)"""
+    state = runtime.context.state
+    state.stage = ConversationStage.PERSPECTIVE_TAKING
+    state.party_positioning_summary = user_desired_goal_and_methods
+    update_conversation(
+        conversation_id=state.id,
+        stage=ConversationStage.PERSPECTIVE_TAKING.value,
+        extra={"party_positioning_summary": user_desired_goal_and_methods},
     )
+    return "Party positioning phase completed"
+
 
-    party_positioning_agent: Runnable = create_agent(
-        model=llm,
+def build_start_party_positioning_agent(model: BaseChatModel | None = None) -> Runnable:
+    return create_agent(
+        model=model or get_chat_model(ConversationStage.PARTY_POSITIONING.value),
         tools=[],
-        system_prompt=str(party_positioning_prompt.content),
+        middleware=[context_system_prompt],
+        context_schema=AgentContext,
     )
 
-    state.party_positioning_messages = []
-    update_conversation(
-        conversation_id=state.id,
-        extra={
-            "party_positioning_messages": serialize_messages(
-                state.party_positioning_messages
-            )
-        },
+
+def build_party_positioning_agent(model: BaseChatModel | None = None) -> Runnable:
+    return create_agent(
+        model=model or get_chat_model(ConversationStage.PARTY_POSITIONING.value),
+        tools=[end_party_positioning],
+        middleware=[context_system_prompt],
+        context_schema=AgentContext,
     )
-    return stream_response_and_update_state(state, party_positioning_agent)
+
+
+register_agent(START_PARTY_POSITIONING_AGENT, build_start_party_positioning_agent)
+register_agent(ConversationStage.PARTY_POSITIONING.value, build_party_positioning_agent)
+
+
+START_PARTY_POSITIONING_TURN = StageTurn(
+    stage=ConversationStage.PARTY_POSITIONING,
+    agent_name=START_PARTY_POSITIONING_AGENT,
+    messages_field="party_positioning_messages",
+)
+PARTY_POSITIONING_TURN = StageTurn(
+    stage=ConversationStage.PARTY_POSITIONING,
+    agent_name=ConversationStage.PARTY_POSITIONING.value,
+    messages_field="party_positioning_messages",
+    next_stage=ConversationStage.PERSPECTIVE_TAKING,
+)
+
+
+def start_party_positioning(state: ConversationState) -> Iterator[dict]:
+    topic_positions = stage_prefetcher.take(
+        state.id, ConversationStage.PARTY_POSITIONING
+    ) or get_topic_positions(state.topic)
+    context = AgentContext(
+        state=state,
+        system_prompt=render_party_positioning_system_prompt(
+            state, topic_positions.prompt_block
+        ),
+    )
+
+    reset_stage_messages(state, "party_positioning_messages")
+    return stream_stage_turn(START_PARTY_POSITIONING_TURN, state, context)
 
 
 def party_positioning(state: ConversationState, user_message: str) -> Iterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_party_positioning_system_prompt(state)
+    )
+
+    state.party_positioning_messages.append(HumanMessage(content=user_message))
+
+    return stream_stage_turn(PARTY_POSITIONING_TURN, state, context)
+
+
+async def start_party_positioning_async(
+    state: ConversationState,
+) -> AsyncIterator[dict]:
+    topic_positions = await stage_prefetcher.take_async(
+        state.id, ConversationStage.PARTY_POSITIONING
+    ) or await get_topic_positions_async(state.topic)
+    context = AgentContext(
+        state=state,
+        system_prompt=render_party_positioning_system_prompt(
+            state, topic_positions.prompt_block
+        ),
+    )
+
+    await reset_stage_messages_async(state, "party_positioning_messages")
+    async for event in astream_stage_turn(START_PARTY_POSITIONING_TURN, state, context):
+        yield event
+
+
+async def party_positioning_async(
+    state: ConversationState, user_message: str
+) -> AsyncIterator[dict]:
+    context = AgentContext(
+        state=state,
+        system_prompt=await build_party_positioning_system_prompt_async(state),
+    )
+
+    state.party_positioning_messages.append(HumanMessage(content=user_message))
+
+    async for event in astream_stage_turn(PARTY_POSITIONING_TURN, state, context):
+        yield event
+
+
+register_stage_start(
+    ConversationStage.PARTY_POSITIONING,
+    start_party_positioning,
+    start_party_positioning_async,
+)
+
+
+def prefetch_party_positioning(state: ConversationState) -> TopicPositions:
+    """Load the topic's positions and render the prompt up to the summary."""
+    topic_positions = get_topic_positions(state.topic)
+    get_party_positioning_instructions(state.topic, topic_positions.prompt_block)
+    get_agent(START_PARTY_POSITIONING_AGENT)
+    return topic_positions
+
+
+register_stage_prefetch(ConversationStage.PARTY_POSITIONING, prefetch_party_positioning)
+
+
+def build_party_positioning_system_prompt(state: ConversationState) -> str:
+    return render_party_positioning_system_prompt(
+        state, get_topic_positions(state.topic).prompt_block
+    )
+
+
+async def build_party_positioning_system_prompt_async(
+    state: ConversationState,
+) -> str:
+    topic_positions = await get_topic_positions_async(state.topic)
+    return render_party_positioning_system_prompt(state, topic_positions.prompt_block)
+
+
+def render_party_positioning_system_prompt(
+    state: ConversationState, party_positions_block: str
+) -> str:
     active_listening_summary = state.active_listening_summary
     if active_listening_summary is None:
         raise ValueError(
             "User perspective summary is required to start the party positioning phase"
         )
-    party_positions = get_party_positions(state.topic)
     party_positioning_prompt = get_party_positioning_prompt(
         topic=state.topic,
-        party_positions=party_positions,
+        party_positions_block=party_positions_block,
         active_listening_summary=active_listening_summary,
     )
+    return str(party_positioning_prompt.content)
 
-    state.party_positioning_messages.append(HumanMessage(content=user_message))
-
-    @tool
-    def end_party_positioning(user_desired_goal_and_methods: str) -> str:
-        """This tool is used to end the party positioning phase, populate the parameters with the user's desired goals and method (approved by the user)to finish this conversation phase phase.
-        Formulate the summary in 3rd person form (the user...)"""
-        state.stage = ConversationStage.PERSPECTIVE_TAKING
-        state.party_positioning_summary = user_desired_goal_and_methods
-        update_conversation(
-            conversation_id=state.id,
-            stage=ConversationStage.PERSPECTIVE_TAKING.value,
-            extra={"party_positioning_summary": user_desired_goal_and_methods},
-        )
-        return "Party positioning phase completed"
 
-    party_positioning_agent: Runnable = create_agent(
-        model=llm,
-        tools=[end_party_positioning],
-        system_prompt=str(party_positioning_prompt.content),
-    )
-
-    return stream_response_and_update_state(state, party_positioning_agent)
+def get_topic_positions(topic: str) -> TopicPositions:
+    topic_positions = party_position_store.get(get_topic_id(topic))
+    if topic_positions is None:
+        raise ValueError(f"No party positions found for topic {topic}")
+    return topic_positions
 
 
-def get_party_positions(topic: str) -> list[tuple[str, dict[str, Any]]]:
-    topic_id = get_topic_id(topic)
-    party_positions = get_party_positions_by_topic_id(topic_id)
-    if party_positions is None:
+async def get_topic_positions_async(topic: str) -> TopicPositions:
+    topic_positions = await party_position_store.get_async(get_topic_id(topic))
+    if topic_positions is None:
         raise ValueError(f"No party positions found for topic {topic}")
-    return party_positions
+    return topic_positions
 
 
-def get_topic_id(topic: str) -> str:
-    if topic == "Migration":
-        return "migration_security_state"
-    elif topic == "Wirtschaft":
-        return "economy_work_social"
-    elif topic == "Umwelt und Klima":
-        return "energy_climate_environment"
-    else:
-        raise ValueError(f"Invalid topic: {topic}")
-
-
-def stream_response_and_update_state(
-    state: ConversationState, agent: Runnable
-) -> Iterator[dict]:
-    assistant_message_text = ""
-    tool_called = False
-    stream_open = False
-
-    for chunk, metadata in agent.stream(
-        {"messages": state.party_positioning_messages}, stream_mode="messages"
-    ):
-        chunk_type = getattr(chunk, "type", None)
-        if isinstance(chunk, BaseMessage):
-            chunk_type = chunk.type
-
-        if chunk_type == "tool":
-            tool_called = True
-            break
-
-        chunk_text = chunk_to_text(chunk)
-        if chunk_text:
-            if not stream_open:
-                yield {"type": EventType.MESSAGE_START.value}
-                stream_open = True
-            assistant_message_text += chunk_text
-            yield {
-                "type": EventType.MESSAGE_CHUNK.value,
-                "content": chunk_text,
-            }
-
-    if assistant_message_text and not tool_called:
-        state.party_positioning_messages.append(
-            AIMessage(content=assistant_message_text)
-        )
+def preload_party_positions() -> None:
+    """Load every topic at startup and keep it live via snapshot listeners."""
+    party_position_store.preload(TOPIC_IDS.values(), watch=True)
 
-    if stream_open and not tool_called:
-        yield {"type": EventType.MESSAGE_END.value}
 
-    update_conversation(
-        conversation_id=state.id,
-        extra={
-            "party_positioning_messages": serialize_messages(
-                state.party_positioning_messages
-            )
-        },
-    )
-
-    if tool_called:
-        print("Starting perspective taking phase")
-        yield from start_perspective_taking(state)
+def get_topic_id(topic: str) -> str:
+    try:
+        return TOPIC_IDS[topic]
+    except KeyError:
+        raise ValueError(f"Invalid topic: {topic}") from None
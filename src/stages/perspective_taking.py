@@ -1,100 +1,254 @@
+import contextvars
+import json
+import logging
 import os
-from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from typing import AsyncIterator, Iterator
 
 from langchain.agents import create_agent
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.messages import HumanMessage
+from langchain_core.language_models import BaseChatModel
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
+from langchain.tools import ToolRuntime
+from src.services.llm_clients import get_chat_model
+from src.services.llm_scheduler import Priority, llm_priority
 from langgraph.graph.state import Runnable
-from pydantic import SecretStr
 
 from dotenv import load_dotenv
 
+from src.conversation.persistence import (
+    reset_stage_messages,
+    reset_stage_messages_async,
+)
 from src.conversation.conversation_state import (
     ConversationStage,
     ConversationState,
-    serialize_messages,
 )
-from src.events import EventType
 from src.prompts import get_perspective_taking_prompt
-from src.stages.deliberation import start_deliberation
-from src.utils.messages import chunk_to_text
-from src.services.firestore_service import update_conversation
+from src.stages.agent_registry import (
+    AgentContext,
+    context_system_prompt,
+    register_agent,
+)
+from src.stages.streaming import (
+    StageTurn,
+    astream_stage_turn,
+    register_stage_start,
+    stream_stage_turn,
+)
+from src.services.firestore_service import (
+    update_conversation,
+)
+from src.services.tool_cache import ToolResultCache
+from src.utils.telemetry import metrics, span
 
 load_dotenv()
 
-llm = ChatOpenAI(
-    model=os.getenv("OPENAI_MODEL") or "openai/gpt-5.1",
-    base_url=os.getenv("OPENAI_BASE_URL"),
-    api_key=SecretStr(os.getenv("OPENAI_API_KEY", "")),
+logger = logging.getLogger(__name__)
+
+PERPLEXITY_PREWARM_PATH = os.getenv("PERPLEXITY_PREWARM_PATH")
+
+perplexity_cache = ToolResultCache(
+    "perplexity_search",
+    max_entries=int(os.getenv("PERPLEXITY_CACHE_MAX_ENTRIES", "2048")),
+    ttl_seconds=float(os.getenv("PERPLEXITY_CACHE_TTL_SECONDS", "86400")),
+)
+
+
+PERPLEXITY_SEARCH_TIMEOUT_SECONDS = float(
+    os.getenv("PERPLEXITY_SEARCH_TIMEOUT_SECONDS", "12")
+)
+PERPLEXITY_SEARCH_FALLBACK = (
+    "The search did not finish in time. Continue without external facts and "
+    "do not state figures or facts you cannot support."
+)
+PERPLEXITY_SEARCH_TIMEOUTS = metrics.counter(
+    "perplexity_search_timeouts_total",
+    "Perplexity searches answered with the fallback after the deadline.",
 )
 
-perplexity_client = ChatOpenAI(
-    model="perplexity/sonar-pro",
-    base_url=os.getenv("OPENAI_BASE_URL"),
-    api_key=SecretStr(os.getenv("OPENAI_API_KEY", "")),
+# Searches run here so a slow one is abandoned at the deadline instead of
+# holding the request thread; it still finishes in the background and fills
+# the cache for the next caller.
+perplexity_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PERPLEXITY_MAX_CONCURRENCY", "8")),
+    thread_name_prefix="perplexity",
 )
 
+TOOL_PROGRESS_MESSAGES = {"perplexity_search": "Fakten werden recherchiert"}
+
 
 @tool
 def perplexity_search(query: str) -> str:
     """Search the Internet for the query using Perplexity search."""
-    response = perplexity_client.invoke([HumanMessage(content=query)])
+    # A cached result must not queue behind running searches
+    cached = perplexity_cache.get(query)
+    if cached is not None:
+        return cached
+    # Copied so that the search keeps the turn's priority, log context and span
+    future = perplexity_executor.submit(
+        contextvars.copy_context().run,
+        perplexity_cache.get_or_compute,
+        query,
+        search_perplexity,
+    )
+    try:
+        return future.result(timeout=PERPLEXITY_SEARCH_TIMEOUT_SECONDS)
+    except FuturesTimeoutError:
+        PERPLEXITY_SEARCH_TIMEOUTS.inc()
+        logger.warning(
+            "Perplexity search timed out after %ss", PERPLEXITY_SEARCH_TIMEOUT_SECONDS
+        )
+        return PERPLEXITY_SEARCH_FALLBACK
+
+
+def search_perplexity(query: str) -> str:
+    perplexity_client = get_chat_model("perplexity_search", stream_usage=False)
+    with span("perplexity.search"):
+        response = perplexity_client.invoke([HumanMessage(content=query)])
     return str(response.content)
 
 
-def start_perspective_taking(state: ConversationState) -> Iterator[dict]:
-    active_listening_summary, party_positioning_summary = get_required_summaries(state)
+def prewarm_perplexity_search(path: str) -> None:
+    """Fill the search cache in the background from a JSON file.
 
-    perspective_taking_prompt = get_perspective_taking_prompt(
-        topic=state.topic,
-        active_listening_summary=active_listening_summary,
-        party_positioning_summary=party_positioning_summary,
+    The file maps each topic to the queries that are commonly searched for it,
+    e.g. ``{"Migration": ["Wie lange dauern Asylverfahren in Deutschland?"]}``.
+    """
+    with open(path, encoding="utf-8") as file:
+        queries_by_topic: dict[str, list[str]] = json.load(file)
+    perplexity_cache.prewarm(
+        (query for queries in queries_by_topic.values() for query in queries),
+        _prewarm_search,
     )
 
-    perspective_taking_agent: Runnable = create_agent(
-        model=llm,
+
+def _prewarm_search(query: str) -> str:
+    # Prewarming must not hold back the searches of live conversations
+    with llm_priority(Priority.BACKGROUND):
+        return search_perplexity(query)
+
+
+START_PERSPECTIVE_TAKING_AGENT = "start_perspective_taking"
+
+
+@tool
+def end_perspective_taking(
+    perspective_taking_summary: str, runtime: ToolRuntime[AgentContext]
+) -> str:
+    """This tool is used to end the perspective taking phase, populate the parameters with the user's thoughts and feelings on the the situation
+    proposed by the perspective taking exercise (approved by the user) to finish this conversation phase. Don't include user information already provided in the previous summaries.
+    Formulate the user's goals in 3rd person form (the user...)"""
+    return end_perspective_taking_callback(
+        perspective_taking_summary, runtime.context.state
+    )
+
+
+def build_start_perspective_taking_agent(
+    model: BaseChatModel | None = None,
+) -> Runnable:
+    return create_agent(
+        model=model or get_chat_model(ConversationStage.PERSPECTIVE_TAKING.value),
         tools=[perplexity_search],
-        system_prompt=str(perspective_taking_prompt),
+        middleware=[context_system_prompt],
+        context_schema=AgentContext,
     )
 
-    state.perspective_taking_messages = []
-    update_conversation(
-        conversation_id=state.id,
-        extra={
-            "perspective_taking_messages": serialize_messages(
-                state.perspective_taking_messages
-            )
-        },
+
+def build_perspective_taking_agent(model: BaseChatModel | None = None) -> Runnable:
+    return create_agent(
+        model=model or get_chat_model(ConversationStage.PERSPECTIVE_TAKING.value),
+        tools=[perplexity_search, end_perspective_taking],
+        middleware=[context_system_prompt],
+        context_schema=AgentContext,
+    )
+
+
+register_agent(START_PERSPECTIVE_TAKING_AGENT, build_start_perspective_taking_agent)
+register_agent(
+    ConversationStage.PERSPECTIVE_TAKING.value, build_perspective_taking_agent
+)
+
+
+START_PERSPECTIVE_TAKING_TURN = StageTurn(
+    stage=ConversationStage.PERSPECTIVE_TAKING,
+    agent_name=START_PERSPECTIVE_TAKING_AGENT,
+    messages_field="perspective_taking_messages",
+    end_tool_names=frozenset({"end_perspective_taking"}),
+    tool_progress_messages=TOOL_PROGRESS_MESSAGES,
+)
+PERSPECTIVE_TAKING_TURN = StageTurn(
+    stage=ConversationStage.PERSPECTIVE_TAKING,
+    agent_name=ConversationStage.PERSPECTIVE_TAKING.value,
+    messages_field="perspective_taking_messages",
+    end_tool_names=frozenset({"end_perspective_taking"}),
+    next_stage=ConversationStage.DELIBERATION,
+    tool_progress_messages=TOOL_PROGRESS_MESSAGES,
+)
+
+
+def start_perspective_taking(state: ConversationState) -> Iterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_perspective_taking_system_prompt(state)
     )
-    return stream_response_and_update_state(state, perspective_taking_agent)
+
+    reset_stage_messages(state, "perspective_taking_messages")
+    return stream_stage_turn(START_PERSPECTIVE_TAKING_TURN, state, context)
 
 
 def perspective_taking(state: ConversationState, user_message: str) -> Iterator[dict]:
-    active_listening_summary, party_positioning_summary = get_required_summaries(state)
+    context = AgentContext(
+        state=state, system_prompt=build_perspective_taking_system_prompt(state)
+    )
 
-    perspective_taking_prompt = get_perspective_taking_prompt(
-        topic=state.topic,
-        active_listening_summary=active_listening_summary,
-        party_positioning_summary=party_positioning_summary,
+    state.perspective_taking_messages.append(HumanMessage(content=user_message))
+
+    return stream_stage_turn(PERSPECTIVE_TAKING_TURN, state, context)
+
+
+async def start_perspective_taking_async(
+    state: ConversationState,
+) -> AsyncIterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_perspective_taking_system_prompt(state)
     )
 
-    @tool
-    def end_perspective_taking(perspective_taking_summary: str) -> str:
-        """This tool is used to end the perspective taking phase, populate the parameters with the user's thoughts and feelings on the the situation
-        proposed by the perspective taking exercise (approved by the user) to finish this conversation phase. Don't include user information already provided in the previous summaries.
-        Formulate the user's goals in 3rd person form (the user...)"""
-        return end_perspective_taking_callback(perspective_taking_summary, state)
+    await reset_stage_messages_async(state, "perspective_taking_messages")
+    async for event in astream_stage_turn(
+        START_PERSPECTIVE_TAKING_TURN, state, context
+    ):
+        yield event
 
-    perspective_taking_agent: Runnable = create_agent(
-        model=llm,
-        tools=[perplexity_search, end_perspective_taking],
-        system_prompt=str(perspective_taking_prompt),
+
+async def perspective_taking_async(
+    state: ConversationState, user_message: str
+) -> AsyncIterator[dict]:
+    context = AgentContext(
+        state=state, system_prompt=build_perspective_taking_system_prompt(state)
     )
 
     state.perspective_taking_messages.append(HumanMessage(content=user_message))
 
-    return stream_response_and_update_state(state, perspective_taking_agent)
+    async for event in astream_stage_turn(PERSPECTIVE_TAKING_TURN, state, context):
+        yield event
+
+
+register_stage_start(
+    ConversationStage.PERSPECTIVE_TAKING,
+    start_perspective_taking,
+    start_perspective_taking_async,
+)
+
+
+def build_perspective_taking_system_prompt(state: ConversationState) -> str:
+    active_listening_summary, party_positioning_summary = get_required_summaries(state)
+
+    return get_perspective_taking_prompt(
+        topic=state.topic,
+        active_listening_summary=active_listening_summary,
+        party_positioning_summary=party_positioning_summary,
+    )
 
 
 def end_perspective_taking_callback(
@@ -126,54 +280,3 @@ def get_required_summaries(state: ConversationState) -> tuple[str, str]:
         )
 
     return active_listening_summary, party_positioning_summary
-
-
-def stream_response_and_update_state(state: ConversationState, agent: Runnable):
-    assistant_message_text = ""
-    end_tool_called = False
-    stream_open = False
-
-    for chunk, metadata in agent.stream(
-        {"messages": state.perspective_taking_messages}, stream_mode="messages"
-    ):
-        chunk_type = getattr(chunk, "type", None)
-        if isinstance(chunk, BaseMessage):
-            chunk_type = chunk.type
-
-        if chunk_type == "tool":
-            tool_name = getattr(chunk, "name", None)
-            if tool_name == "end_perspective_taking":
-                end_tool_called = True
-                break
-
-        chunk_text = chunk_to_text(chunk)
-        if chunk_text:
-            if not stream_open:
-                yield {"type": EventType.MESSAGE_START.value}
-                stream_open = True
-            assistant_message_text += chunk_text
-            yield {
-                "type": EventType.MESSAGE_CHUNK.value,
-                "content": chunk_text,
-            }
-
-    if assistant_message_text and not end_tool_called:
-        state.perspective_taking_messages.append(
-            AIMessage(content=assistant_message_text)
-        )
-
-    if stream_open and not end_tool_called:
-        yield {"type": EventType.MESSAGE_END.value}
-
-    update_conversation(
-        conversation_id=state.id,
-        extra={
-            f"{state.stage.value}_messages": serialize_messages(
-                state.perspective_taking_messages
-            )
-        },
-    )
-
-    if end_tool_called:
-        print("Starting deliberation phase")
-        yield from start_deliberation(state)
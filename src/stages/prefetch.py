@@ -0,0 +1,204 @@
+"""Speculative preparation of the next stage while the current one runs.
+
+A stage transition runs the start of the next stage inside the turn that
+ended the previous one, so whatever that start loads adds to the slowest
+turn of the conversation. A stage can register a prefetch for its start with
+:func:`register_stage_prefetch`. From the ``STAGE_PREFETCH_AFTER_MESSAGES``-th
+user message of the previous stage on, typically while the user confirms its
+summary, the prefetch runs in the background and its result is kept for the
+conversation.
+
+The start of the next stage claims the result with
+:meth:`StagePrefetcher.take`, waiting for it if it is still running. Results
+that are not claimed within ``STAGE_PREFETCH_TTL_SECONDS``, because the stage
+did not end, are dropped; a prefetch that failed is only counted, and the
+start loads its inputs as it would without one. Prefetches only read
+``state``, so they must not depend on the summary the stage ends with.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from src.conversation.conversation_state import ConversationStage, ConversationState
+from src.utils.telemetry import metrics
+
+load_dotenv()
+
+# 0 disables prefetching
+STAGE_PREFETCH_AFTER_MESSAGES = int(os.getenv("STAGE_PREFETCH_AFTER_MESSAGES", "2"))
+STAGE_PREFETCH_TTL_SECONDS = float(os.getenv("STAGE_PREFETCH_TTL_SECONDS", "900"))
+STAGE_PREFETCH_MAX_PENDING = 1024
+
+logger = logging.getLogger(__name__)
+
+StagePrefetch = Callable[[ConversationState], Any]
+
+_stage_prefetches: dict[ConversationStage, StagePrefetch] = {}
+
+STAGE_PREFETCHES = metrics.counter(
+    "stage_prefetches_total",
+    "Speculative stage prefetches by what became of their result.",
+    ("stage", "outcome"),
+)
+
+prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
+def register_stage_prefetch(stage: ConversationStage, prefetch: StagePrefetch) -> None:
+    """Register what to prepare for the start of ``stage`` ahead of time."""
+    _stage_prefetches[stage] = prefetch
+
+
+class StagePrefetcher:
+    def __init__(
+        self,
+        *,
+        after_messages: int = STAGE_PREFETCH_AFTER_MESSAGES,
+        ttl_seconds: float = STAGE_PREFETCH_TTL_SECONDS,
+        max_pending: int = STAGE_PREFETCH_MAX_PENDING,
+    ) -> None:
+        self.after_messages = after_messages
+        self.ttl_seconds = ttl_seconds
+        self.max_pending = max_pending
+
+        # (conversation id, stage) -> (started at, result)
+        self._pending: dict[tuple[str, ConversationStage], tuple[float, Future]] = {}
+        self._lock = threading.Lock()
+
+        self.started = 0
+        self.used = 0
+        self.discarded = 0
+        self.failed = 0
+
+    def maybe_prefetch(
+        self,
+        state: ConversationState,
+        next_stage: ConversationStage,
+        messages: list[BaseMessage],
+    ) -> None:
+        """Prefetch ``next_stage`` once the current stage has enough user messages."""
+        prefetch = _stage_prefetches.get(next_stage)
+        if prefetch is None or self.after_messages <= 0:
+            return
+        user_messages = sum(isinstance(message, HumanMessage) for message in messages)
+        if user_messages < self.after_messages:
+            return
+
+        key = (state.id, next_stage)
+        with self._lock:
+            self._discard_expired(time.monotonic())
+            if key in self._pending:
+                return
+            if len(self._pending) >= self.max_pending:
+                self._discard(next(iter(self._pending)))
+            # Copied so that the prefetch logs with the conversation's context
+            future = prefetch_executor.submit(
+                contextvars.copy_context().run, prefetch, state
+            )
+            self._pending[key] = (time.monotonic(), future)
+            self.started += 1
+        future.add_done_callback(lambda done: self._on_done(next_stage, done))
+
+    def take(self, conversation_id: str, stage: ConversationStage) -> Any | None:
+        """Return the prefetched result for ``stage``, or ``None`` if there is none."""
+        future = self._claim(conversation_id, stage)
+        if future is None:
+            return None
+        try:
+            result = future.result()
+        except Exception:
+            return None
+        self._record_used(stage)
+        return result
+
+    async def take_async(
+        self, conversation_id: str, stage: ConversationStage
+    ) -> Any | None:
+        """Async variant of :meth:`take` that does not block the loop."""
+        future = self._claim(conversation_id, stage)
+        if future is None:
+            return None
+        try:
+            result = await asyncio.wrap_future(future)
+        except Exception:
+            return None
+        self._record_used(stage)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "started": self.started,
+                "used": self.used,
+                "discarded": self.discarded,
+                "failed": self.failed,
+            }
+
+    def _claim(self, conversation_id: str, stage: ConversationStage) -> Future | None:
+        with self._lock:
+            entry = self._pending.pop((conversation_id, stage), None)
+            if entry is None:
+                return None
+            started_at, future = entry
+            if time.monotonic() - started_at > self.ttl_seconds:
+                future.cancel()
+                self.discarded += 1
+                STAGE_PREFETCHES.inc(stage=stage.value, outcome="discarded")
+                return None
+        return future
+
+    def _record_used(self, stage: ConversationStage) -> None:
+        with self._lock:
+            self.used += 1
+        STAGE_PREFETCHES.inc(stage=stage.value, outcome="used")
+
+    def _discard_expired(self, now: float) -> None:
+        expired = [
+            key
+            for key, (started_at, _future) in self._pending.items()
+            if now - started_at > self.ttl_seconds
+        ]
+        for key in expired:
+            self._discard(key)
+
+    def _discard(self, key: tuple[str, ConversationStage]) -> None:
+        _started_at, future = self._pending.pop(key)
+        # Only stops a prefetch that has not started; a running one finishes
+        future.cancel()
+        self.discarded += 1
+        STAGE_PREFETCHES.inc(stage=key[1].value, outcome="discarded")
+
+    def _on_done(self, stage: ConversationStage, future: Future) -> None:
+        if future.cancelled() or future.exception() is None:
+            return
+        with self._lock:
+            self.failed += 1
+        STAGE_PREFETCHES.inc(stage=stage.value, outcome="failed")
+        logger.warning(
+            "Prefetch for %s stage failed",
+            stage.value,
+            exc_info=future.exception(),
+        )
+
+
+stage_prefetcher = StagePrefetcher()
+metrics.register_stats("stage_prefetch", stage_prefetcher.stats)
+
+
+__all__ = [
+    "StagePrefetcher",
+    "stage_prefetcher",
+    "register_stage_prefetch",
+]
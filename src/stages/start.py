@@ -4,10 +4,13 @@ from src.conversation.conversation_state import (
     serialize_messages,
 )
 from src.prompts import get_initial_message
-from src.utils.events import stream_single_message
+from src.utils.events import astream_single_message, stream_single_message
 from langchain_core.messages import AIMessage
-from src.services.firestore_service import update_conversation
-from typing import Iterator
+from src.services.firestore_service import (
+    update_conversation,
+    update_conversation_async,
+)
+from typing import AsyncIterator, Iterator
 
 
 def start(state: ConversationState, user_message: str) -> Iterator[dict]:
@@ -25,4 +28,28 @@ def start(state: ConversationState, user_message: str) -> Iterator[dict]:
         },
     )
 
+    state.mark_messages_persisted("active_listening_messages")
+
     return stream_single_message(str(initial_message.content))
+
+
+async def start_async(
+    state: ConversationState, user_message: str
+) -> AsyncIterator[dict]:
+    initial_message: AIMessage = get_initial_message(state.topic)
+    state.active_listening_messages.append(initial_message)
+    state.stage = ConversationStage.ACTIVE_LISTENING
+
+    await update_conversation_async(
+        conversation_id=state.id,
+        stage=ConversationStage.ACTIVE_LISTENING.value,
+        extra={
+            "active_listening_messages": serialize_messages(
+                state.active_listening_messages
+            )
+        },
+    )
+    state.mark_messages_persisted("active_listening_messages")
+
+    async for event in astream_single_message(str(initial_message.content)):
+        yield event
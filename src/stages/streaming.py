@@ -0,0 +1,390 @@
+"""Streaming of stage agent turns to the client.
+
+Every conversation stage streams its agent the same way: text chunks become
+``message_chunk`` events, the reply is stored in the stage transcript, and
+calling one of the stage's end tools hands the conversation over to the next
+stage. A stage describes its turn as a :class:`StageTurn`; the next stage is
+named there and resolved through :func:`register_stage_start`, so stages do
+not import each other. Late in a stage, its turns also start the prefetch of
+the next stage (see :mod:`src.stages.prefetch`).
+
+Text chunks are kept in a list and joined once at the end of the turn. Chunks
+shorter than ``STREAM_MIN_CHUNK_CHARS`` are merged into fewer frames. Every
+turn records its time to first token, output tokens per second and total
+duration, collected by :data:`stream_stats` and the ``/metrics`` histograms,
+and is traced as a ``stage.turn`` span with a ``tool.call`` span per tool.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Collection, Iterator, Mapping
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from src.conversation.conversation_state import ConversationStage, ConversationState
+from src.conversation.persistence import (
+    persist_new_messages,
+    persist_new_messages_async,
+)
+from src.events import EventType
+from src.stages.agent_registry import AgentContext, get_agent
+from src.stages.prefetch import stage_prefetcher
+from src.utils.events import progress_event, started_tool_calls
+from src.utils.messages import chunk_to_text
+from src.utils.prompt_cache import prompt_cache_stats
+from src.utils.structured_logging import bind_log_context
+from src.utils.telemetry import metrics, record_span, span
+
+load_dotenv()
+
+STREAM_MIN_CHUNK_CHARS = int(os.getenv("STREAM_MIN_CHUNK_CHARS", "0"))
+
+logger = logging.getLogger(__name__)
+
+StageStart = Callable[[ConversationState], Iterator[dict]]
+AsyncStageStart = Callable[[ConversationState], AsyncIterator[dict]]
+
+_stage_starts: dict[ConversationStage, tuple[StageStart, AsyncStageStart]] = {}
+
+LLM_TIME_TO_FIRST_TOKEN = metrics.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from the start of a turn to its first text token.",
+    ("agent",),
+)
+STREAM_DURATION = metrics.histogram(
+    "stream_duration_seconds", "Duration of a streamed agent turn.", ("agent",)
+)
+LLM_OUTPUT_TOKENS = metrics.counter(
+    "llm_output_tokens_total", "Output tokens reported by the model.", ("agent",)
+)
+TOOL_CALLS = metrics.counter(
+    "tool_calls_total", "Tool calls made by the stage agents.", ("stage", "tool")
+)
+
+
+@dataclass(frozen=True)
+class StageTurn:
+    """How one agent of a stage is streamed.
+
+    ``end_tool_names`` lists the tools that end the stage; ``None`` means any
+    tool does. Results of other tools stay between the agent and the model.
+    When the stage ends, the turn continues with the start of ``next_stage``.
+    """
+
+    stage: ConversationStage
+    agent_name: str
+    messages_field: str
+    end_tool_names: Collection[str] | None = None
+    next_stage: ConversationStage | None = None
+    tool_progress_messages: Mapping[str, str] = field(default_factory=dict)
+
+
+def register_stage_start(
+    stage: ConversationStage, start: StageStart, start_async: AsyncStageStart
+) -> None:
+    """Register how ``stage`` is entered when the previous stage ends."""
+    _stage_starts[stage] = (start, start_async)
+
+
+def _stage_start(stage: ConversationStage) -> tuple[StageStart, AsyncStageStart]:
+    try:
+        return _stage_starts[stage]
+    except KeyError:
+        raise KeyError(f"No start registered for stage '{stage.value}'") from None
+
+
+class _TurnStream:
+    """Turns the streamed agent messages of one turn into client events.
+
+    Used as a context manager, so the turn is recorded and its span ended
+    also when the client goes away or the agent fails mid-turn.
+    """
+
+    def __init__(self, turn: StageTurn, min_chunk_chars: int) -> None:
+        self.turn = turn
+        self.min_chunk_chars = min_chunk_chars
+        self.stage_ended = False
+
+        self._parts: list[str] = []
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._stream_open = False
+        self._output_tokens: int | None = None
+        self._started = time.perf_counter()
+        self._first_token_at: float | None = None
+        self._tool_started_ns: dict[str, int] = {}
+        self._span = span("stage.turn", stage=turn.stage.value, agent=turn.agent_name)
+        self._closed = False
+
+    def __enter__(self) -> _TurnStream:
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self._span.record_exception(exc)
+        self.close()
+
+    def feed(self, chunk: object) -> list[dict]:
+        """Return the events for ``chunk``; sets ``stage_ended`` on an end tool."""
+        prompt_cache_stats.record(self.turn.stage.value, chunk)
+        self._count_output_tokens(chunk)
+
+        events: list[dict] = []
+        for tool_name in started_tool_calls(chunk):
+            self._tool_started_ns.setdefault(tool_name, time.time_ns())
+            message = self.turn.tool_progress_messages.get(tool_name)
+            if message is not None:
+                events.extend(self._flush())
+                events.append(progress_event(message))
+
+        if isinstance(chunk, ToolMessage):
+            self._record_tool_call(chunk.name)
+            end_tool_names = self.turn.end_tool_names
+            if end_tool_names is None or chunk.name in end_tool_names:
+                self.stage_ended = True
+            return events
+
+        chunk_text = chunk_to_text(chunk)
+        if not chunk_text:
+            return events
+
+        if self._first_token_at is None:
+            self._first_token_at = time.perf_counter()
+        self._parts.append(chunk_text)
+        self._pending.append(chunk_text)
+        self._pending_chars += len(chunk_text)
+        if self._pending_chars >= self.min_chunk_chars:
+            events.extend(self._flush())
+        return events
+
+    def finish(self, messages: list[BaseMessage]) -> list[dict]:
+        """Store the reply in ``messages`` and return the closing events."""
+        events = self._flush()
+        if not self.stage_ended:
+            if self._parts:
+                messages.append(AIMessage(content="".join(self._parts)))
+            if self._stream_open:
+                events.append({"type": EventType.MESSAGE_END.value})
+        self.close()
+        return events
+
+    def close(self) -> None:
+        """Record the turn and end its span; later calls do nothing."""
+        if self._closed:
+            return
+        self._closed = True
+        stream_stats.record(
+            self.turn.agent_name,
+            started=self._started,
+            first_token_at=self._first_token_at,
+            output_tokens=self._output_tokens or len(self._parts),
+        )
+        self._span.set_attribute("stage_ended", self.stage_ended)
+        if self._output_tokens is not None:
+            self._span.set_attribute("output_tokens", self._output_tokens)
+        self._span.end()
+
+    def _flush(self) -> list[dict]:
+        if not self._pending:
+            return []
+        events: list[dict] = []
+        if not self._stream_open:
+            events.append({"type": EventType.MESSAGE_START.value})
+            self._stream_open = True
+        events.append(
+            {"type": EventType.MESSAGE_CHUNK.value, "content": "".join(self._pending)}
+        )
+        self._pending.clear()
+        self._pending_chars = 0
+        return events
+
+    def _count_output_tokens(self, chunk: object) -> None:
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage and usage.get("output_tokens"):
+            output_tokens = usage["output_tokens"]
+        else:
+            # OpenAI-compatible providers that bypass the normalized usage
+            response_metadata = getattr(chunk, "response_metadata", None) or {}
+            token_usage = response_metadata.get("token_usage") or {}
+            output_tokens = token_usage.get("completion_tokens")
+            if not output_tokens:
+                return
+        self._output_tokens = (self._output_tokens or 0) + output_tokens
+        LLM_OUTPUT_TOKENS.inc(output_tokens, agent=self.turn.agent_name)
+
+    def _record_tool_call(self, tool_name: str | None) -> None:
+        tool_name = tool_name or "unknown"
+        TOOL_CALLS.inc(stage=self.turn.stage.value, tool=tool_name)
+        started_ns = self._tool_started_ns.pop(tool_name, None)
+        if started_ns is not None:
+            record_span(
+                "tool.call",
+                started_ns,
+                time.time_ns(),
+                stage=self.turn.stage.value,
+                tool=tool_name,
+            )
+
+
+def stream_stage_turn(
+    turn: StageTurn,
+    state: ConversationState,
+    context: AgentContext,
+    *,
+    min_chunk_chars: int = STREAM_MIN_CHUNK_CHARS,
+) -> Iterator[dict]:
+    """Stream one agent turn of ``turn.stage`` and store the reply."""
+    messages: list[BaseMessage] = getattr(state, turn.messages_field)
+    if turn.next_stage is not None:
+        stage_prefetcher.maybe_prefetch(state, turn.next_stage, messages)
+    with _TurnStream(turn, min_chunk_chars) as stream:
+        for chunk, _metadata in get_agent(turn.agent_name).stream(
+            {"messages": messages}, context=context, stream_mode="messages"
+        ):
+            yield from stream.feed(chunk)
+            if stream.stage_ended:
+                break
+
+        yield from stream.finish(messages)
+    persist_new_messages(state, turn.messages_field)
+
+    if stream.stage_ended and turn.next_stage is not None:
+        _log_stage_start(turn.next_stage)
+        start, _ = _stage_start(turn.next_stage)
+        yield from start(state)
+
+
+async def astream_stage_turn(
+    turn: StageTurn,
+    state: ConversationState,
+    context: AgentContext,
+    *,
+    min_chunk_chars: int = STREAM_MIN_CHUNK_CHARS,
+) -> AsyncIterator[dict]:
+    """Async counterpart of :func:`stream_stage_turn`, driven by ``astream``."""
+    messages: list[BaseMessage] = getattr(state, turn.messages_field)
+    if turn.next_stage is not None:
+        stage_prefetcher.maybe_prefetch(state, turn.next_stage, messages)
+    with _TurnStream(turn, min_chunk_chars) as stream:
+        async for chunk, _metadata in get_agent(turn.agent_name).astream(
+            {"messages": messages}, context=context, stream_mode="messages"
+        ):
+            for event in stream.feed(chunk):
+                yield event
+            if stream.stage_ended:
+                break
+
+        for event in stream.finish(messages):
+            yield event
+    await persist_new_messages_async(state, turn.messages_field)
+
+    if stream.stage_ended and turn.next_stage is not None:
+        _log_stage_start(turn.next_stage)
+        _, start_async = _stage_start(turn.next_stage)
+        async for event in start_async(state):
+            yield event
+
+
+def _log_stage_start(stage: ConversationStage) -> None:
+    bind_log_context(stage=stage.value)
+    logger.info("Starting %s stage", stage.value)
+
+
+class StreamStats:
+    """Latency and throughput of the streamed turns per agent."""
+
+    def __init__(self) -> None:
+        self._agents: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        agent_name: str,
+        *,
+        started: float,
+        first_token_at: float | None,
+        output_tokens: int,
+    ) -> None:
+        duration = time.perf_counter() - started
+        ttft = first_token_at - started if first_token_at is not None else None
+        generation = duration - ttft if ttft is not None else 0.0
+        STREAM_DURATION.observe(duration, agent=agent_name)
+        if ttft is not None:
+            LLM_TIME_TO_FIRST_TOKEN.observe(ttft, agent=agent_name)
+
+        with self._lock:
+            totals = self._agents.setdefault(
+                agent_name,
+                {
+                    "turns": 0,
+                    "text_turns": 0,
+                    "ttft_seconds_total": 0.0,
+                    "ttft_seconds_max": 0.0,
+                    "duration_seconds_total": 0.0,
+                    "output_tokens": 0,
+                    "generation_seconds_total": 0.0,
+                },
+            )
+            totals["turns"] += 1
+            totals["duration_seconds_total"] += duration
+            if ttft is not None:
+                totals["text_turns"] += 1
+                totals["ttft_seconds_total"] += ttft
+                totals["ttft_seconds_max"] = max(totals["ttft_seconds_max"], ttft)
+                totals["output_tokens"] += output_tokens
+                totals["generation_seconds_total"] += generation
+
+        fields: dict[str, Any] = {
+            "agent": agent_name,
+            "duration_ms": round(duration * 1000),
+        }
+        if ttft is not None:
+            fields["ttft_ms"] = round(ttft * 1000)
+            fields["tokens_per_second"] = round(
+                output_tokens / generation if generation > 0 else 0.0, 1
+            )
+        logger.info("Stream finished", extra=fields)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                agent_name: {
+                    "turns": int(totals["turns"]),
+                    "ttft_ms_avg": (
+                        totals["ttft_seconds_total"] / totals["text_turns"] * 1000
+                        if totals["text_turns"]
+                        else 0.0
+                    ),
+                    "ttft_ms_max": totals["ttft_seconds_max"] * 1000,
+                    "duration_ms_avg": (
+                        totals["duration_seconds_total"] / totals["turns"] * 1000
+                    ),
+                    "output_tokens": int(totals["output_tokens"]),
+                    "tokens_per_second": (
+                        totals["output_tokens"] / totals["generation_seconds_total"]
+                        if totals["generation_seconds_total"]
+                        else 0.0
+                    ),
+                }
+                for agent_name, totals in self._agents.items()
+            }
+
+
+stream_stats = StreamStats()
+metrics.register_stats("stream", stream_stats.stats, label="agent")
+
+
+__all__ = [
+    "StageTurn",
+    "register_stage_start",
+    "stream_stage_turn",
+    "astream_stage_turn",
+    "StreamStats",
+    "stream_stats",
+]
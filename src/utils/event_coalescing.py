@@ -0,0 +1,191 @@
+"""Coalescing of ``message_chunk`` events on their way to the client.
+
+Models stream a reply token by token, and every token used to become its own
+NDJSON line and its own write through the server. Consecutive chunks are now
+merged into one ``message_chunk`` event until ``STREAM_COALESCE_WINDOW_MS``
+has passed since the first buffered chunk or ``STREAM_COALESCE_MAX_BYTES`` of
+content are buffered. Every other event flushes the buffer and goes out
+immediately, as does the first chunk after any other event, so the time to
+first token does not change. A window of 0 disables coalescing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Iterator
+
+from dotenv import load_dotenv
+
+from src.events import EventType
+
+load_dotenv()
+
+STREAM_COALESCE_WINDOW_MS = float(os.getenv("STREAM_COALESCE_WINDOW_MS", "30"))
+STREAM_COALESCE_MAX_BYTES = int(os.getenv("STREAM_COALESCE_MAX_BYTES", "1024"))
+
+_MESSAGE_CHUNK = EventType.MESSAGE_CHUNK.value
+
+# Events read ahead of a slow client before the source stream is paused
+STREAM_COALESCE_MAX_PENDING = 64
+
+
+class ChunkCoalescer:
+    """Buffers consecutive ``message_chunk`` events of one stream."""
+
+    def __init__(
+        self,
+        *,
+        window_seconds: float = STREAM_COALESCE_WINDOW_MS / 1000,
+        max_bytes: int = STREAM_COALESCE_MAX_BYTES,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self.max_bytes = max_bytes
+
+        self._content: list[str] = []
+        self._size = 0
+        self._buffered_since: float | None = None
+        self._chunk_sent = False
+
+    def add(self, event: dict) -> list[dict]:
+        """Return the events that are due now that ``event`` arrived."""
+        if event["type"] != _MESSAGE_CHUNK:
+            events = self.flush()
+            events.append(event)
+            self._chunk_sent = False
+            return events
+
+        if not self._chunk_sent:
+            self._chunk_sent = True
+            return [event]
+
+        content = event["content"]
+        if not self._content:
+            self._buffered_since = time.monotonic()
+        self._content.append(content)
+        self._size += len(content.encode("utf-8"))
+        if self._size >= self.max_bytes or self.remaining() == 0:
+            return self.flush()
+        return []
+
+    def remaining(self) -> float | None:
+        """Seconds until the buffered content is due, ``None`` if it is empty."""
+        if self._buffered_since is None:
+            return None
+        elapsed = time.monotonic() - self._buffered_since
+        return max(self.window_seconds - elapsed, 0.0)
+
+    def flush(self) -> list[dict]:
+        if not self._content:
+            return []
+        event = {"type": _MESSAGE_CHUNK, "content": "".join(self._content)}
+        self._content.clear()
+        self._size = 0
+        self._buffered_since = None
+        return [event]
+
+
+def coalesce_events(
+    events: Iterator[dict],
+    *,
+    window_seconds: float = STREAM_COALESCE_WINDOW_MS / 1000,
+    max_bytes: int = STREAM_COALESCE_MAX_BYTES,
+) -> Iterator[dict]:
+    """Merge consecutive ``message_chunk`` events of a sync event stream.
+
+    The window is checked whenever the next event arrives, so buffered content
+    is held back at most one gap between two tokens longer than the window.
+    """
+    if window_seconds <= 0:
+        yield from events
+        return
+
+    coalescer = ChunkCoalescer(window_seconds=window_seconds, max_bytes=max_bytes)
+    try:
+        for event in events:
+            yield from coalescer.add(event)
+        yield from coalescer.flush()
+    finally:
+        close = getattr(events, "close", None)
+        if close is not None:
+            close()
+
+
+class _Failed:
+    def __init__(self, exc: Exception) -> None:
+        self.exc = exc
+
+
+_DONE = object()
+
+
+async def acoalesce_events(
+    events: AsyncIterator[dict],
+    *,
+    window_seconds: float = STREAM_COALESCE_WINDOW_MS / 1000,
+    max_bytes: int = STREAM_COALESCE_MAX_BYTES,
+) -> AsyncIterator[dict]:
+    """Async counterpart of :func:`coalesce_events` with a real timer.
+
+    The stream is consumed by a task so buffered content is sent when the
+    window ends even if the next token has not arrived yet. The task reads at
+    most ``STREAM_COALESCE_MAX_PENDING`` events ahead of the consumer, so a
+    slow client holds back the stream instead of growing the buffer.
+    """
+    if window_seconds <= 0:
+        async for event in events:
+            yield event
+        return
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_COALESCE_MAX_PENDING)
+
+    async def produce() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as exc:  # noqa: BLE001 - re-raised by the consumer
+            await queue.put(_Failed(exc))
+        else:
+            await queue.put(_DONE)
+
+    coalescer = ChunkCoalescer(window_seconds=window_seconds, max_bytes=max_bytes)
+    producer = asyncio.create_task(produce())
+    getter: asyncio.Future | None = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=coalescer.remaining())
+            if not done:
+                for event in coalescer.flush():
+                    yield event
+                continue
+
+            item, getter = getter.result(), None
+            if item is _DONE:
+                break
+            if isinstance(item, _Failed):
+                for event in coalescer.flush():
+                    yield event
+                raise item.exc
+            for event in coalescer.add(item):
+                yield event
+
+        for event in coalescer.flush():
+            yield event
+    finally:
+        if getter is not None:
+            getter.cancel()
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+
+__all__ = [
+    "ChunkCoalescer",
+    "coalesce_events",
+    "acoalesce_events",
+    "STREAM_COALESCE_WINDOW_MS",
+    "STREAM_COALESCE_MAX_BYTES",
+]
@@ -1,26 +1,132 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator
+import json
+import os
+from json.encoder import encode_basestring, encode_basestring_ascii
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+)
 
-from langchain_core.messages import AIMessage, BaseMessage
-from langgraph.graph.state import Runnable
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, AIMessageChunk
 
-from src.conversation.conversation_state import (
-    ConversationState,
-    serialize_messages,
-)
 from src.events import EventType
-from src.utils.messages import chunk_to_text
-from src.services.firestore_service import update_conversation
+
+try:
+    import orjson
+except ImportError:  # optional, installed with the "fast-json" extra
+    orjson = None
+
+load_dotenv()
+
+# "ndjson" writes one JSON object per line, "sse" writes "data: ..." events
+STREAM_EVENT_FRAMING = os.getenv("STREAM_EVENT_FRAMING", "ndjson")
+
+_CONSTANT_EVENT_TYPES = (
+    EventType.MESSAGE_START.value,
+    EventType.MESSAGE_END.value,
+    EventType.END.value,
+)
+_MESSAGE_CHUNK = EventType.MESSAGE_CHUNK.value
+
+
+def _json_dumps(value: object) -> bytes:
+    try:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode(
+            "utf-8"
+        )
+    except UnicodeEncodeError:
+        # Lone surrogates cannot be written as UTF-8, only as escapes
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _json_dumps_str(value: str) -> bytes:
+    try:
+        return encode_basestring(value).encode("utf-8")
+    except UnicodeEncodeError:
+        return encode_basestring_ascii(value).encode("utf-8")
+
+
+def _orjson_dumps(value: object) -> bytes:
+    try:
+        return orjson.dumps(value)
+    except orjson.JSONEncodeError:
+        return _json_dumps(value)
+
+
+class EventEncoder:
+    """Encodes stream events into response frames.
+
+    Both JSON backends produce the same bytes, so orjson is used whenever it
+    is installed. Frames of the constant events (``message_start``,
+    ``message_end``, ``end``) are encoded once; ``message_chunk`` frames only
+    encode their content and wrap it in pre-encoded bytes.
+    """
+
+    def __init__(
+        self,
+        framing: str = STREAM_EVENT_FRAMING,
+        *,
+        use_orjson: bool = orjson is not None,
+    ) -> None:
+        if framing not in ("ndjson", "sse"):
+            raise ValueError(f"Unknown event framing: {framing}")
+        self.framing = framing
+        self._prefix, self._suffix = (
+            (b"data: ", b"\n\n") if framing == "sse" else (b"", b"\n")
+        )
+        self._dumps: Callable[[object], bytes] = (
+            _orjson_dumps if use_orjson else _json_dumps
+        )
+        self._dumps_str: Callable[[str], bytes] = (
+            _orjson_dumps if use_orjson else _json_dumps_str
+        )
+
+        self._constant_frames = {
+            event_type: self._frame(self._dumps({"type": event_type}))
+            for event_type in _CONSTANT_EVENT_TYPES
+        }
+        self._chunk_head = self._prefix + b'{"type":"message_chunk","content":'
+        self._chunk_tail = b"}" + self._suffix
+
+    def encode(self, event: dict) -> bytes:
+        size = len(event)
+        if size == 1:
+            frame = self._constant_frames.get(event["type"])
+            if frame is not None:
+                return frame
+        elif size == 2 and event["type"] == _MESSAGE_CHUNK:
+            content = event.get("content")
+            if type(content) is str:
+                return self._chunk_head + self._dumps_str(content) + self._chunk_tail
+        return self._frame(self._dumps(event))
+
+    def _frame(self, payload: bytes) -> bytes:
+        return self._prefix + payload + self._suffix
+
+
+event_encoder = EventEncoder()
+
+
+def encode_event(event: dict) -> bytes:
+    """Encode an event as one frame of the /chat-stream response."""
+    return event_encoder.encode(event)
 
 
-def stream_text_as_events(text_chunks: Iterable[str]) -> Iterator[dict]:
+def stream_text_as_events(
+    text_chunks: Iterable[str], end: bool = True
+) -> Iterator[dict]:
     """Convert one or more text chunks into the standard SSE event sequence."""
     iterator = iter(text_chunks)
     try:
         first_chunk = next(iterator)
     except StopIteration:
-        yield {"type": EventType.END.value}
+        if end:
+            yield {"type": EventType.END.value}
         return
 
     yield {"type": EventType.MESSAGE_START.value}
@@ -36,13 +142,54 @@ def stream_text_as_events(text_chunks: Iterable[str]) -> Iterator[dict]:
         }
 
     yield {"type": EventType.MESSAGE_END.value}
-    yield {"type": EventType.END.value}
+    if end:
+        yield {"type": EventType.END.value}
+
+
+async def astream_text_as_events(
+    text_chunks: AsyncIterable[str], end: bool = True
+) -> AsyncIterator[dict]:
+    """Async counterpart of :func:`stream_text_as_events`."""
+    stream_open = False
+    async for chunk in text_chunks:
+        if not stream_open:
+            yield {"type": EventType.MESSAGE_START.value}
+            stream_open = True
+        yield {
+            "type": EventType.MESSAGE_CHUNK.value,
+            "content": chunk,
+        }
+
+    if stream_open:
+        yield {"type": EventType.MESSAGE_END.value}
+    if end:
+        yield {"type": EventType.END.value}
 
 
 def stream_single_message(text: str) -> Iterator[dict]:
     yield from stream_text_as_events([text])
 
 
+async def astream_single_message(text: str) -> AsyncIterator[dict]:
+    for event in stream_single_message(text):
+        yield event
+
+
+def started_tool_calls(chunk: object) -> list[str]:
+    """Names of the tool calls the model starts in this streamed chunk.
+
+    Only the first chunk of a streamed tool call carries its name. Models that
+    do not stream deliver one complete message with all its tool calls.
+    """
+    if isinstance(chunk, AIMessageChunk):
+        tool_calls = chunk.tool_call_chunks
+    elif isinstance(chunk, AIMessage):
+        tool_calls = chunk.tool_calls
+    else:
+        return []
+    return [tool_call["name"] for tool_call in tool_calls if tool_call.get("name")]
+
+
 def progress_event(message: str) -> dict:
     """Create a progress update event to inform the user about ongoing operations."""
     return {"type": EventType.PROGRESS_UPDATE.value, "content": message}
@@ -53,47 +200,15 @@ def sources_ready_event(sources: list[dict]) -> dict:
     return {"type": EventType.SOURCES_READY.value, "sources": sources}
 
 
-def stream_response_and_update_state(
-    state: ConversationState,
-    agent: Runnable,
-    messages: list[BaseMessage],
-    next_iterator: Iterator[dict],
-) -> Iterator[dict]:
-    assistant_message_text = ""
-    tool_called = False
-    stream_open = False
+def party_response_ready_event(party_id: str) -> dict:
+    """Create an event announcing that one party's answer has arrived."""
+    return {"type": EventType.PARTY_RESPONSE_READY.value, "party_id": party_id}
 
-    for chunk, metadata in agent.stream({"messages": messages}, stream_mode="messages"):
-        chunk_type = getattr(chunk, "type", None)
-        if isinstance(chunk, BaseMessage):
-            chunk_type = chunk.type
-
-        if chunk_type == "tool":
-            tool_called = True
-            break
-
-        chunk_text = chunk_to_text(chunk)
-        if chunk_text:
-            if not stream_open:
-                yield {"type": EventType.MESSAGE_START.value}
-                stream_open = True
-            assistant_message_text += chunk_text
-            yield {
-                "type": EventType.MESSAGE_CHUNK.value,
-                "content": chunk_text,
-            }
-
-    if assistant_message_text and not tool_called:
-        messages.append(AIMessage(content=assistant_message_text))
-
-    if stream_open and not tool_called:
-        yield {"type": EventType.MESSAGE_END.value}
-    yield {"type": EventType.END.value}
 
-    update_conversation(
-        conversation_id=state.id,
-        extra={f"{state.stage.value}_messages": serialize_messages(messages)},
-    )
+def phase_timings_event(timings: dict[str, float]) -> dict:
+    """Create an event with the per-phase duration breakdown in milliseconds."""
+    return {"type": EventType.PHASE_TIMINGS.value, "timings": timings}
+
 
-    if tool_called:
-        yield from next_iterator
+def end_event() -> dict:
+    return {"type": EventType.END.value}
@@ -0,0 +1,92 @@
+"""Accounting of provider-side prompt cache hits per stage.
+
+The stage prompts keep a byte-identical prefix so the provider can serve it
+from its prompt cache. This reads the cached share of the input tokens from
+the usage reported on the streamed model messages.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any
+
+from src.utils.telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_INPUT_TOKENS = metrics.counter(
+    "llm_input_tokens_total", "Input tokens reported by the model.", ("stage",)
+)
+LLM_CACHED_INPUT_TOKENS = metrics.counter(
+    "llm_cached_input_tokens_total",
+    "Input tokens served from the provider prompt cache.",
+    ("stage",),
+)
+
+
+def cached_token_usage(message: object) -> tuple[int, int] | None:
+    """Return ``(input_tokens, cached_input_tokens)`` reported on ``message``.
+
+    LangChain normalizes usage into ``usage_metadata``; OpenAI-compatible
+    providers that bypass that report it in ``response_metadata`` instead.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("input_tokens"):
+        details = usage.get("input_token_details") or {}
+        return usage["input_tokens"], details.get("cache_read") or 0
+
+    response_metadata = getattr(message, "response_metadata", None) or {}
+    token_usage = response_metadata.get("token_usage") or {}
+    if token_usage.get("prompt_tokens"):
+        details = token_usage.get("prompt_tokens_details") or {}
+        return token_usage["prompt_tokens"], details.get("cached_tokens") or 0
+
+    return None
+
+
+class PromptCacheStats:
+    def __init__(self) -> None:
+        self._stages: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, message: object) -> None:
+        usage = cached_token_usage(message)
+        if usage is None:
+            return
+
+        input_tokens, cached_tokens = usage
+        LLM_INPUT_TOKENS.inc(input_tokens, stage=stage)
+        LLM_CACHED_INPUT_TOKENS.inc(cached_tokens, stage=stage)
+        with self._lock:
+            totals = self._stages.setdefault(
+                stage, {"calls": 0, "input_tokens": 0, "cached_tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["cached_tokens"] += cached_tokens
+        logger.debug(
+            "Prompt cache usage",
+            extra={
+                "stage": stage,
+                "input_tokens": input_tokens,
+                "cached_tokens": cached_tokens,
+            },
+        )
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                stage: {
+                    **totals,
+                    "cached_ratio": totals["cached_tokens"] / totals["input_tokens"],
+                }
+                for stage, totals in self._stages.items()
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
+metrics.register_stats("prompt_cache", prompt_cache_stats.stats, label="stage")
+
+
+__all__ = ["PromptCacheStats", "prompt_cache_stats", "cached_token_usage"]
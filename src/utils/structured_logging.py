@@ -0,0 +1,231 @@
+"""Structured JSON logging that keeps formatting and I/O off the request path.
+
+:func:`configure_logging` attaches a queue handler to the root logger. A call
+like ``logger.info(...)`` on a request thread or the event loop only copies
+the conversation context onto the record and puts it on a bounded queue; a
+listener thread formats it as one JSON object per line and writes it to
+stdout. When the queue is full, records are dropped and counted instead of
+blocking the request.
+
+Records carry the ``conversation_id`` and ``stage`` bound with
+:func:`log_context`, plus anything passed in ``extra``. Verbose payloads such
+as prompts go in ``extra={"payload": ...}`` and are only written for a
+``LOG_PAYLOAD_SAMPLE_RATE`` share of the records; they are converted to text
+on the listener thread.
+
+Log arguments are formatted on the listener thread as well, so pass values
+that are not mutated afterwards.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Iterator, Mapping
+
+from dotenv import load_dotenv
+
+from src.utils.telemetry import metrics
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for log collectors, "text" for reading logs in a terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+LOG_RECORDS_DROPPED = metrics.counter(
+    "log_records_dropped_total", "Log records dropped because the queue was full."
+)
+
+# Libraries that log every HTTP request at INFO, i.e. every model call
+_QUIET_LOGGERS = ("httpx", "httpcore")
+
+_log_context: ContextVar[Mapping[str, Any]] = ContextVar("log_context", default={})
+
+_STANDARD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "payload", "payload_sampled"}
+
+_listener: QueueListener | None = None
+_handler: DeferredQueueHandler | None = None
+_configure_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Add ``fields`` to every record logged inside this block.
+
+    Safe to use around the ``yield`` of a stage generator: the previous
+    context is restored by value, so closing the generator from another task
+    does not fail.
+    """
+    previous = _log_context.get()
+    _log_context.set({**previous, **fields})
+    try:
+        yield
+    finally:
+        _log_context.set(previous)
+
+
+def bind_log_context(**fields: Any) -> None:
+    """Add ``fields`` to the context of the current block, e.g. a new stage."""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Copies the log context onto the record and samples its payload.
+
+    Runs on the calling thread, because the context lives there.
+    """
+
+    def __init__(self, payload_sample_rate: float = LOG_PAYLOAD_SAMPLE_RATE) -> None:
+        super().__init__()
+        self.payload_sample_rate = payload_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        if hasattr(record, "payload"):
+            record.payload_sampled = random.random() < self.payload_sample_rate
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves message formatting to the listener thread.
+
+    ``QueueHandler.prepare`` formats the message on the calling thread; here
+    only a traceback is rendered, so its frames are not kept alive in the
+    queue.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the context and ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec="milliseconds")
+            .replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES:
+                entry[key] = value
+        _add_payload(entry, record)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """``LEVEL logger: message key=value ...`` for local development."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields: dict[str, Any] = {
+            key: value
+            for key, value in record.__dict__.items()
+            if key not in _STANDARD_ATTRIBUTES
+        }
+        _add_payload(fields, record)
+        line = f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def _add_payload(fields: dict[str, Any], record: logging.LogRecord) -> None:
+    if not hasattr(record, "payload"):
+        return
+    if getattr(record, "payload_sampled", False):
+        fields["payload"] = str(record.payload)
+    elif isinstance(record.payload, str):
+        fields["payload_chars"] = len(record.payload)
+
+
+def configure_logging(
+    *,
+    level: str = LOG_LEVEL,
+    log_format: str = LOG_FORMAT,
+    queue_size: int = LOG_QUEUE_SIZE,
+    payload_sample_rate: float = LOG_PAYLOAD_SAMPLE_RATE,
+    stream: Any = None,
+) -> None:
+    """Route the root logger through the queue; later calls are no-ops."""
+    global _listener, _handler
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(
+            TextFormatter() if log_format == "text" else JsonFormatter()
+        )
+
+        records: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=queue_size)
+        _handler = DeferredQueueHandler(records)
+        _handler.addFilter(ContextFilter(payload_sample_rate))
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(_handler)
+        for name in _QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+        _listener = QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Write the queued records and stop the listener thread."""
+    global _listener, _handler
+    with _configure_lock:
+        listener, _listener = _listener, None
+        handler, _handler = _handler, None
+    if handler is not None:
+        logging.getLogger().removeHandler(handler)
+    if listener is not None:
+        listener.stop()
+
+
+__all__ = [
+    "configure_logging",
+    "shutdown_logging",
+    "log_context",
+    "bind_log_context",
+    "ContextFilter",
+    "DeferredQueueHandler",
+    "JsonFormatter",
+    "TextFormatter",
+]
@@ -0,0 +1,324 @@
+"""Metrics and spans around the request lifecycle.
+
+Metrics are kept in process and rendered in the Prometheus text format by the
+``/metrics`` route. Modules that already keep counters, such as the caches,
+register their ``stats()`` with :meth:`MetricsRegistry.register_stats` and are
+read at scrape time instead of on every request.
+
+Spans go through the OpenTelemetry API when ``opentelemetry-api`` is
+installed, so any configured SDK exports them; without an SDK they cost a
+no-op object. The duration of every span is also recorded in the
+``span_duration_seconds`` histogram. Spans are not made current: a stage turn
+is a generator that is suspended between events, which the OpenTelemetry
+context cannot follow, so all spans are children of the incoming request span
+if the server is instrumented.
+
+``TELEMETRY_ENABLED=false`` turns recording into an early return and spans
+into a shared no-op.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Mapping, Sequence
+
+from dotenv import load_dotenv
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover - depends on the installed extras
+    otel_trace = None
+
+load_dotenv()
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+
+METRIC_PREFIX = "wahl_agent_"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+StatsProvider = Callable[[], Mapping[str, Any]]
+
+
+def _label_text(labelnames: Sequence[str], values: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    pairs = (f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = f"{METRIC_PREFIX}{name}"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if not TELEMETRY_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(
+                f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = f"{METRIC_PREFIX}{name}"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (non-cumulative), sum and count
+        self._values: dict[tuple[str, ...], list[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not TELEMETRY_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        labelnames = (*self.labelnames, "le")
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                label_text = _label_text(labelnames, (*key, _number(bound)))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{label_text} {_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._stats: dict[str, tuple[StatsProvider, str | None]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(name, lambda: Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(name, lambda: Histogram(name, help, labelnames, buckets))
+
+    def register_stats(
+        self, name: str, stats: StatsProvider, *, label: str | None = None
+    ) -> None:
+        """Expose the numeric values of ``stats()`` as gauges ``<name>_<key>``.
+
+        With ``label``, ``stats()`` maps each value of that label to its own
+        dict of numbers, like :func:`src.services.tool_cache.tool_cache_stats`.
+        Values that are not numbers are skipped.
+        """
+        with self._lock:
+            self._stats[name] = (stats, label)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            stats = list(self._stats.items())
+
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, (provider, label) in stats:
+            lines.extend(_render_stats(name, provider(), label))
+        return "\n".join(lines) + "\n"
+
+    def _register(self, name: str, create: Callable[[], Any]) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = create()
+            return metric
+
+
+def _render_stats(name: str, stats: Mapping[str, Any], label: str | None) -> list[str]:
+    rows: dict[str, list[str]] = {}
+    if label is None:
+        samples = [((), stats)]
+    else:
+        samples = [((str(value),), inner) for value, inner in stats.items()]
+    labelnames = (label,) if label else ()
+
+    for label_values, values in samples:
+        for key, value in values.items():
+            if not isinstance(value, (int, float)):
+                continue
+            metric_name = f"{METRIC_PREFIX}{name}_{key}"
+            rows.setdefault(metric_name, []).append(
+                f"{metric_name}{_label_text(labelnames, label_values)} {_number(value)}"
+            )
+
+    lines: list[str] = []
+    for metric_name, samples_text in rows.items():
+        lines.append(f"# TYPE {metric_name} gauge")
+        lines.extend(samples_text)
+    return lines
+
+
+metrics = MetricsRegistry()
+
+SPAN_DURATION = metrics.histogram(
+    "span_duration_seconds", "Duration of instrumented operations.", ("span",)
+)
+
+_tracer = otel_trace.get_tracer("wahl-agent") if otel_trace is not None else None
+
+
+class Span:
+    """A timed operation; use as a context manager or call :meth:`end`."""
+
+    def __init__(self, name: str, attributes: Mapping[str, Any]) -> None:
+        self.name = name
+        self._started = time.perf_counter()
+        self._otel_span = (
+            _tracer.start_span(name, attributes=dict(attributes))
+            if _tracer is not None
+            else None
+        )
+        self._ended = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self._otel_span is not None:
+            self._otel_span.set_attribute(key, value)
+
+    def record_exception(self, exc: BaseException) -> None:
+        if self._otel_span is not None:
+            self._otel_span.record_exception(exc)
+            self._otel_span.set_status(otel_trace.StatusCode.ERROR, str(exc))
+
+    def end(self) -> None:
+        if self._ended:
+            return
+        self._ended = True
+        SPAN_DURATION.observe(time.perf_counter() - self._started, span=self.name)
+        if self._otel_span is not None:
+            self._otel_span.end()
+
+    def __enter__(self) -> Span:
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.record_exception(exc)
+        self.end()
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes: Any) -> Span | _NoopSpan:
+    """Start a span named ``name``; it ends on ``with`` exit or :meth:`Span.end`."""
+    if not TELEMETRY_ENABLED:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+
+def record_span(name: str, started_ns: int, ended_ns: int, **attributes: Any) -> None:
+    """Record a span that already happened, timed with :func:`time.time_ns`."""
+    if not TELEMETRY_ENABLED:
+        return
+    SPAN_DURATION.observe((ended_ns - started_ns) / 1e9, span=name)
+    if _tracer is not None:
+        otel_span = _tracer.start_span(
+            name, attributes=attributes, start_time=started_ns
+        )
+        otel_span.end(end_time=ended_ns)
+
+
+__all__ = [
+    "TELEMETRY_ENABLED",
+    "Counter",
+    "Histogram",
+    "MetricsRegistry",
+    "metrics",
+    "Span",
+    "span",
+    "record_span",
+]
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src import asgi, controller  # noqa: E402
+from src.agent_orchestrator import ConversationNotFoundError  # noqa: E402
+
+
+def post_asgi(body: bytes) -> tuple[int, bytes]:
+    messages = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    scope = {"type": "http", "path": "/chat-stream", "method": "POST"}
+    asyncio.run(asgi.app(scope, receive, send))
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return messages[0]["status"], body
+
+
+async def missing_conversation(conversation_id: str):
+    raise ConversationNotFoundError(conversation_id)
+
+
+def missing_conversation_chat(conversation_id: str, user_message: str):
+    raise ConversationNotFoundError(conversation_id)
+
+
+@pytest.mark.parametrize("body", [b"[]", b"[1]", b'"text"', b"{"])
+def test_asgi_rejects_a_payload_that_is_not_an_object(body):
+    assert post_asgi(body)[0] == 400
+
+
+def test_asgi_rejects_missing_fields():
+    status, body = post_asgi(b'{"user_message": "Hallo"}')
+
+    assert status == 400
+    assert "conversation_id" in json.loads(body)["error"]
+
+
+def test_asgi_answers_404_for_an_unknown_conversation(monkeypatch):
+    monkeypatch.setattr(asgi, "get_conversation_by_id_async", missing_conversation)
+
+    status, body = post_asgi(b'{"user_message": "Hallo", "conversation_id": "x"}')
+
+    assert status == 404
+    assert json.loads(body) == {"error": "Conversation not found"}
+
+
+def test_flask_answers_404_for_an_unknown_conversation(monkeypatch):
+    monkeypatch.setattr(controller, "chat", missing_conversation_chat)
+
+    response = controller.app.test_client().post(
+        "/chat-stream", json={"user_message": "Hallo", "conversation_id": "x"}
+    )
+
+    assert response.status_code == 404
+
+
+def test_flask_rejects_a_payload_that_is_not_an_object():
+    response = controller.app.test_client().post("/chat-stream", json=[1])
+
+    assert response.status_code == 400
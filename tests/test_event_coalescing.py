@@ -0,0 +1,44 @@
+import asyncio
+
+from src.utils.event_coalescing import STREAM_COALESCE_MAX_PENDING, acoalesce_events
+
+
+def test_slow_consumer_holds_back_the_source():
+    produced = 0
+
+    async def source():
+        nonlocal produced
+        for index in range(1000):
+            produced += 1
+            yield {"type": "progress", "content": str(index)}
+
+    async def consume() -> int:
+        events = acoalesce_events(source(), window_seconds=0.01)
+        try:
+            async for _event in events:
+                # A client that stalls after the first event
+                await asyncio.sleep(0.05)
+                return produced
+        finally:
+            await events.aclose()
+
+    # The queue, the event waiting to be put and the one being consumed
+    assert asyncio.run(consume()) <= STREAM_COALESCE_MAX_PENDING + 2
+
+
+def test_chunks_are_merged_and_order_is_kept():
+    async def source():
+        yield {"type": "message_start"}
+        for text in ("Hal", "lo", " Welt"):
+            yield {"type": "message_chunk", "content": text}
+        yield {"type": "message_end"}
+
+    async def collect() -> list[dict]:
+        return [event async for event in acoalesce_events(source(), window_seconds=1)]
+
+    assert asyncio.run(collect()) == [
+        {"type": "message_start"},
+        {"type": "message_chunk", "content": "Hal"},
+        {"type": "message_chunk", "content": "lo Welt"},
+        {"type": "message_end"},
+    ]
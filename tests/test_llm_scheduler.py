@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.services import llm_scheduler as llm_scheduler_module
+from src.services.llm_scheduler import (
+    AsyncScheduledTransport,
+    LLMScheduler,
+    ScheduledTransport,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_scheduler_module, "LLM_RATE_LIMIT_BASE_DELAY_SECONDS", 0)
+
+
+def replies(*outcomes):
+    """A handler returning (or raising) ``outcomes`` in order."""
+    remaining = list(outcomes)
+    calls = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        outcome = remaining.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome)
+
+    return handle, calls
+
+
+def post(handler, scheduler: LLMScheduler) -> httpx.Response:
+    transport = ScheduledTransport(httpx.MockTransport(handler), scheduler)
+    with httpx.Client(transport=transport) as client:
+        return client.post("http://llm.test/v1/chat/completions", content=b"{}")
+
+
+@pytest.mark.parametrize(
+    "failure", [503, 408, httpx.ConnectError("refused"), httpx.ReadTimeout("slow")]
+)
+def test_transient_failure_is_retried(failure):
+    handler, calls = replies(failure, 200)
+    scheduler = LLMScheduler(transient_retries=2)
+
+    assert post(handler, scheduler).status_code == 200
+    assert len(calls) == 2
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_transient_retries_are_bounded():
+    handler, calls = replies(502, 502, 502)
+    scheduler = LLMScheduler(transient_retries=2)
+
+    assert post(handler, scheduler).status_code == 502
+    assert len(calls) == 3
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_transport_error_is_raised_once_retries_are_spent():
+    handler, calls = replies(httpx.ConnectError("refused"))
+    scheduler = LLMScheduler(transient_retries=0)
+
+    with pytest.raises(httpx.ConnectError):
+        post(handler, scheduler)
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_client_errors_are_not_retried():
+    handler, calls = replies(400)
+
+    assert post(handler, LLMScheduler()).status_code == 400
+    assert len(calls) == 1
+
+
+def test_rate_limit_pauses_the_scheduler():
+    handler, calls = replies(429, 200)
+    scheduler = LLMScheduler()
+
+    assert post(handler, scheduler).status_code == 200
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+def test_async_transient_failure_is_retried():
+    handler, calls = replies(500, httpx.ConnectError("refused"), 200)
+    scheduler = LLMScheduler(transient_retries=2)
+
+    async def request() -> httpx.Response:
+        transport = AsyncScheduledTransport(httpx.MockTransport(handler), scheduler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("http://llm.test/v1/chat/completions")
+
+    assert asyncio.run(request()).status_code == 200
+    assert len(calls) == 3
+    assert scheduler.stats()["in_flight"] == 0
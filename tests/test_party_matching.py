@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+from src.prompts import get_party_response_section
+from src.services.wahl_chat_models import PartyResponse, WahlChatResponse
+from src.stages import party_matching
+from src.stages.party_matching import acollect_party_sections, collect_party_sections
+
+RESPONSES = WahlChatResponse(
+    party_responses=[
+        PartyResponse(party_id=party_id, response=f"Antwort {party_id}")
+        for party_id in ("spd", "cdu", "gruene")
+    ]
+)
+
+
+@pytest.fixture(autouse=True)
+def short_timeout(monkeypatch):
+    monkeypatch.setattr(party_matching, "PRE_ANALYSIS_TIMEOUT_SECONDS", 0.05)
+
+
+def without_pre_analysis(party_id: str) -> str:
+    party_response = next(
+        party for party in RESPONSES.party_responses if party.party_id == party_id
+    )
+    return get_party_response_section(party_response, None)
+
+
+def test_late_and_failed_pre_analyses_fall_back():
+    done: Future[str] = Future()
+    done.set_result("spd mit Analyse")
+    failed: Future[str] = Future()
+    failed.set_exception(RuntimeError("model unavailable"))
+    stuck: Future[str] = Future()
+
+    sections = collect_party_sections(
+        RESPONSES, {"spd": done, "cdu": failed, "gruene": stuck}
+    )
+
+    assert sections == {
+        "spd": "spd mit Analyse",
+        "cdu": without_pre_analysis("cdu"),
+        "gruene": without_pre_analysis("gruene"),
+    }
+
+
+def test_async_late_and_failed_pre_analyses_fall_back():
+    async def collect() -> dict[str, str]:
+        async def analyzed() -> str:
+            return "spd mit Analyse"
+
+        async def failing() -> str:
+            raise RuntimeError("model unavailable")
+
+        tasks = {
+            "spd": asyncio.create_task(analyzed()),
+            "cdu": asyncio.create_task(failing()),
+            "gruene": asyncio.create_task(asyncio.sleep(10, "zu spät")),
+        }
+        try:
+            return await acollect_party_sections(RESPONSES, tasks)
+        finally:
+            tasks["gruene"].cancel()
+
+    assert asyncio.run(collect()) == {
+        "spd": "spd mit Analyse",
+        "cdu": without_pre_analysis("cdu"),
+        "gruene": without_pre_analysis("gruene"),
+    }
@@ -0,0 +1,36 @@
+from src.services import llm_scheduler
+from src.services.llm_scheduler import Priority, llm_priority
+from src.stages import perspective_taking
+from src.stages.perspective_taking import perplexity_cache, perplexity_search
+from src.utils import structured_logging
+from src.utils.structured_logging import log_context
+
+
+def test_search_runs_with_the_callers_context(monkeypatch):
+    seen = {}
+
+    def search(query: str) -> str:
+        seen["priority"] = llm_scheduler._priority.get()
+        seen["log_context"] = dict(structured_logging._log_context.get())
+        return "Ergebnis"
+
+    monkeypatch.setattr(perspective_taking, "search_perplexity", search)
+    perplexity_cache.clear()
+
+    with llm_priority(Priority.BACKGROUND), log_context(conversation_id="c1"):
+        assert perplexity_search.func("Wie hoch ist die Rente?") == "Ergebnis"
+
+    assert seen["priority"] is Priority.BACKGROUND
+    assert seen["log_context"]["conversation_id"] == "c1"
+
+
+def test_cached_search_does_not_queue_on_the_executor(monkeypatch):
+    class BusyExecutor:
+        def submit(self, *args, **kwargs):
+            raise AssertionError("cached result went through the executor")
+
+    perplexity_cache.clear()
+    perplexity_cache.get_or_compute("Wie hoch ist die Rente?", lambda query: "48 %")
+    monkeypatch.setattr(perspective_taking, "perplexity_executor", BusyExecutor())
+
+    assert perplexity_search.func("wie hoch ist die  Rente?") == "48 %"
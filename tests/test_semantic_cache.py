@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from src.services import semantic_cache as semantic_cache_module
+from src.services.semantic_cache import (
+    SemanticAnswerCache,
+    VectorIndex,
+    hashing_embedder,
+)
+from src.services.wahl_chat_models import PartyResponse, WahlChatResponse
+
+QUESTION = "Wie stehen die Parteien zum Tempolimit auf Autobahnen?"
+
+
+def answer(text: str) -> WahlChatResponse:
+    return WahlChatResponse(
+        party_responses=[PartyResponse(party_id="spd", response=text)]
+    )
+
+
+@pytest.fixture
+def cache() -> SemanticAnswerCache:
+    return SemanticAnswerCache(hashing_embedder(), threshold=0.92, index_mode="flat")
+
+
+def test_near_duplicate_question_hits(cache):
+    response = answer("Tempolimit")
+    cache.add("verkehr", QUESTION, response)
+
+    assert (
+        cache.lookup(
+            "verkehr", "wie stehen die parteien zum tempolimit auf autobahnen?!"
+        )
+        is response
+    )
+    assert cache.stats()["hits"] == 1
+
+
+def test_question_below_threshold_misses(cache):
+    cache.add("verkehr", QUESTION, answer("Tempolimit"))
+
+    assert (
+        cache.lookup(
+            "verkehr", "Wie stehen die Parteien zum Tempolimit auf der Autobahn?"
+        )
+        is None
+    )
+    assert cache.lookup("verkehr", "Was sagen die Parteien zur Rente mit 70?") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_lookup_does_not_cross_topics(cache):
+    cache.add("verkehr", QUESTION, answer("Tempolimit"))
+
+    assert cache.lookup("klima", QUESTION) is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(semantic_cache_module.time, "monotonic", lambda: now)
+    cache = SemanticAnswerCache(hashing_embedder(), ttl_seconds=60)
+    cache.add("verkehr", QUESTION, answer("Tempolimit"))
+
+    now += 61
+    assert cache.lookup("verkehr", QUESTION) is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["entries"] == {"verkehr": 0}
+
+
+def test_topic_is_cached_again_after_every_entry_expired(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(semantic_cache_module.time, "monotonic", lambda: now)
+    cache = SemanticAnswerCache(hashing_embedder(), ttl_seconds=60)
+    cache.add("verkehr", QUESTION, answer("Tempolimit"))
+    now += 61
+    assert cache.lookup("verkehr", QUESTION) is None
+
+    response = answer("Tempolimit neu")
+    cache.add("verkehr", QUESTION, response)
+
+    assert cache.lookup("verkehr", QUESTION) is response
+    assert cache.stats()["errors"] == 0
+
+
+def test_embedder_failure_falls_back_to_a_miss():
+    def failing_embedder(text: str) -> np.ndarray:
+        raise RuntimeError("embedding endpoint unavailable")
+
+    cache = SemanticAnswerCache(failing_embedder)
+    cache.add("verkehr", QUESTION, answer("Tempolimit"))
+
+    assert cache.lookup("verkehr", QUESTION) is None
+    assert cache.stats()["errors"] == 2
+
+
+def test_ivf_search_matches_flat_search():
+    embed = hashing_embedder()
+    questions = [f"Frage {i} zu Thema {i % 7} und Partei {i % 5}" for i in range(300)]
+    flat: VectorIndex[int] = VectorIndex(mode="flat")
+    ivf: VectorIndex[int] = VectorIndex(mode="ivf", n_probe=4)
+    for payload, question in enumerate(questions):
+        flat.add(embed(question), payload)
+        ivf.add(embed(question), payload)
+
+    for payload, question in enumerate(questions):
+        flat_score, flat_payload = flat.search(embed(question))
+        ivf_score, ivf_payload = ivf.search(embed(question))
+        assert flat_payload == ivf_payload == payload
+        assert ivf_score == pytest.approx(flat_score)
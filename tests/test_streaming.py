@@ -0,0 +1,62 @@
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from src.conversation.conversation_state import ConversationStage, ConversationState
+from src.stages import streaming
+from src.stages.streaming import StageTurn, StreamStats, stream_stage_turn
+
+TURN = StageTurn(
+    stage=ConversationStage.ACTIVE_LISTENING,
+    agent_name="test_agent",
+    messages_field="active_listening_messages",
+)
+
+
+class FakeAgent:
+    def __init__(self, error: Exception | None = None) -> None:
+        self.error = error
+
+    def stream(self, inputs, **kwargs):
+        for text in ("Hallo", " Welt"):
+            yield AIMessageChunk(content=text), {}
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def stats(monkeypatch) -> StreamStats:
+    stats = StreamStats()
+    monkeypatch.setattr(streaming, "stream_stats", stats)
+    monkeypatch.setattr(streaming, "persist_new_messages", lambda state, field: None)
+    return stats
+
+
+def test_turn_closed_by_the_client_is_recorded(stats, monkeypatch):
+    monkeypatch.setattr(streaming, "get_agent", lambda name: FakeAgent())
+    events = stream_stage_turn(TURN, ConversationState("Klima", "c1"), None)
+
+    next(events)
+    events.close()
+
+    assert stats.stats()["test_agent"]["turns"] == 1
+
+
+def test_failed_turn_is_recorded(stats, monkeypatch):
+    error = RuntimeError("model unavailable")
+    monkeypatch.setattr(streaming, "get_agent", lambda name: FakeAgent(error))
+
+    with pytest.raises(RuntimeError):
+        list(stream_stage_turn(TURN, ConversationState("Klima", "c1"), None))
+
+    assert stats.stats()["test_agent"]["turns"] == 1
+
+
+def test_completed_turn_is_recorded_once(stats, monkeypatch):
+    monkeypatch.setattr(streaming, "get_agent", lambda name: FakeAgent())
+    state = ConversationState("Klima", "c1")
+
+    events = list(stream_stage_turn(TURN, state, None))
+
+    assert events[-1] == {"type": "message_end"}
+    assert state.active_listening_messages[-1].content == "Hallo Welt"
+    assert stats.stats()["test_agent"]["turns"] == 1
@@ -0,0 +1,154 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from src.services import wahl_chat_cache as wahl_chat_cache_module
+from src.services.wahl_chat_cache import PartyAnswerCache
+from src.services.wahl_chat_models import PartyResponse, Source, WahlChatResponse
+
+QUESTION = "Wie stehen die Parteien zum Tempolimit?"
+
+
+def answer(text: str) -> WahlChatResponse:
+    return WahlChatResponse(
+        party_responses=[
+            PartyResponse(
+                party_id="spd",
+                response=text,
+                sources=[Source(name="Wahlprogramm", page=3)],
+            )
+        ]
+    )
+
+
+class Upstream:
+    """Records fetches; their futures are resolved by the test."""
+
+    def __init__(self) -> None:
+        self.questions: list[str] = []
+        self.futures: list[Future] = []
+
+    def __call__(self, question: str) -> Future:
+        future: Future = Future()
+        self.questions.append(question)
+        self.futures.append(future)
+        return future
+
+
+def make_cache(**kwargs) -> PartyAnswerCache:
+    return PartyAnswerCache(context_id="btw25", party_ids=["spd", "cdu"], **kwargs)
+
+
+def test_concurrent_requests_share_one_fetch():
+    cache = make_cache()
+    upstream = Upstream()
+
+    first = cache.get_or_fetch(QUESTION, upstream)
+    second = cache.get_or_fetch("wie stehen die parteien  zum Tempolimit?", upstream)
+    upstream.futures[0].set_result(answer("Ja"))
+
+    assert second is first
+    assert len(upstream.questions) == 1
+    assert cache.get_or_fetch(QUESTION, upstream).result() == answer("Ja")
+    assert cache.stats()["coalesced"] == 1
+    assert cache.stats()["inflight"] == 0
+
+
+def test_failed_fetch_is_not_cached():
+    cache = make_cache()
+    upstream = Upstream()
+
+    cache.get_or_fetch(QUESTION, upstream)
+    upstream.futures[0].set_exception(ConnectionError("offline"))
+    cache.get_or_fetch(QUESTION, upstream)
+
+    assert len(upstream.questions) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    cache.put("a", answer("a"))
+    cache.put("b", answer("b"))
+    cache.get("a")
+    cache.put("c", answer("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == answer("a")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(wahl_chat_cache_module.time, "time", lambda: now)
+    cache = make_cache(ttl_seconds=60)
+    cache.put(QUESTION, answer("Ja"))
+
+    now += 61
+    assert cache.get(QUESTION) is None
+
+
+def test_answers_survive_a_restart_in_sqlite(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    cache = make_cache(sqlite_path=path)
+    upstream = Upstream()
+    cache.get_or_fetch(QUESTION, upstream)
+    _wait_for_fetches(upstream, 1)
+    upstream.futures[0].set_result(answer("Ja"))
+    cache.close()
+
+    restarted = make_cache(sqlite_path=path)
+    response = restarted.get_or_fetch(QUESTION, upstream).result(timeout=5)
+
+    assert response == answer("Ja")
+    assert len(upstream.questions) == 1
+    assert restarted.stats()["disk_hits"] == 1
+    restarted.close()
+
+
+def test_expired_sqlite_entry_is_fetched_again(tmp_path, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(wahl_chat_cache_module.time, "time", lambda: now)
+    path = str(tmp_path / "answers.sqlite")
+    cache = make_cache(sqlite_path=path, ttl_seconds=60)
+    cache.put(QUESTION, answer("Ja"))
+    cache.close()
+
+    now += 61
+    restarted = make_cache(sqlite_path=path, ttl_seconds=60)
+    upstream = Upstream()
+    restarted.get_or_fetch(QUESTION, upstream)
+
+    _wait_for_fetches(upstream, 1)
+    restarted.close()
+
+
+def test_slow_disk_does_not_block_memory_hits(tmp_path, monkeypatch):
+    cache = make_cache(sqlite_path=str(tmp_path / "answers.sqlite"))
+    cache.put("cached", answer("Ja"))
+    release_disk = threading.Event()
+
+    def slow_read(key: str) -> None:
+        release_disk.wait(5)
+        return None
+
+    monkeypatch.setattr(cache, "_read", slow_read)
+
+    upstream = Upstream()
+    pending = cache.get_or_fetch(QUESTION, upstream)
+    hit = cache.get_or_fetch("cached", upstream)
+
+    assert hit.result(timeout=0) == answer("Ja")
+    assert not pending.done()
+    release_disk.set()
+    _wait_for_fetches(upstream, 1)
+    cache.close()
+
+
+def _wait_for_fetches(upstream: Upstream, count: int) -> None:
+    for _ in range(500):
+        if len(upstream.questions) >= count:
+            return
+        time.sleep(0.01)
+    pytest.fail(f"expected {count} upstream fetches, got {len(upstream.questions)}")
@@ -0,0 +1,56 @@
+import asyncio
+
+from src.services.wahl_chat_service import _PendingSession, _WahlChatConnection
+
+
+def open_sessions(connection: _WahlChatConnection, count: int) -> list:
+    sessions = [_PendingSession() for _ in range(count)]
+    for session_id, session in enumerate(sessions):
+        connection.sessions[str(session_id)] = session
+    return sessions
+
+
+def test_event_is_routed_by_session_id():
+    connection = _WahlChatConnection()
+    sessions = open_sessions(connection, 2)
+
+    assert connection._session_for({"session_id": "1"}) is sessions[1]
+
+
+def test_event_without_session_id_goes_to_the_only_session():
+    connection = _WahlChatConnection()
+    (session,) = open_sessions(connection, 1)
+
+    assert connection._session_for({}) is session
+
+
+def test_event_without_session_id_fails_concurrent_sessions():
+    connection = _WahlChatConnection()
+    sessions = open_sessions(connection, 2)
+
+    assert connection._session_for({"party_id": "spd"}) is None
+    for session in sessions:
+        assert session.complete.is_set()
+        assert isinstance(session.error, RuntimeError)
+
+
+def test_reconnect_task_is_kept_until_it_finished():
+    connection = _WahlChatConnection()
+    reconnected = asyncio.Event()
+
+    async def reconnect() -> None:
+        reconnected.set()
+
+    connection._reconnect = reconnect
+
+    async def disconnect_twice() -> None:
+        await connection._on_disconnect()
+        task = connection._reconnect_task
+        await connection._on_disconnect()
+        assert connection._reconnect_task is task
+        await task
+        await asyncio.sleep(0)
+
+    asyncio.run(disconnect_twice())
+    assert reconnected.is_set()
+    assert connection._reconnect_task is None